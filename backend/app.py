@@ -1,3 +1,4 @@
+import asyncio
 import uuid
 import pathlib
 import time
@@ -19,10 +20,22 @@ from services.categories import (
     normalize_doc_type,
 )
 from services.chunking import split_markdown
-from services.embeddings import embed, get_embedder
+from services.embeddings import get_embedder
+from services.query_context import QueryContext
+from services.embed_batcher import get_batcher
+from services.summary_cache import get_summary_cache
+from services.summary_jobs import PRIORITY_BULK, PRIORITY_DEFAULT, PRIORITY_INTERACTIVE, get_job_queue
 from services.fusion import mmr, rrf
-from services.keyword_index import add_chunks as kw_add, search as kw_search
+from services.keyword_engine import (
+    add_chunks as kw_add,
+    search as kw_search,
+    flush as kw_flush,
+    start as kw_start,
+    stats as kw_stats,
+)
 from services.cache import ask_cache, search_cache
+from services.chunk_store import hydrate, strip_text
+from services.chunk_summaries import build_summary_context, generate_chunk_summaries_task, lookup_chunk_summaries
 from services.text_cleaning import clean_chunk
 from services.metrics import record_search, record_ask, snapshot as metrics_snapshot
 from services import rerank
@@ -34,12 +47,22 @@ from services.parsers import (
     parse_xlsx_bytes,
 )
 from services.qdrant_store import (
+    async_client as qdrant_async_client,
     client as qdrant_client,
+    count_document_chunks,
+    count_document_chunks_async,
     ensure_collection,
     semantic_search,
+    semantic_search_async,
+    hybrid_search,
+    hybrid_search_async,
+    sparse_enabled,
     upsert_chunks,
 )
+from services.payload_indexes import ensure_all_payload_indexes, payload_index_status
 from services.rag import build_prompt, call_llm
+from services.llm_gateway import BACKGROUND, STREAMING, get_llm_gateway, llm_priority
+from services.llm_router import get_llm_router
 from services.summarization import summarize_document_by_id, summarize_chunks, summarize_document_streaming
 from services.llm_config import get_current_model_config
 from services.summary_store import (
@@ -49,6 +72,10 @@ from services.summary_store import (
     delete_document_summary,
     list_documents_without_summary,
     get_summary_stats,
+    search_summaries,
+    search_summaries_async,
+    invalidate_unsummarized,
+    two_stage_doc_ids,
     update_main_collection_summary_flag,
 )
 from services.thread_parser import parse_email_thread, parse_telegram_chat, parse_whatsapp_chat
@@ -102,7 +129,21 @@ app.add_middleware(TimingMiddleware)
 @app.on_event("startup")
 def _startup():
     ensure_collection()
+    ensure_all_payload_indexes(qdrant_client())
+    kw_start()
     get_embedder()
+    get_job_queue().start()
+    if config.LLM_MODE in ("ollama", "vllm"):
+        get_llm_router().start_health_checks(config.LLM_HEALTH_CHECK_INTERVAL)
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    # Commit keyword documents still queued in the batched writer
+    kw_flush(timeout=30)
+    get_job_queue().stop(timeout=5)
+    if config.LLM_MODE in ("ollama", "vllm"):
+        get_llm_router().stop()
 
 
 def _parse(filename: str, data: bytes) -> str:
@@ -189,17 +230,19 @@ async def ingest(
     )
     upsert_chunks(space_id, doc_id, norm_doc_type, chunks)
     kw_add(space_id, doc_id, norm_doc_type, chunks)
+    if config.TWO_STAGE_RETRIEVAL:
+        invalidate_unsummarized()
     
-    # Асинхронная генерация summary
-    if generate_summary and background_tasks:
-        print(f"[Ingest] Scheduling background summarization for {doc_id}")
-        background_tasks.add_task(
-            _generate_and_save_summary_task,
-            doc_id=doc_id,
-            space_id=space_id,
-            doc_type=norm_doc_type,
-            num_chunks=len(chunks)
-        )
+    # Краткие summary чанков для режима summarize в /ask
+    if config.CHUNK_SUMMARIES_ENABLED and background_tasks:
+        background_tasks.add_task(generate_chunk_summaries_task, space_id, doc_id, chunks)
+    
+    # Асинхронная генерация summary (очередь задач)
+    summary_job_id = None
+    if generate_summary:
+        print(f"[Ingest] Queueing background summarization for {doc_id}")
+        job, _ = get_job_queue().enqueue(doc_id, space_id, doc_type=norm_doc_type, priority=PRIORITY_DEFAULT)
+        summary_job_id = job["id"]
     
     return {
         "doc_id": doc_id,
@@ -207,6 +250,7 @@ async def ingest(
         "doc_type": norm_doc_type,
         "chunks_indexed": len(chunks),
         "summary_pending": generate_summary,
+        "summary_job_id": summary_job_id,
     }
 
 
@@ -231,15 +275,27 @@ def search(
                 cached_response = cached
                 cached_tokens = _count_context_tokens(cached_response.get("results", []))
             response = deepcopy(cached_response)
+            if config.LEAN_PAYLOADS:
+                # One batch for every list the response carries
+                hydrate([
+                    item for field in _SEARCH_RESULT_FIELDS for item in response.get(field, [])
+                ])
             latency_ms = (time.perf_counter() - start) * 1000
             record_search(latency_ms, cached_tokens, True)
             return response
-    sem = semantic_search(q, space_id, norm_doc_types, effective_top_k)
-    lex = kw_search(q, space_id, norm_doc_types, effective_top_k)
     pool_top_k = min(config.CONTEXT_MAX_CHUNKS * 2, effective_top_k * (config.MMR_CANDIDATE_MULTIPLIER if config.MMR_ENABLED else 1))
-    candidate_pool = rrf(sem, lex, top_k=pool_top_k)
-    candidate_pool = rerank.apply_rerank(q, candidate_pool)
-    mmr_selected = _apply_mmr(candidate_pool, q, effective_top_k)
+    qctx = QueryContext(q, space_id, norm_doc_types)
+    doc_ids = _two_stage_doc_ids(qctx)
+    if sparse_enabled():
+        # Dense + sparse fused by Qdrant; per-engine lists are not fetched separately
+        sem, lex = [], []
+        candidate_pool = hydrate(hybrid_search(q, space_id, norm_doc_types, pool_top_k, ctx=qctx, doc_ids=doc_ids))
+    else:
+        sem = semantic_search(q, space_id, norm_doc_types, effective_top_k, ctx=qctx, doc_ids=doc_ids)
+        lex = kw_search(q, space_id, norm_doc_types, effective_top_k, doc_ids=doc_ids)
+        candidate_pool = hydrate(rrf(sem, lex, top_k=pool_top_k))
+    candidate_pool = rerank.apply_rerank(q, candidate_pool, ctx=qctx)
+    mmr_selected = _apply_mmr(candidate_pool, qctx, effective_top_k)
     fused = _limit_one_chunk_per_doc(mmr_selected, candidate_pool, effective_top_k)
     response = {
         "query": q,
@@ -253,7 +309,7 @@ def search(
     latency_ms = (time.perf_counter() - start) * 1000
     record_search(latency_ms, context_tokens, False)
     if cache_key is not None:
-        search_cache.set(cache_key, (deepcopy(response), context_tokens))
+        search_cache.set(cache_key, (_cacheable_search_response(response), context_tokens))
     return response
 
 
@@ -280,12 +336,19 @@ async def ask(req: AskRequest = Body(...)):
                 ctx_tokens = _count_context_tokens(response.get("sources", []))
             record_ask(latency_ms, ctx_tokens, ans_tokens, True)
             return response
-    sem = semantic_search(req.q, req.space_id, norm_doc_types, effective_top_k)
-    lex = kw_search(req.q, req.space_id, norm_doc_types, effective_top_k)
     pool_top_k = effective_top_k * (config.MMR_CANDIDATE_MULTIPLIER if config.MMR_ENABLED else 1)
-    candidate_pool = rrf(sem, lex, top_k=pool_top_k)
-    candidate_pool = rerank.apply_rerank(req.q, candidate_pool)
-    mmr_selected = _apply_mmr(candidate_pool, req.q, effective_top_k)
+    qctx = QueryContext(req.q, req.space_id, norm_doc_types)
+    doc_ids = await _two_stage_doc_ids_async(qctx)
+    if sparse_enabled():
+        candidate_pool = hydrate(await hybrid_search_async(
+            req.q, req.space_id, norm_doc_types, pool_top_k, ctx=qctx, doc_ids=doc_ids
+        ))
+    else:
+        sem = await semantic_search_async(req.q, req.space_id, norm_doc_types, effective_top_k, ctx=qctx, doc_ids=doc_ids)
+        lex = kw_search(req.q, req.space_id, norm_doc_types, effective_top_k, doc_ids=doc_ids)
+        candidate_pool = hydrate(rrf(sem, lex, top_k=pool_top_k))
+    candidate_pool = rerank.apply_rerank(req.q, candidate_pool, ctx=qctx)
+    mmr_selected = _apply_mmr(candidate_pool, qctx, effective_top_k)
     fused = _limit_one_chunk_per_doc(mmr_selected, candidate_pool, effective_top_k)
     
     # Smart context compression с режимами работы
@@ -318,11 +381,18 @@ async def ask(req: AskRequest = Body(...)):
     
     if should_summarize:
         try:
-            summary = await summarize_chunks(
-                fused,
-                query=req.q,
-                max_output_tokens=model_config.summarization_max_output
-            )
+            # Готовые summary чанков с ингеста: контекст без вызовов LLM
+            chunk_summaries = lookup_chunk_summaries(fused) if config.CHUNK_SUMMARIES_ENABLED else []
+            precomputed = sum(1 for cs in chunk_summaries if cs is not None)
+            if precomputed:
+                print(f"[RAG] Using {precomputed}/{len(fused)} precomputed chunk summaries")
+                summary = build_summary_context(fused, chunk_summaries, ctx=qctx)
+            else:
+                summary = await summarize_chunks(
+                    fused,
+                    query=req.q,
+                    max_output_tokens=model_config.summarization_max_output
+                )
             
             # Построить промпт с суммаризированным контекстом
             prompt = (
@@ -337,12 +407,13 @@ async def ask(req: AskRequest = Body(...)):
         except Exception as e:
             # Fallback: если суммаризация не удалась - используем обычный промпт
             print(f"[RAG] Summarization failed: {e}. Falling back to normal prompt.")
-            prompt = build_prompt(fused, req.q)
+            prompt = build_prompt(fused, req.q, ctx=qctx)
     else:
         # Обычный RAG без суммаризации
-        prompt = build_prompt(fused, req.q)
+        prompt = build_prompt(fused, req.q, ctx=qctx)
     
-    answer = call_llm(prompt)
+    # В отдельном потоке: ожидание слота LLM-шлюза не блокирует event loop
+    answer = await asyncio.to_thread(call_llm, prompt)
     sources = [
         {
             "doc_id": r["payload"].get("doc_id"),
@@ -363,6 +434,7 @@ async def ask(req: AskRequest = Body(...)):
     latency_ms = (time.perf_counter() - start) * 1000
     record_ask(latency_ms, context_tokens, answer_tokens, False)
     if cache_key is not None and not answer.startswith("[LLM ошибка"):
+        # Lean by construction: sources carry ids/metadata only, never chunk text
         ask_cache.set(cache_key, (deepcopy(response), context_tokens, answer_tokens))
     return response
 
@@ -373,7 +445,8 @@ async def summarize_document(req: SummarizeRequest = Body(...)):
     Суммаризировать документ по doc_id
     
     Сначала проверяет наличие сохраненного summary.
-    Если нет - генерирует на лету.
+    Если нет - генерирует на лету (запросы с focus и повторный ингест того же
+    содержимого обслуживаются кэшем суммаризации по хэшу содержимого).
     """
     try:
         # Проверить есть ли уже сохраненный summary
@@ -392,23 +465,10 @@ async def summarize_document(req: SummarizeRequest = Body(...)):
                 "generated_at": cached_summary.get("generated_at"),
             }
         
-        # Генерировать на лету
-        from services.qdrant_store import client
-        from qdrant_client.models import Filter, FieldCondition, MatchValue
-        
-        # Получить все чанки документа
-        results = client().scroll(
-            collection_name=config.QDRANT_COLLECTION,
-            scroll_filter=Filter(
-                must=[
-                    FieldCondition(key="doc_id", match=MatchValue(value=req.doc_id)),
-                    FieldCondition(key="space_id", match=MatchValue(value=req.space_id)),
-                ]
-            ),
-            limit=1000
-        )
+        # Генерировать на лету: чанки читаются постранично внутри суммаризации
+        num_chunks = await count_document_chunks_async(req.doc_id, req.space_id)
         
-        if not results[0]:
+        if not num_chunks:
             raise HTTPException(
                 status_code=404,
                 detail=f"Document {req.doc_id} not found in space {req.space_id}"
@@ -416,7 +476,8 @@ async def summarize_document(req: SummarizeRequest = Body(...)):
         
         # Суммаризация
         print(f"[Summarize] Generating on-the-fly summary for {req.doc_id}")
-        summary = await summarize_document_by_id(req.doc_id, req.space_id, req.focus)
+        with llm_priority(STREAMING):
+            summary = await summarize_document_by_id(req.doc_id, req.space_id, req.focus)
         
         # Сохранить в кэш только если нет фокуса
         if not req.focus:
@@ -424,7 +485,7 @@ async def summarize_document(req: SummarizeRequest = Body(...)):
                 doc_id=req.doc_id,
                 space_id=req.space_id,
                 summary=summary,
-                original_chunks=len(results[0]),
+                original_chunks=num_chunks,
                 summary_tokens=len(summary.split())
             )
             print(f"[Summarize] Summary saved to cache for {req.doc_id}")
@@ -433,7 +494,7 @@ async def summarize_document(req: SummarizeRequest = Body(...)):
             "doc_id": req.doc_id,
             "space_id": req.space_id,
             "summary": summary,
-            "chunks_processed": len(results[0]),
+            "chunks_processed": num_chunks,
             "focus": req.focus,
             "cached": False,
         }
@@ -478,8 +539,9 @@ async def summarize_document_stream(req: SummarizeRequest = Body(...)):
                 return
             
             # Streaming суммаризация
-            async for event in summarize_document_streaming(req.doc_id, req.space_id, req.focus):
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            with llm_priority(STREAMING):
+                async for event in summarize_document_streaming(req.doc_id, req.space_id, req.focus):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
                 
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
@@ -496,14 +558,11 @@ async def summarize_document_stream(req: SummarizeRequest = Body(...)):
 
 
 @app.post("/summarize-poll")
-async def summarize_document_poll(
-    req: SummarizeRequest = Body(...),
-    background_tasks: BackgroundTasks = None
-):
+async def summarize_document_poll(req: SummarizeRequest = Body(...)):
     """
     Long polling fallback для браузеров без SSE поддержки
     
-    Запускает суммаризацию в фоне и возвращает task_id.
+    Ставит суммаризацию в очередь задач и возвращает task_id.
     Клиент затем poll'ит статус через GET /summarize-status/{task_id}
     """
     # Проверить кэш
@@ -516,59 +575,54 @@ async def summarize_document_poll(
             "cached": True
         }
     
-    # Создать task_id
-    task_id = f"{req.doc_id}_{uuid.uuid4().hex[:8]}"
-    
-    # Запустить в фоне (simplified version - в production используйте Celery/Redis)
-    # Для демо просто вернем инструкцию использовать SSE
+    job, created = get_job_queue().enqueue(
+        req.doc_id, req.space_id, focus=req.focus, priority=PRIORITY_INTERACTIVE
+    )
     return {
-        "status": "pending",
-        "task_id": task_id,
-        "message": "Long polling not fully implemented. Please use /summarize-stream for real-time progress.",
-        "recommendation": "Use Server-Sent Events endpoint: POST /summarize-stream"
+        "status": job["status"],
+        "task_id": job["id"],
+        "deduplicated": not created,
     }
 
 
-def _generate_and_save_summary_task(
-    doc_id: str,
-    space_id: str,
-    doc_type: str,
-    num_chunks: int
-):
+def _job_status(job: Dict) -> Dict:
+    status = {
+        "task_id": job["id"],
+        "doc_id": job["doc_id"],
+        "space_id": job["space_id"],
+        "focus": job["focus"] or None,
+        "status": "complete" if job["status"] == "done" else job["status"],
+        "progress": job["progress"],
+        "stage": job["stage"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+    }
+    if job["status"] == "queued" and job["run_after"] > time.time():
+        status["retry_in_seconds"] = round(job["run_after"] - time.time(), 1)
+    if job["status"] == "done":
+        status["summary"] = job["result"]
+    return status
+
+
+@app.get("/summarize-status/{task_id}")
+def summarize_status(task_id: str):
     """
-    Background task для генерации и сохранения summary
+    Статус задачи суммаризации (для /summarize-poll, regenerate, bulk)
     """
-    import asyncio
-    try:
-        print(f"[Background] Starting summarization for {doc_id}")
-        
-        # Генерировать summary
-        summary = asyncio.run(summarize_document_by_id(doc_id, space_id, focus=None))
-        
-        # Сохранить в отдельной коллекции
-        summary_id = save_document_summary(
-            doc_id=doc_id,
-            space_id=space_id,
-            summary=summary,
-            doc_type=doc_type,
-            original_chunks=num_chunks
-        )
-        
-        # Обновить флаг в основной коллекции
-        update_main_collection_summary_flag(doc_id, space_id, summary_id)
-        
-        print(f"[Background] Summary saved for {doc_id}, id={summary_id}")
-        
-    except Exception as e:
-        print(f"[Background] Summarization failed for {doc_id}: {e}")
+    job = get_job_queue().get(task_id)
+    if job is None:
+        raise HTTPException(404, f"Task {task_id} not found")
+    return _job_status(job)
 
 
 @app.get("/health")
 def health():
     """Lightweight health probe for container orchestration and manual checks."""
     qdrant_ok, qdrant_detail = True, "ok"
+    payload_indexes = None
     try:
         qdrant_client().get_collections()
+        payload_indexes = payload_index_status(qdrant_client(), config.QDRANT_COLLECTION)
     except Exception as e:
         qdrant_ok, qdrant_detail = False, str(e)
 
@@ -583,7 +637,7 @@ def health():
         try:
             import requests
 
-            r = requests.get("http://ollama:11434/api/tags", timeout=2)
+            r = requests.get(f"{config.LLM_OLLAMA_URL}/api/tags", timeout=2)
             r.raise_for_status()
         except Exception as e:
             llm_ok = False
@@ -593,13 +647,14 @@ def health():
     return {
         "status": status,
         "components": {
-            "qdrant": {"ok": qdrant_ok, "detail": qdrant_detail},
+            "qdrant": {"ok": qdrant_ok, "detail": qdrant_detail, "payload_indexes": payload_indexes},
             "embedder": {
                 "ok": embedder_ok,
                 "dimension": embedder_dim,
                 "model": config.EMBED_MODEL,
             },
             "llm": {"ok": llm_ok, "mode": llm_mode, "model": config.LLM_MODEL},
+            "keyword_engine": config.KEYWORD_ENGINE,
             "keyword_index_dir": str(config.KEYWORD_INDEX_DIR),
         },
         "metrics": metrics_snapshot(),
@@ -608,7 +663,24 @@ def health():
 
 @app.get("/metrics")
 def metrics_endpoint():
-    return metrics_snapshot()
+    snapshot = metrics_snapshot()
+    try:
+        snapshot["keyword_index"] = kw_stats()
+    except Exception as e:
+        snapshot["keyword_index"] = {"error": str(e)}
+    snapshot["rerank"] = rerank.stats()
+    if config.EMBED_BATCHING_ENABLED:
+        snapshot["embed_batcher"] = get_batcher().stats()
+    summary_cache = get_summary_cache()
+    if summary_cache is not None:
+        snapshot["summary_cache"] = summary_cache.stats()
+    snapshot["summary_jobs"] = get_job_queue().stats()
+    gateway = get_llm_gateway()
+    if gateway is not None:
+        snapshot["llm_gateway"] = gateway.stats()
+    if config.LLM_MODE in ("ollama", "vllm"):
+        snapshot["llm_router"] = get_llm_router().stats()
+    return snapshot
 
 
 @app.get("/model-config")
@@ -643,6 +715,10 @@ def get_summary_status(doc_id: str, space_id: str = Query(...)):
     Проверить наличие summary для документа
     """
     summary_info = get_document_summary(doc_id, space_id)
+    job = get_job_queue().latest_for(doc_id, space_id)
+    job_info = _job_status(job) if job else None
+    if job_info:
+        job_info.pop("summary", None)
     
     if summary_info:
         return {
@@ -653,12 +729,14 @@ def get_summary_status(doc_id: str, space_id: str = Query(...)):
             "summary_tokens": summary_info.get("summary_tokens"),
             "generated_at": summary_info.get("generated_at"),
             "model": summary_info.get("model"),
+            "job": job_info,
         }
     else:
         return {
             "doc_id": doc_id,
             "space_id": space_id,
             "has_summary": False,
+            "job": job_info,
         }
 
 
@@ -694,26 +772,21 @@ def regenerate_summary(
         raise HTTPException(404, f"Document {doc_id} not found")
     
     doc_type = results[0][0].payload.get("doc_type")
-    num_chunks = len(results[0])
     
     if background_tasks:
-        # Асинхронная регенерация
-        print(f"[API] Scheduling summary regeneration for {doc_id}")
-        background_tasks.add_task(
-            _generate_and_save_summary_task,
-            doc_id=doc_id,
-            space_id=space_id,
-            doc_type=doc_type,
-            num_chunks=num_chunks
-        )
+        # Асинхронная регенерация через очередь задач
+        print(f"[API] Queueing summary regeneration for {doc_id}")
+        job, _ = get_job_queue().enqueue(doc_id, space_id, doc_type=doc_type, priority=PRIORITY_DEFAULT)
         return {
             "doc_id": doc_id,
             "space_id": space_id,
             "status": "pending",
+            "task_id": job["id"],
             "message": "Summary regeneration scheduled"
         }
     else:
         # Синхронная регенерация
+        num_chunks = count_document_chunks(doc_id, space_id)
         summary = summarize_document_by_id(doc_id, space_id)
         summary_id = save_document_summary(
             doc_id=doc_id,
@@ -737,7 +810,6 @@ def bulk_summarize(
     space_id: str = Query(...),
     doc_types: Optional[List[str]] = Query(None),
     limit: int = Query(100),
-    background_tasks: BackgroundTasks = None,
 ):
     """
     Массовая суммаризация документов в space
@@ -758,6 +830,7 @@ def bulk_summarize(
     from services.qdrant_store import client
     from qdrant_client.models import Filter, FieldCondition, MatchValue
     
+    task_ids = []
     for doc_id in docs_without_summary:
         # Получить метаданные документа
         results = client().scroll(
@@ -768,27 +841,22 @@ def bulk_summarize(
                     FieldCondition(key="space_id", match=MatchValue(value=space_id)),
                 ]
             ),
-            limit=1000
+            limit=1,
+            with_vectors=False
         )
         
         if results[0]:
             doc_type = results[0][0].payload.get("doc_type")
-            num_chunks = len(results[0])
-            
-            if background_tasks:
-                background_tasks.add_task(
-                    _generate_and_save_summary_task,
-                    doc_id=doc_id,
-                    space_id=space_id,
-                    doc_type=doc_type,
-                    num_chunks=num_chunks
-                )
+            # Низкий приоритет: интерактивные запросы к LLM идут раньше
+            job, _ = get_job_queue().enqueue(doc_id, space_id, doc_type=doc_type, priority=PRIORITY_BULK)
+            task_ids.append(job["id"])
     
     return {
         "space_id": space_id,
         "documents_to_process": len(docs_without_summary),
         "doc_ids": docs_without_summary,
-        "status": "scheduled" if background_tasks else "processing"
+        "task_ids": task_ids,
+        "status": "scheduled"
     }
 
 
@@ -1076,12 +1144,13 @@ def delete_chat_thread(thread_id: str, space_id: str = Query(...)):
         raise HTTPException(500, f"Failed to delete thread: {str(e)}")
 
 
-async def _summarize_thread_background(thread_id: str, space_id: str, thread):
-    """Background task для суммаризации треда"""
+def _summarize_thread_background(thread_id: str, space_id: str, thread):
+    """Background task для суммаризации треда (в пуле потоков, фоновый приоритет LLM)"""
     try:
         print(f"[Background] Summarizing thread {thread_id}")
         
-        result = await summarize_thread(thread)
+        with llm_priority(BACKGROUND):
+            result = asyncio.run(summarize_thread(thread))
         
         save_thread_summary(
             thread_id=thread_id,
@@ -1131,19 +1200,50 @@ def _determine_top_k(requested: Optional[int], doc_types: Optional[List[str]], q
     return max(1, target)
 
 
-def _apply_mmr(results: List[Dict], query: str, top_k: int) -> List[Dict]:
+def _coarse_doc_ids(hits: List[Dict], space_id: Optional[str]) -> Optional[List[str]]:
+    doc_ids = two_stage_doc_ids(hits, space_id)
+    if not doc_ids:
+        return None
+    print(f"[Retrieval] Two-stage: chunk search limited to {len(doc_ids)} documents")
+    return doc_ids
+
+
+def _two_stage_doc_ids(qctx: QueryContext) -> Optional[List[str]]:
+    """Stage 1 of two-stage retrieval: top documents by summary vector (None = search all chunks)"""
+    if not config.TWO_STAGE_RETRIEVAL:
+        return None
+    try:
+        return _coarse_doc_ids(search_summaries(qctx.vector, qctx.space_id, config.TWO_STAGE_TOP_DOCS), qctx.space_id)
+    except Exception as e:
+        print(f"[Retrieval] Summary search failed, searching all chunks: {e}")
+        return None
+
+
+async def _two_stage_doc_ids_async(qctx: QueryContext) -> Optional[List[str]]:
+    if not config.TWO_STAGE_RETRIEVAL:
+        return None
+    try:
+        hits = await search_summaries_async(await qctx.vector_async(), qctx.space_id, config.TWO_STAGE_TOP_DOCS)
+        return await asyncio.to_thread(_coarse_doc_ids, hits, qctx.space_id)
+    except Exception as e:
+        print(f"[Retrieval] Summary search failed, searching all chunks: {e}")
+        return None
+
+
+def _apply_mmr(results: List[Dict], qctx: QueryContext, top_k: int) -> List[Dict]:
     if not config.MMR_ENABLED:
         return results[:top_k]
     if not results:
         return results
 
-    query_vec = embed(query)
+    # Candidate vectors are encoded in one batch up front instead of one call per candidate
+    snippets = [((r.get("payload") or {}).get("text") or "")[:1000] for r in results]
+    vectors = dict(zip(snippets, qctx.text_vectors(snippets)))
 
     def _embed_text(text: str):
-        snippet = (text or "")[:1000]
-        return embed(snippet) if snippet else []
+        return vectors.get((text or "")[:1000]) or []
 
-    selected = mmr(query_vec, results, top_k=top_k, lambda_mult=config.MMR_LAMBDA, embed_text=_embed_text)
+    selected = mmr(qctx.vector, results, top_k=top_k, lambda_mult=config.MMR_LAMBDA, embed_text=_embed_text)
     if len(selected) < top_k:
         remaining = [r for r in results if r not in selected]
         selected.extend(remaining[: max(0, top_k - len(selected))])
@@ -1249,6 +1349,19 @@ def _ask_cache_key(query: str, space_id: Optional[str], doc_types: Optional[List
     )
 
 
+_SEARCH_RESULT_FIELDS = ("results", "semantic_only", "bm25_only")
+
+
+def _cacheable_search_response(response: Dict) -> Dict:
+    if not config.LEAN_PAYLOADS:
+        return deepcopy(response)
+    # Lean mode: cache ids/metadata only, text is re-hydrated on hit
+    lean = dict(response)
+    for field in _SEARCH_RESULT_FIELDS:
+        lean[field] = deepcopy(strip_text(response.get(field, [])))
+    return lean
+
+
 def _count_context_tokens(items: List[Dict]) -> int:
     total = 0
     for item in items:
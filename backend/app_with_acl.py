@@ -21,10 +21,12 @@ from services.categories import (
     normalize_doc_type,
 )
 from services.chunking import split_markdown
-from services.embeddings import embed, get_embedder
+from services.embeddings import get_embedder
+from services.query_context import QueryContext
 from services.fusion import mmr, rrf
 from services.keyword_index import add_chunks as kw_add, search as kw_search
 from services.cache import ask_cache, search_cache
+from services.chunk_store import hydrate
 from services.text_cleaning import clean_chunk
 from services.metrics import record_search, record_ask, snapshot as metrics_snapshot
 from services import rerank
@@ -278,9 +280,10 @@ def search(
     
     norm_doc_types = _normalize_doc_types(doc_types, q)
     effective_top_k = _determine_top_k(top_k, norm_doc_types, q)
+    qctx = QueryContext(q, space_id, norm_doc_types)
     
     # Semantic search with ACL
-    sem = semantic_search_with_acl(q, context, norm_doc_types, effective_top_k)
+    sem = semantic_search_with_acl(q, context, norm_doc_types, effective_top_k, ctx=qctx)
     
     # Keyword search (would need similar ACL integration)
     lex = kw_search(q, space_id, norm_doc_types, effective_top_k)
@@ -290,9 +293,9 @@ def search(
         config.CONTEXT_MAX_CHUNKS * 2,
         effective_top_k * (config.MMR_CANDIDATE_MULTIPLIER if config.MMR_ENABLED else 1)
     )
-    candidate_pool = rrf(sem, lex, top_k=pool_top_k)
-    candidate_pool = rerank.apply_rerank(q, candidate_pool)
-    mmr_selected = _apply_mmr(candidate_pool, q, effective_top_k)
+    candidate_pool = hydrate(rrf(sem, lex, top_k=pool_top_k))
+    candidate_pool = rerank.apply_rerank(q, candidate_pool, ctx=qctx)
+    mmr_selected = _apply_mmr(candidate_pool, qctx, effective_top_k)
     fused = _limit_one_chunk_per_doc(mmr_selected, candidate_pool, effective_top_k)
     
     # Filter out any results that shouldn't be accessible (defense in depth)
@@ -344,15 +347,16 @@ def ask(req: AskRequest = Body(...), current_user: Dict = Depends(get_current_us
     
     norm_doc_types = _normalize_doc_types(req.doc_types, req.q)
     effective_top_k = _determine_top_k(req.top_k or config.TOP_K_DEFAULT, norm_doc_types, req.q)
+    qctx = QueryContext(req.q, req.space_id, norm_doc_types)
     
     # Search with ACL
-    sem = semantic_search_with_acl(req.q, context, norm_doc_types, effective_top_k)
+    sem = semantic_search_with_acl(req.q, context, norm_doc_types, effective_top_k, ctx=qctx)
     lex = kw_search(req.q, req.space_id, norm_doc_types, effective_top_k)
     
     pool_top_k = effective_top_k * (config.MMR_CANDIDATE_MULTIPLIER if config.MMR_ENABLED else 1)
-    candidate_pool = rrf(sem, lex, top_k=pool_top_k)
-    candidate_pool = rerank.apply_rerank(req.q, candidate_pool)
-    mmr_selected = _apply_mmr(candidate_pool, req.q, effective_top_k)
+    candidate_pool = hydrate(rrf(sem, lex, top_k=pool_top_k))
+    candidate_pool = rerank.apply_rerank(req.q, candidate_pool, ctx=qctx)
+    mmr_selected = _apply_mmr(candidate_pool, qctx, effective_top_k)
     fused = _limit_one_chunk_per_doc(mmr_selected, candidate_pool, effective_top_k)
     
     # Access control filter
@@ -360,7 +364,7 @@ def ask(req: AskRequest = Body(...), current_user: Dict = Depends(get_current_us
     filtered = [r for r in fused if acl_service.can_access_document(context, r["payload"])]
     
     # RAG
-    prompt = build_prompt(filtered, req.q)
+    prompt = build_prompt(filtered, req.q, ctx=qctx)
     answer = call_llm(prompt)
     
     sources = [
@@ -494,19 +498,19 @@ def _determine_top_k(requested: Optional[int], doc_types: Optional[List[str]], q
     return max(1, target)
 
 
-def _apply_mmr(results: List[Dict], query: str, top_k: int) -> List[Dict]:
+def _apply_mmr(results: List[Dict], qctx: QueryContext, top_k: int) -> List[Dict]:
     if not config.MMR_ENABLED:
         return results[:top_k]
     if not results:
         return results
     
-    query_vec = embed(query)
+    snippets = [((r.get("payload") or {}).get("text") or "")[:1000] for r in results]
+    vectors = dict(zip(snippets, qctx.text_vectors(snippets)))
     
     def _embed_text(text: str):
-        snippet = (text or "")[:1000]
-        return embed(snippet) if snippet else []
+        return vectors.get((text or "")[:1000]) or []
     
-    selected = mmr(query_vec, results, top_k=top_k, lambda_mult=config.MMR_LAMBDA, embed_text=_embed_text)
+    selected = mmr(qctx.vector, results, top_k=top_k, lambda_mult=config.MMR_LAMBDA, embed_text=_embed_text)
     if len(selected) < top_k:
         remaining = [r for r in results if r not in selected]
         selected.extend(remaining[: max(0, top_k - len(selected))])
@@ -12,11 +12,16 @@ class TTLCache:
         self.ttl = ttl
         self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
         self._lock = Lock()
+        self._last_purge = 0.0
 
     def _purge(self) -> None:
         if not self._data:
             return
         now = time.time()
+        # Full scans at most once per second; get() checks expiry of its own key
+        if now - self._last_purge < 1.0:
+            return
+        self._last_purge = now
         keys_to_delete = [key for key, (_, ts) in self._data.items() if now - ts > self.ttl]
         for key in keys_to_delete:
             self._data.pop(key, None)
@@ -27,6 +32,8 @@ class TTLCache:
             if key not in self._data:
                 return None
             value, timestamp = self._data.pop(key)
+            if time.time() - timestamp > self.ttl:
+                return None
             self._data[key] = (value, timestamp)
             return value
 
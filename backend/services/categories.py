@@ -159,22 +159,33 @@ _keywords: Dict[DocType, Iterable[str]] = {
 _classifier = None
 
 
-def _load_classifier():
-    global _classifier
-    if _classifier is not None:
-        return _classifier
+def load_local_classifier():
     model_path = config.DOC_TYPE_MODEL_PATH
     if not model_path or joblib is None:
-        _classifier = None
-        return _classifier
+        return None
     try:
         path = Path(model_path)
         if not path.exists():
             raise FileNotFoundError
-        pipeline = joblib.load(path)
+        return joblib.load(path)
     except Exception:
-        pipeline = None
-    _classifier = pipeline
+        return None
+
+
+def _load_classifier():
+    global _classifier
+    if _classifier is not None:
+        return _classifier
+    from .model_server import RemoteClassifier, get_client, remote_enabled
+
+    if remote_enabled():
+        try:
+            _classifier = RemoteClassifier(get_client()) if get_client().info().get("classifier") else None
+        except Exception:
+            # Server not up yet: heuristics only for now, ask again next time
+            return None
+    else:
+        _classifier = load_local_classifier()
     return _classifier
 
 
@@ -0,0 +1,221 @@
+"""
+Chunk Text Store
+Holds chunk text once in a local SQLite file keyed by Qdrant point id.
+With LEAN_PAYLOADS, Qdrant/Whoosh keep only ids + metadata and the text is
+hydrated in one batch for the chunks that are actually used.
+The same file holds the ingest-time chunk summaries (see chunk_summaries).
+"""
+
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import config
+
+
+class ChunkStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " id TEXT PRIMARY KEY,"
+                " doc_id TEXT NOT NULL,"
+                " space_id TEXT,"
+                " chunk_index INTEGER,"
+                " text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_summaries ("
+                " id TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " doc_id TEXT NOT NULL,"
+                " summary TEXT NOT NULL,"
+                " PRIMARY KEY (id, version))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_summaries_doc ON chunk_summaries(doc_id)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def put_many(self, rows: Iterable[Tuple[str, str, str, int, str]]) -> None:
+        """rows: (point_id, doc_id, space_id, chunk_index, text)"""
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, doc_id, space_id, chunk_index, text) VALUES (?, ?, ?, ?, ?)",
+                list(rows),
+            )
+            conn.commit()
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, str]:
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        if not ids:
+            return {}
+        out: Dict[str, str] = {}
+        with self._lock:
+            conn = self._connect()
+            # SQLite limits bound parameters; query in slices
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                marks = ",".join("?" * len(part))
+                for row_id, text in conn.execute(
+                    f"SELECT id, text FROM chunks WHERE id IN ({marks})", part
+                ):
+                    out[row_id] = text
+        return out
+
+    def put_summaries(self, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """rows: (point_id, version, doc_id, summary)"""
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_summaries (id, version, doc_id, summary) VALUES (?, ?, ?, ?)",
+                list(rows),
+            )
+            conn.commit()
+
+    def replace_summaries(self, doc_id: str, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Drop every stored summary of doc_id and store rows instead, in one transaction"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM chunk_summaries WHERE doc_id = ?", (doc_id,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunk_summaries (id, version, doc_id, summary) VALUES (?, ?, ?, ?)",
+                    list(rows),
+                )
+
+    def get_summaries(self, ids: Iterable[str], version: str) -> Dict[str, str]:
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        if not ids:
+            return {}
+        out: Dict[str, str] = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                marks = ",".join("?" * len(part))
+                for row_id, summary in conn.execute(
+                    f"SELECT id, summary FROM chunk_summaries WHERE version = ? AND id IN ({marks})",
+                    [version, *part],
+                ):
+                    out[row_id] = summary
+        return out
+
+    def delete_doc(self, doc_id: str) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM chunk_summaries WHERE doc_id = ?", (doc_id,))
+            conn.commit()
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_store: Optional[ChunkStore] = None
+
+
+def get_chunk_store() -> ChunkStore:
+    global _store
+    if _store is None:
+        _store = ChunkStore(config.CHUNK_STORE_PATH)
+    return _store
+
+
+def save_chunks(space_id: str, doc_id: str, chunks: List[str]) -> None:
+    from .qdrant_store import chunk_point_id
+
+    get_chunk_store().put_many(
+        (chunk_point_id(space_id, doc_id, idx), doc_id, space_id, idx, text)
+        for idx, text in enumerate(chunks)
+    )
+
+
+def _item_point_id(payload: Dict) -> Optional[str]:
+    from .qdrant_store import chunk_point_id
+
+    doc_id = payload.get("doc_id")
+    chunk_index = payload.get("chunk_index")
+    if doc_id is None or chunk_index is None:
+        return None
+    return chunk_point_id(payload.get("space_id") or "", doc_id, chunk_index)
+
+
+def hydrate(items: List[Dict]) -> List[Dict]:
+    """
+    Fill payload["text"] in place for search results that came back without it.
+
+    One SQLite batch for all items; misses (points indexed before LEAN_PAYLOADS)
+    fall back to one Qdrant retrieve with the text payload.
+    """
+    missing: Dict[str, List[Dict]] = {}
+    for item in items:
+        payload = item.get("payload")
+        if payload is None or payload.get("text"):
+            continue
+        point_id = _item_point_id(payload)
+        if point_id:
+            missing.setdefault(point_id, []).append(payload)
+    if not missing:
+        return items
+
+    found = get_chunk_store().get_many(missing.keys())
+    leftovers = [pid for pid in missing if pid not in found]
+    if leftovers:
+        found.update(_fetch_from_qdrant(leftovers))
+
+    for point_id, payloads in missing.items():
+        text = found.get(point_id)
+        if text is None:
+            continue
+        for payload in payloads:
+            payload["text"] = text
+    return items
+
+
+def _fetch_from_qdrant(point_ids: List[str]) -> Dict[str, str]:
+    from .qdrant_store import client
+
+    try:
+        points = client().retrieve(
+            collection_name=config.QDRANT_COLLECTION,
+            ids=point_ids,
+            with_payload=["text"],
+            with_vectors=False,
+        )
+    except Exception as e:
+        print(f"[ChunkStore] Qdrant fallback failed: {e}")
+        return {}
+    return {str(p.id): (p.payload or {}).get("text", "") for p in points if (p.payload or {}).get("text")}
+
+
+def point_texts(points) -> List[str]:
+    """Texts for scrolled Qdrant points, reading the chunk store for lean payloads"""
+    lean_ids = [str(p.id) for p in points if not (p.payload or {}).get("text")]
+    stored = get_chunk_store().get_many(lean_ids) if lean_ids else {}
+    return [(p.payload or {}).get("text") or stored.get(str(p.id), "") for p in points]
+
+
+def strip_text(items: List[Dict]) -> List[Dict]:
+    """Copies of search results without payload text (for caches)"""
+    out = []
+    for item in items:
+        payload = {k: v for k, v in (item.get("payload") or {}).items() if k != "text"}
+        out.append({**item, "payload": payload})
+    return out
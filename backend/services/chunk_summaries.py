@@ -0,0 +1,70 @@
+"""
+Ingest-Time Chunk Summaries
+With CHUNK_SUMMARIES_ENABLED, a background stage after ingest asks the LLM for
+a short summary of every chunk and stores it in the chunk store, keyed by point
+id and a version (LLM model + summary length), so switching LLM_MODEL simply
+leaves the old rows unused. Regenerating a document (re-ingest) replaces all
+of its rows.
+
+/ask in summarize mode then builds its compressed context from these summaries
+with no LLM calls at query time; chunks without a summary yet fall back to
+extractive compression, and if none of the retrieved chunks has one the query
+path runs the usual map-reduce.
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from . import config
+from .chunk_store import _item_point_id, get_chunk_store
+from .llm_gateway import BACKGROUND, llm_priority
+
+
+def summary_version() -> str:
+    return f"{config.LLM_MODEL}|{config.CHUNK_SUMMARY_MAX_TOKENS}w"
+
+
+async def generate_chunk_summaries(space_id: str, doc_id: str, chunks: List[str]) -> int:
+    """Summarize every chunk of a document through map_summaries; returns rows stored"""
+    from .qdrant_store import chunk_point_id
+    from .summarization import _is_failed, map_summaries
+
+    version = summary_version()
+    rows = []
+    async for index, summary, _ in map_summaries(chunks, max_summary_tokens=config.CHUNK_SUMMARY_MAX_TOKENS):
+        if not summary or _is_failed(summary):
+            continue
+        rows.append((chunk_point_id(space_id, doc_id, index), version, doc_id, summary))
+    # Replace, not merge: after a re-ingest, summaries of chunks that failed this
+    # time or no longer exist must not survive from the previous version
+    get_chunk_store().replace_summaries(doc_id, rows)
+    return len(rows)
+
+
+def generate_chunk_summaries_task(space_id: str, doc_id: str, chunks: List[str]) -> None:
+    """Background task entry point (BackgroundTasks / CLI)"""
+    try:
+        with llm_priority(BACKGROUND):
+            stored = asyncio.run(generate_chunk_summaries(space_id, doc_id, chunks))
+        print(f"[ChunkSummaries] {doc_id}: {stored}/{len(chunks)} chunk summaries stored")
+    except Exception as e:
+        print(f"[ChunkSummaries] Generation failed for {doc_id}: {e}")
+
+
+def lookup_chunk_summaries(items: List[Dict]) -> List[Optional[str]]:
+    """Precomputed summary per search result (None where missing), one SQLite batch"""
+    ids = [_item_point_id(item.get("payload") or {}) for item in items]
+    found = get_chunk_store().get_summaries([i for i in ids if i], summary_version())
+    return [found.get(i) if i else None for i in ids]
+
+
+def build_summary_context(items: List[Dict], summaries: List[Optional[str]], ctx=None) -> str:
+    """Context in the summarize_chunks layout, from stored summaries (compressed text as fallback)"""
+    parts = []
+    for item, summary in zip(items, summaries):
+        payload = item.get("payload", {})
+        if summary is None:
+            text = payload.get("text", "")
+            summary = ctx.compress(text) if ctx is not None else text
+        parts.append(f"[Source: {payload.get('doc_id', 'unknown')} chunk {payload.get('chunk_index', 0)}]\n{summary}")
+    return "\n\n---\n\n".join(parts)
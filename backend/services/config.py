@@ -1,21 +1,125 @@
 
 import os
+import socket
 from pathlib import Path
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "docs")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
 QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
 QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
 QDRANT_HNSW_EF_SEARCH = int(os.getenv("QDRANT_HNSW_EF_SEARCH", "64"))
 
+# Vector quantization (none|scalar|binary); originals are kept on disk when enabled
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_QUANTIZATION_RESCORE = os.getenv("QDRANT_QUANTIZATION_RESCORE", "true").lower() == "true"
+QDRANT_QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
+# Embedder/reranker inference: torch (sentence-transformers) | onnx (ONNX Runtime, CPU)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "int8").lower()   # int8|none
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = onnxruntime default
+ONNX_CACHE_DIR = Path(os.getenv("ONNX_CACHE_DIR", "/data/onnx_models")).resolve()
+
+# Query embeddings arriving within the window are encoded together in one batch
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "true").lower() == "true"
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "2"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+
+# Shared model server (python -m cli.model_server): when the socket is set, workers
+# use its embedder/reranker/classifier instead of loading their own copies
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "30"))
+MODEL_SERVER_SHM_MIN_BYTES = int(os.getenv("MODEL_SERVER_SHM_MIN_BYTES", "16384"))
+
 KEYWORD_INDEX_DIR = Path(os.getenv("KEYWORD_INDEX_DIR", "/data/whoosh_index")).resolve()
 KEYWORD_INDEX_DIR.mkdir(parents=True, exist_ok=True)
 
+# Whoosh partitioning: one index directory per space (opened lazily, LRU of open
+# indexes) plus an optional global index in KEYWORD_INDEX_DIR for cross-space queries
+KEYWORD_PARTITION_BY_SPACE = os.getenv("KEYWORD_PARTITION_BY_SPACE", "false").lower() == "true"
+KEYWORD_GLOBAL_INDEX = os.getenv("KEYWORD_GLOBAL_INDEX", "true").lower() == "true"
+KEYWORD_SPACE_INDEX_DIR = Path(
+    os.getenv("KEYWORD_SPACE_INDEX_DIR", str(KEYWORD_INDEX_DIR.parent / f"{KEYWORD_INDEX_DIR.name}_spaces"))
+).resolve()
+KEYWORD_OPEN_INDEXES_MAX = int(os.getenv("KEYWORD_OPEN_INDEXES_MAX", "32"))
+
+# Replicated Whoosh: mutations go to a shared write-ahead log that every replica
+# tails; new replicas restore the latest snapshot and replay the log from there
+KEYWORD_WAL_ENABLED = os.getenv("KEYWORD_WAL_ENABLED", "false").lower() == "true"
+KEYWORD_WAL_DIR = Path(
+    os.getenv("KEYWORD_WAL_DIR", str(KEYWORD_INDEX_DIR.parent / "keyword_wal"))
+).resolve()
+KEYWORD_WAL_STATE_PATH = Path(
+    os.getenv("KEYWORD_WAL_STATE_PATH", str(KEYWORD_INDEX_DIR.parent / "keyword_wal_position.json"))
+).resolve()
+KEYWORD_WAL_POLL_MS = int(os.getenv("KEYWORD_WAL_POLL_MS", "1000"))
+KEYWORD_WAL_SEGMENT_MB = int(os.getenv("KEYWORD_WAL_SEGMENT_MB", "64"))
+KEYWORD_WAL_KEEP_SNAPSHOTS = int(os.getenv("KEYWORD_WAL_KEEP_SNAPSHOTS", "2"))
+KEYWORD_WAL_FSYNC = os.getenv("KEYWORD_WAL_FSYNC", "true").lower() == "true"
+KEYWORD_REPLICA_ID = os.getenv("KEYWORD_REPLICA_ID", socket.gethostname())
+
+# Keyword engine: whoosh (local index + RRF in Python) | qdrant_sparse (BM25 sparse
+# vectors in the Qdrant collection, dense + sparse fused by Qdrant in one query) |
+# numpy (in-process BM25 over memory-mapped CSR postings)
+KEYWORD_ENGINE = os.getenv("KEYWORD_ENGINE", "whoosh").lower()
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+NUMPY_BM25_DIR = Path(
+    os.getenv("NUMPY_BM25_DIR", str(KEYWORD_INDEX_DIR.parent / "bm25_index"))
+).resolve()
+NUMPY_BM25_MAX_SEGMENTS = int(os.getenv("NUMPY_BM25_MAX_SEGMENTS", "8"))
+
+# Whoosh writes: documents are queued and committed in batches by a background
+# thread; merges follow KEYWORD_MERGE_POLICY (small|optimize|none)
+KEYWORD_BATCH_WRITES = os.getenv("KEYWORD_BATCH_WRITES", "true").lower() == "true"
+KEYWORD_COMMIT_INTERVAL_MS = int(os.getenv("KEYWORD_COMMIT_INTERVAL_MS", "500"))
+KEYWORD_COMMIT_MAX_DOCS = int(os.getenv("KEYWORD_COMMIT_MAX_DOCS", "200"))
+KEYWORD_MERGE_POLICY = os.getenv("KEYWORD_MERGE_POLICY", "small").lower()
+KEYWORD_MAX_SEGMENTS = int(os.getenv("KEYWORD_MAX_SEGMENTS", "10"))
+KEYWORD_WRITER_LOCK_TIMEOUT = float(os.getenv("KEYWORD_WRITER_LOCK_TIMEOUT", "10"))
+# A failing commit is retried with exponential backoff; after the last attempt
+# documents are committed one by one and the ones that still fail are appended
+# to the dead-letter file (JSONL, same fields as the WAL "add" record)
+KEYWORD_COMMIT_MAX_ATTEMPTS = int(os.getenv("KEYWORD_COMMIT_MAX_ATTEMPTS", "5"))
+KEYWORD_COMMIT_RETRY_BACKOFF_MS = int(os.getenv("KEYWORD_COMMIT_RETRY_BACKOFF_MS", "500"))
+KEYWORD_DEAD_LETTER_PATH = Path(
+    os.getenv("KEYWORD_DEAD_LETTER_PATH", str(KEYWORD_INDEX_DIR.parent / "keyword_dead_letter.jsonl"))
+).resolve()
+
+# Whoosh reads: pooled long-lived searchers, refreshed on index generation change
+KEYWORD_SEARCHER_POOL_SIZE = int(os.getenv("KEYWORD_SEARCHER_POOL_SIZE", "4"))
+KEYWORD_SEARCHER_REFRESH_MS = int(os.getenv("KEYWORD_SEARCHER_REFRESH_MS", "1000"))
+KEYWORD_QUERY_CACHE_SIZE = int(os.getenv("KEYWORD_QUERY_CACHE_SIZE", "256"))
+
+# Lean payloads: chunk text lives only in the local chunk store (SQLite)
+LEAN_PAYLOADS = os.getenv("LEAN_PAYLOADS", "false").lower() == "true"
+CHUNK_STORE_PATH = Path(
+    os.getenv("CHUNK_STORE_PATH", str(KEYWORD_INDEX_DIR.parent / "chunk_store.sqlite3"))
+).resolve()
+
 LLM_MODE = os.getenv("LLM_MODE", "ollama")     # ollama|vllm|none
 LLM_MODEL = os.getenv("LLM_MODEL", "llama3.1:8b")
 LLM_VLLM_URL = os.getenv("LLM_VLLM_URL", "http://vllm:8001/v1")
+LLM_OLLAMA_URL = os.getenv("LLM_OLLAMA_URL", "http://ollama:11434")
+# LLM endpoint pool: "endpoints" in LLM_ENDPOINTS_PATH (replicas of LLM_MODEL,
+# e.g. MIG slices); without it the single LLM_OLLAMA_URL / LLM_VLLM_URL endpoint.
+# Balancing least_outstanding|ewma, failover to another replica, circuit breaker
+# after consecutive failures (not with a single endpoint), active health checks
+# (0 interval = passive only) that open the breaker only when opted in
+LLM_ENDPOINTS_PATH = Path(
+    os.getenv("LLM_ENDPOINTS_PATH", str(Path(__file__).resolve().parents[2] / "config" / "llm_models.json"))
+).resolve()
+LLM_ROUTER_STRATEGY = os.getenv("LLM_ROUTER_STRATEGY", "least_outstanding").lower()
+LLM_ROUTER_MAX_ATTEMPTS = int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", "2"))
+LLM_ROUTER_FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3"))
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "15"))
+LLM_HEALTH_CHECK_OPENS_BREAKER = os.getenv("LLM_HEALTH_CHECK_OPENS_BREAKER", "false").lower() == "true"
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 
 _DEFAULT_DOC_TYPE_MODEL_PATH = (
@@ -33,12 +137,64 @@ AUTO_DOC_TYPES = os.getenv("AUTO_DOC_TYPES", "true").lower() == "true"
 LLM_TIMEOUT = int(os.getenv("LLM_TIMEOUT", "240"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "256"))
 LLM_STREAM_ENABLED = os.getenv("LLM_STREAM_ENABLED", "false").lower() == "true"
+# LLM gateway: requests in flight per backend, handed out by priority
+# (interactive > streaming > background); max wait per class in seconds (0 = no
+# limit), a request that would wait longer is rejected with an LLM error
+LLM_GATEWAY_ENABLED = os.getenv("LLM_GATEWAY_ENABLED", "true").lower() == "true"
+LLM_GATEWAY_CONCURRENCY_OLLAMA = int(os.getenv("LLM_GATEWAY_CONCURRENCY_OLLAMA", "1"))
+LLM_GATEWAY_CONCURRENCY_VLLM = int(os.getenv("LLM_GATEWAY_CONCURRENCY_VLLM", "16"))
+LLM_GATEWAY_MAX_WAIT_INTERACTIVE = float(os.getenv("LLM_GATEWAY_MAX_WAIT_INTERACTIVE", "60"))
+LLM_GATEWAY_MAX_WAIT_STREAMING = float(os.getenv("LLM_GATEWAY_MAX_WAIT_STREAMING", "300"))
+LLM_GATEWAY_MAX_WAIT_BACKGROUND = float(os.getenv("LLM_GATEWAY_MAX_WAIT_BACKGROUND", "0"))
+LLM_GATEWAY_MAX_QUEUE = int(os.getenv("LLM_GATEWAY_MAX_QUEUE", "256"))
 
 # Ollama specific config
 OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))  # Context window size for Ollama
 
+# Map-phase summarization: chunk summaries in flight at once, per LLM backend
+# (vLLM batches concurrent requests; Ollama serves OLLAMA_NUM_PARALLEL at a time)
+SUMMARY_MAP_CONCURRENCY_VLLM = int(os.getenv("SUMMARY_MAP_CONCURRENCY_VLLM", "8"))
+SUMMARY_MAP_CONCURRENCY_OLLAMA = int(os.getenv("SUMMARY_MAP_CONCURRENCY_OLLAMA", "1"))
+
+# REDUCE phase: flat (one prompt over all partial summaries) | tree (context-sized
+# groups reduced level by level; 0 = a third of the model context window)
+SUMMARY_REDUCE_MODE = os.getenv("SUMMARY_REDUCE_MODE", "tree").lower()
+SUMMARY_REDUCE_BATCH_TOKENS = int(os.getenv("SUMMARY_REDUCE_BATCH_TOKENS", "0"))
+SUMMARY_NODE_CACHE_MAX_ITEMS = int(os.getenv("SUMMARY_NODE_CACHE_MAX_ITEMS", "2048"))
+SUMMARY_NODE_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_NODE_CACHE_TTL_SECONDS", "86400"))
+# Persistent summary cache keyed by content hash (+ focus, model, prompt version);
+# MAP partials are cached unfocused and shared by every focus (0 TTL = no expiry)
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"
+SUMMARY_CACHE_PATH = Path(
+    os.getenv("SUMMARY_CACHE_PATH", str(KEYWORD_INDEX_DIR.parent / "summary_cache.sqlite3"))
+).resolve()
+SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "2592000"))
+# Durable summarization job queue (SQLite). Each worker runs MAP with
+# SUMMARY_MAP_CONCURRENCY_* requests in flight, so the worker count bounds the
+# LLM load of bulk runs; failed jobs retry with exponential backoff
+SUMMARY_JOBS_PATH = Path(
+    os.getenv("SUMMARY_JOBS_PATH", str(KEYWORD_INDEX_DIR.parent / "summary_jobs.sqlite3"))
+).resolve()
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", "1"))
+SUMMARY_JOB_MAX_ATTEMPTS = int(os.getenv("SUMMARY_JOB_MAX_ATTEMPTS", "3"))
+SUMMARY_JOB_BACKOFF_SECONDS = float(os.getenv("SUMMARY_JOB_BACKOFF_SECONDS", "30"))
+SUMMARY_JOB_RETENTION_SECONDS = int(os.getenv("SUMMARY_JOB_RETENTION_SECONDS", "604800"))
+# A running job is held under a lease renewed by its worker; another process
+# (or a restart) takes the job over only once the lease has expired
+SUMMARY_JOB_LEASE_SECONDS = float(os.getenv("SUMMARY_JOB_LEASE_SECONDS", "120"))
+# Page size when streaming a document's chunks from Qdrant in chunk_index order
+CHUNK_SCROLL_PAGE_SIZE = int(os.getenv("CHUNK_SCROLL_PAGE_SIZE", "256"))
+# Ingest-time per-chunk summaries (chunk store) used by /ask summarize mode
+CHUNK_SUMMARIES_ENABLED = os.getenv("CHUNK_SUMMARIES_ENABLED", "false").lower() == "true"
+CHUNK_SUMMARY_MAX_TOKENS = int(os.getenv("CHUNK_SUMMARY_MAX_TOKENS", "60"))
+
 CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "500"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+
+# BM25 parameters for qdrant_sparse; average chunk length in tokens
+SPARSE_BM25_K1 = float(os.getenv("SPARSE_BM25_K1", "1.2"))
+SPARSE_BM25_B = float(os.getenv("SPARSE_BM25_B", "0.75"))
+SPARSE_BM25_AVG_LEN = float(os.getenv("SPARSE_BM25_AVG_LEN", str(CHUNK_TOKENS)))
 CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "6"))
 ONE_CHUNK_PER_DOC = os.getenv("ONE_CHUNK_PER_DOC", "true").lower() == "true"
 CONTEXT_SNIPPET_MAX_CHARS = int(os.getenv("CONTEXT_SNIPPET_MAX_CHARS", "600"))
@@ -52,6 +208,14 @@ MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
 MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
 MMR_CANDIDATE_MULTIPLIER = int(os.getenv("MMR_CANDIDATE_MULTIPLIER", "3"))
 
+# Two-stage retrieval: top documents by summary vector, then chunk search
+# (dense + BM25) restricted to those doc_ids; no summary hits = full search
+TWO_STAGE_RETRIEVAL = os.getenv("TWO_STAGE_RETRIEVAL", "false").lower() == "true"
+TWO_STAGE_TOP_DOCS = int(os.getenv("TWO_STAGE_TOP_DOCS", "20"))
+# Documents without a summary are always added to stage 2; above this many the
+# doc_id filter is skipped and all chunks are searched
+TWO_STAGE_MAX_UNSUMMARIZED = int(os.getenv("TWO_STAGE_MAX_UNSUMMARIZED", "1000"))
+
 CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
 CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", "256"))
@@ -60,3 +224,13 @@ RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
 RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "32"))
 RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Batch size adapts to text length: batch_size * longest text (tokens) <= budget
+RERANK_BATCH_TOKEN_BUDGET = int(os.getenv("RERANK_BATCH_TOKEN_BUDGET", "4096"))
+RERANK_CACHE_ENABLED = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+RERANK_CACHE_MAX_ITEMS = int(os.getenv("RERANK_CACHE_MAX_ITEMS", "20000"))
+RERANK_CACHE_TTL_SECONDS = int(os.getenv("RERANK_CACHE_TTL_SECONDS", "3600"))
+# Cascade: only candidates with ambiguous keyword overlap go to the cross-encoder
+RERANK_CASCADE_ENABLED = os.getenv("RERANK_CASCADE_ENABLED", "false").lower() == "true"
+RERANK_CASCADE_HIGH = float(os.getenv("RERANK_CASCADE_HIGH", "1.0"))
+RERANK_CASCADE_LOW = float(os.getenv("RERANK_CASCADE_LOW", "0.0"))
+RERANK_CASCADE_PROTECT_TOP = int(os.getenv("RERANK_CASCADE_PROTECT_TOP", "3"))
@@ -1,5 +1,5 @@
 import re
-from typing import Iterable
+from typing import Iterable, Optional, Set
 
 from . import config
 
@@ -15,7 +15,7 @@ def _extract_keywords(query: str, min_len: int = 3) -> set[str]:
     }
 
 
-def compress_text(text: str, query: str) -> str:
+def compress_text(text: str, query: str, keywords: Optional[Set[str]] = None) -> str:
     text = (text or "").strip()
     if not text:
         return ""
@@ -24,7 +24,8 @@ def compress_text(text: str, query: str) -> str:
     if not sentences:
         return text[: config.CONTEXT_SNIPPET_MAX_CHARS]
 
-    keywords = _extract_keywords(query)
+    if keywords is None:
+        keywords = _extract_keywords(query)
     if keywords:
         selected: list[str] = []
         for sentence in sentences:
@@ -0,0 +1,143 @@
+"""
+Query Embedding Micro-Batcher
+Concurrent /search and /ask requests each need one query embedding. Instead of
+running the encoder with batch size 1 per request, callers enqueue their text
+and get a Future; a single scheduler thread collects everything that arrives
+within EMBED_BATCH_WINDOW_MS (or until EMBED_BATCH_MAX_SIZE texts) and encodes
+it in one call. Added latency is bounded by the window; under load the encoder
+runs full batches.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from . import config
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode_fn, window_ms: float = 2.0, max_batch: int = 32):
+        """encode_fn(texts) -> list of vectors (one per text, same order)"""
+        self.encode_fn = encode_fn
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(max_batch, 1)
+
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, Future]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.requests = 0
+        self.batches = 0
+        self.encoded = 0
+        self.max_batch_seen = 0
+        self.failures = 0
+        self.last_batch_ms = 0.0
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._start()
+            self._pending.append((text, future))
+            self.requests += 1
+            self._cond.notify_all()
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout)
+
+    async def embed_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._pending:
+                    return
+                # The window starts with the first waiting request, so latency is bounded
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+            self._encode(batch)
+
+    def _encode(self, batch: List[Tuple[str, Future]]):
+        # Claim the futures: a caller that gave up (asyncio cancellation) is
+        # dropped here, and the rest can no longer be cancelled under set_result
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Identical queries (e.g. a burst of the same search) are encoded once
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        start = time.perf_counter()
+        try:
+            vectors = self.encode_fn(list(unique))
+        except Exception as e:
+            self.failures += 1
+            print(f"[EmbedBatcher] Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.last_batch_ms = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.encoded += len(unique)
+        self.max_batch_seen = max(self.max_batch_seen, len(unique))
+        for text, future in batch:
+            future.set_result(vectors[unique[text]])
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = len(self._pending)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "encoded": self.encoded,
+            "avg_batch": round(self.encoded / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "queued": queued,
+            "failures": self.failures,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+            "window_ms": self.window * 1000,
+        }
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from .embeddings import embed_batch
+
+                _batcher = EmbeddingBatcher(
+                    embed_batch,
+                    window_ms=config.EMBED_BATCH_WINDOW_MS,
+                    max_batch=config.EMBED_BATCH_MAX_SIZE,
+                )
+    return _batcher
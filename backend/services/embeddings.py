@@ -1,17 +1,52 @@
+from typing import List
 
-from sentence_transformers import SentenceTransformer
+from . import config
 from .config import EMBED_MODEL
 
 _model = None
 
-def get_embedder() -> SentenceTransformer:
+def load_local_embedder():
+    """SentenceTransformer (INFERENCE_BACKEND=torch) or its ONNX Runtime equivalent"""
+    if config.INFERENCE_BACKEND == "onnx":
+        from .onnx_backend import OnnxEmbedder
+
+        return OnnxEmbedder(EMBED_MODEL)
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBED_MODEL)
+
+def get_embedder():
+    """Local model, or a thin client of the model server when MODEL_SERVER_SOCKET is set"""
     global _model
     if _model is None:
-        _model = SentenceTransformer(EMBED_MODEL)
+        from .model_server import RemoteEmbedder, get_client, remote_enabled
+
+        _model = RemoteEmbedder(get_client()) if remote_enabled() else load_local_embedder()
     return _model
 
 def embed(text: str):
     return get_embedder().encode(text).tolist()
 
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    if not texts:
+        return []
+    return get_embedder().encode(texts, batch_size=len(texts)).tolist()
+
+def embed_query(text: str):
+    """Query-time embedding; concurrent callers share one encoder call (EMBED_BATCHING_ENABLED)"""
+    if not config.EMBED_BATCHING_ENABLED:
+        return embed(text)
+    from .embed_batcher import get_batcher
+
+    return get_batcher().embed(text)
+
+async def embed_query_async(text: str):
+    """embed_query for async handlers: waits for the batch without blocking the event loop"""
+    if not config.EMBED_BATCHING_ENABLED:
+        return embed(text)
+    from .embed_batcher import get_batcher
+
+    return await get_batcher().embed_async(text)
+
 def dim() -> int:
     return get_embedder().get_sentence_embedding_dimension()
@@ -0,0 +1,82 @@
+"""
+Keyword Engine Selection
+Routes keyword indexing/search to the engine chosen by KEYWORD_ENGINE:
+- whoosh: local Whoosh BM25F index (results fused with dense hits in Python)
+- qdrant_sparse: BM25 sparse vectors stored next to the dense vector in Qdrant
+- numpy: in-process BM25 over memory-mapped CSR posting arrays
+"""
+
+from typing import Dict, List, Optional
+
+from . import config
+
+
+def add_chunks(space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
+    if config.KEYWORD_ENGINE == "qdrant_sparse":
+        # Sparse vectors are written together with the dense ones in upsert_chunks
+        return
+    if config.KEYWORD_ENGINE == "numpy":
+        from .numpy_bm25 import add_chunks as numpy_add
+
+        return numpy_add(space_id, doc_id, doc_type, chunks)
+    from .keyword_index import add_chunks as whoosh_add
+
+    whoosh_add(space_id, doc_id, doc_type, chunks)
+
+
+def search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+           doc_ids: Optional[List[str]] = None):
+    """doc_ids restricts the search to those documents (two-stage retrieval)"""
+    if config.KEYWORD_ENGINE == "qdrant_sparse":
+        from .qdrant_store import sparse_search
+
+        return sparse_search(q, space_id, doc_types, top_k, doc_ids=doc_ids)
+    if config.KEYWORD_ENGINE == "numpy":
+        from .numpy_bm25 import search as numpy_search
+
+        return numpy_search(q, space_id, doc_types, top_k, doc_ids)
+    from .keyword_index import search as whoosh_search
+
+    return whoosh_search(q, space_id, doc_types, top_k, doc_ids)
+
+
+def delete_doc(doc_id: str, space_id: Optional[str] = None):
+    if config.KEYWORD_ENGINE == "qdrant_sparse":
+        # Sparse vectors are deleted together with the Qdrant points
+        return
+    if config.KEYWORD_ENGINE == "numpy":
+        from .numpy_bm25 import get_index
+
+        return get_index().delete_doc(doc_id)
+    from .keyword_index import delete_doc as whoosh_delete
+
+    whoosh_delete(doc_id, space_id)
+
+
+def start():
+    """Startup hook: WAL bootstrap/tailing for replicated Whoosh indexes"""
+    if config.KEYWORD_ENGINE == "whoosh":
+        from .keyword_index import start_replication
+
+        start_replication()
+
+
+def flush(timeout: Optional[float] = None) -> bool:
+    """Make pending keyword writes durable/searchable (batched Whoosh writer)"""
+    if config.KEYWORD_ENGINE == "whoosh":
+        from .keyword_index import flush as whoosh_flush
+
+        return whoosh_flush(timeout)
+    return True
+
+
+def stats() -> Dict:
+    if config.KEYWORD_ENGINE == "qdrant_sparse":
+        return {"engine": "qdrant_sparse"}
+    if config.KEYWORD_ENGINE == "numpy":
+        from .numpy_bm25 import get_index
+
+        return {"engine": "numpy", "segments": get_index().segment_count()}
+    from .keyword_index import stats as whoosh_stats
+
+    return whoosh_stats()
@@ -1,13 +1,22 @@
 
+import hashlib
+import os
+import re
 import shutil
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from threading import Lock, RLock
+from typing import Dict, List, Optional, Tuple
 from whoosh import index
 from whoosh.fields import Schema, TEXT, ID, NUMERIC
 from whoosh.qparser import MultifieldParser, OrGroup
 from whoosh.query import Term, Or, And
 from whoosh import scoring
-from .config import KEYWORD_INDEX_DIR
+from . import config
+from .config import KEYWORD_INDEX_DIR, KEYWORD_SPACE_INDEX_DIR
 
 _schema = Schema(
     uid=ID(stored=True, unique=True),
@@ -15,67 +24,493 @@ _schema = Schema(
     space_id=ID(stored=True),
     doc_type=ID(stored=True),
     chunk_index=NUMERIC(stored=True),
-    text=TEXT(stored=True)
+    # With lean payloads the text is only indexed; it is hydrated from the chunk store
+    text=TEXT(stored=not config.LEAN_PAYLOADS)
 )
 
-_ix = None
+# Built once: parser/weighting objects are stateless between queries
+_parser = MultifieldParser(["text"], schema=_schema, group=OrGroup)
+_weighting = scoring.BM25F()
 
-def _ensure_index():
-    global _ix
-    if _ix is not None:
-        return _ix
-    KEYWORD_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+_query_cache: "OrderedDict[str, object]" = OrderedDict()
+_query_cache_lock = Lock()
+
+# Partition key of the shared (cross-space) index in KEYWORD_INDEX_DIR
+GLOBAL = "__global__"
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+_SPACE_MARKER = "SPACE_ID"
+# Set once the space's documents indexed earlier into the global index were copied over
+_MIGRATED_MARKER = "MIGRATED"
+
+
+class _SearcherPool:
+    """
+    Long-lived Whoosh searchers, refreshed only when the index generation changes.
+
+    A searcher is used by one thread at a time (refresh() may close resources of
+    the old one). Local commits mark the pool dirty; commits by other processes
+    (index_cli) are noticed by re-reading the generation every
+    KEYWORD_SEARCHER_REFRESH_MS.
+    """
+
+    def __init__(self, ix, size: int, refresh_ms: int):
+        self._ix = ix
+        self._size = max(size, 1)
+        self._refresh_interval = max(refresh_ms, 0) / 1000.0
+        self._lock = Lock()
+        self._idle: list = []
+        self._closed = False
+        self._generation: Optional[int] = None
+        self._checked_at = 0.0
+        self.refreshes = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation = None
+
+    def _latest_generation(self) -> int:
+        now = time.monotonic()
+        if self._generation is None or now - self._checked_at >= self._refresh_interval:
+            self._generation = self._ix.latest_generation()
+            self._checked_at = now
+        return self._generation
+
+    @contextmanager
+    def searcher(self):
+        with self._lock:
+            generation = self._latest_generation()
+            s = self._idle.pop() if self._idle else None
+
+        if s is None:
+            s = self._ix.searcher(weighting=_weighting)
+        elif s.reader().generation() != generation:
+            s = s.refresh()
+            self.refreshes += 1
+        try:
+            yield s
+        finally:
+            with self._lock:
+                if not self._closed and len(self._idle) < self._size:
+                    self._idle.append(s)
+                    s = None
+            if s is not None:
+                s.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for s in idle:
+            s.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"idle": len(self._idle), "refreshes": self.refreshes}
+
+
+class _Partition:
+    """One Whoosh index directory (a space or the global index) with its searchers"""
+
+    def __init__(self, key: str, path: Path):
+        self.key = key
+        self.path = path
+        self.ix = _open_or_create(path)
+        if key != GLOBAL and not (path / _SPACE_MARKER).exists():
+            # Directory names of long/unsafe space ids are hashed; keep the original
+            (path / _SPACE_MARKER).write_text(key, encoding="utf-8")
+        self.searchers = _SearcherPool(self.ix, config.KEYWORD_SEARCHER_POOL_SIZE, config.KEYWORD_SEARCHER_REFRESH_MS)
+        self.migrated = key == GLOBAL or (path / _MIGRATED_MARKER).exists()
+        self.migrate_lock = RLock()
+
+    def close(self):
+        self.searchers.close()
+        self.ix.close()
+
+
+# Open partitions, least recently used first; the global one is never evicted
+_partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+_partitions_lock = Lock()
+
+
+def _open_or_create(path: Path):
+    path.mkdir(parents=True, exist_ok=True)
     try:
-        if index.exists_in(KEYWORD_INDEX_DIR):
-            existing = index.open_dir(KEYWORD_INDEX_DIR)
+        if index.exists_in(path):
+            existing = index.open_dir(path)
             stored_fields = set(existing.schema.names())
             if "doc_type" not in stored_fields:
                 existing.close()
-                shutil.rmtree(KEYWORD_INDEX_DIR)
-                KEYWORD_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+                shutil.rmtree(path)
+                path.mkdir(parents=True, exist_ok=True)
                 raise FileNotFoundError
-            _ix = existing
-        else:
-            raise FileNotFoundError
+            return existing
+        raise FileNotFoundError
     except FileNotFoundError:
-        _ix = index.create_in(KEYWORD_INDEX_DIR, schema=_schema)
-    return _ix
+        return index.create_in(path, schema=_schema)
+
+
+def _space_dir_name(space_id: str) -> str:
+    if _SAFE_NAME.match(space_id) and space_id != GLOBAL:
+        return space_id
+    return "h_" + hashlib.sha1(space_id.encode("utf-8")).hexdigest()[:20]
+
+
+def _partition_path(key: str) -> Path:
+    if key == GLOBAL:
+        return KEYWORD_INDEX_DIR
+    return KEYWORD_SPACE_INDEX_DIR / _space_dir_name(key)
+
+
+def _get_partition(key: str, create: bool = True) -> Optional[_Partition]:
+    """Open (or create) a partition, keeping at most KEYWORD_OPEN_INDEXES_MAX space indexes open"""
+    part = _open_partition(key, create)
+    if create:
+        # Writers wait for the copy, so older global versions never overwrite new writes
+        _migrate_from_global(part)
+    return part
+
+
+def _open_partition(key: str, create: bool) -> Optional[_Partition]:
+    evicted = []
+    with _partitions_lock:
+        part = _partitions.get(key)
+        if part is not None:
+            _partitions.move_to_end(key)
+            return part
+        path = _partition_path(key)
+        if not create and not (path.exists() and index.exists_in(path)):
+            return None
+        part = _Partition(key, path)
+        _partitions[key] = part
+        open_spaces = [k for k in _partitions if k != GLOBAL]
+        while len(open_spaces) > config.KEYWORD_OPEN_INDEXES_MAX:
+            victim = open_spaces.pop(0)
+            evicted.append(_partitions.pop(victim))
+    for victim in evicted:
+        # Searchers in use keep working; they are closed when returned to the pool
+        victim.close()
+    return part
+
+
+def _migrate_from_global(part: _Partition):
+    """
+    Copy the space's documents that were indexed into the global index before
+    the partition existed (KEYWORD_PARTITION_BY_SPACE turned on later). Until the
+    marker is written, space queries search both indexes.
+    """
+    if part.migrated:
+        return
+    with part.migrate_lock:
+        if part.migrated:
+            return
+        rows = []
+        if index.exists_in(KEYWORD_INDEX_DIR):
+            glob = _get_partition(GLOBAL)
+            with glob.searchers.searcher() as s:
+                rows = [dict(fields) for fields in s.documents(space_id=part.key)]
+        if rows:
+            with part.searchers.searcher() as s:
+                present = set(s.field_terms("doc_id"))
+            # Documents already written to the partition are newer than the global copy
+            items = [{"payload": row} for row in rows if row["doc_id"] not in present]
+            if items:
+                from .chunk_store import hydrate
+
+                # With lean payloads the global index has no stored text
+                hydrate(items)
+                writer = part.ix.writer(timeout=config.KEYWORD_WRITER_LOCK_TIMEOUT)
+                try:
+                    for item in items:
+                        row = item["payload"]
+                        if not row.get("text"):
+                            continue
+                        writer.update_document(uid=row["uid"], doc_id=row["doc_id"], space_id=row["space_id"],
+                                               doc_type=row.get("doc_type"), chunk_index=int(row["chunk_index"]),
+                                               text=row["text"])
+                except Exception:
+                    writer.cancel()
+                    raise
+                writer.commit()
+                part.searchers.invalidate()
+                print(f"[KeywordIndex] Copied {len(items)} chunks of space {part.key!r} from the global index")
+        (part.path / _MIGRATED_MARKER).write_text(str(len(rows)), encoding="utf-8")
+        part.migrated = True
+
+
+def _write_targets(space_id: str) -> List[str]:
+    if not config.KEYWORD_PARTITION_BY_SPACE:
+        return [GLOBAL]
+    targets = [space_id or GLOBAL]
+    if config.KEYWORD_GLOBAL_INDEX and GLOBAL not in targets:
+        targets.append(GLOBAL)
+    return targets
+
+
+def close_all():
+    """Close every open partition (shutdown, tests, or after KEYWORD_INDEX_DIR changes)"""
+    with _partitions_lock:
+        parts = list(_partitions.values())
+        _partitions.clear()
+    for part in parts:
+        part.close()
+
+
+def replace_index_dirs(sources: Dict[Path, Optional[Path]]) -> None:
+    """
+    Swap complete index directories into place: {destination: prepared copy or
+    None to remove}. Renames happen under the partitions lock, so no partition
+    is opened against a half-restored tree; searchers already handed out keep
+    reading the old files until they are returned.
+    """
+    retired = []
+    with _partitions_lock:
+        parts = list(_partitions.values())
+        _partitions.clear()
+        for dst, src in sources.items():
+            if dst.exists():
+                old = dst.with_name(f".{dst.name}.old-{os.getpid()}-{time.time_ns()}")
+                os.replace(dst, old)
+                retired.append(old)
+            if src is not None:
+                os.replace(src, dst)
+    for part in parts:
+        part.close()
+    for old in retired:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _ensure_index():
+    """The global index (the only one when partitioning is off)"""
+    return _get_partition(GLOBAL).ix
+
+def write_documents(docs, merge: bool = True) -> List[_Partition]:
+    """
+    Write several documents [(space_id, doc_id, doc_type, chunks)] with one
+    commit per affected partition. Returns the partitions that were written.
+    """
+    # update_document only replaces committed documents, not ones added earlier
+    # in the same writer: keep the last version of each (space_id, doc_id)
+    latest: Dict[Tuple[str, str], tuple] = OrderedDict()
+    for doc in docs:
+        latest.pop((doc[0], doc[1]), None)
+        latest[(doc[0], doc[1])] = doc
+
+    by_partition: Dict[str, list] = OrderedDict()
+    for doc in latest.values():
+        for key in _write_targets(doc[0]):
+            by_partition.setdefault(key, []).append(doc)
+
+    written = []
+    for key, part_docs in by_partition.items():
+        part = _get_partition(key)
+        writer = part.ix.writer(timeout=config.KEYWORD_WRITER_LOCK_TIMEOUT)
+        try:
+            for space_id, doc_id, doc_type, chunks in part_docs:
+                for i, text in enumerate(chunks):
+                    uid = f"{doc_id}:{i}"
+                    writer.update_document(uid=uid, doc_id=doc_id, space_id=space_id,
+                                           doc_type=doc_type, chunk_index=i, text=text)
+        except Exception:
+            writer.cancel()
+            raise
+        writer.commit(merge=merge)
+        part.searchers.invalidate()
+        written.append(part)
+    return written
+
+def delete_documents(doc_id: str, space_id: Optional[str] = None) -> int:
+    """Delete all chunks of doc_id from the local partitions that can hold it"""
+    if not config.KEYWORD_PARTITION_BY_SPACE:
+        keys = [GLOBAL]
+    elif space_id:
+        # The global index too, even without KEYWORD_GLOBAL_INDEX: a copy indexed
+        # before partitioning would be searched (or migrated) back into the space
+        keys = list(dict.fromkeys(_write_targets(space_id) + [GLOBAL]))
+    else:
+        keys = [GLOBAL] + _space_partition_keys()
+    deleted = 0
+    for key in keys:
+        part = _get_partition(key, create=False)
+        if part is None:
+            continue
+        writer = part.ix.writer(timeout=config.KEYWORD_WRITER_LOCK_TIMEOUT)
+        try:
+            deleted += writer.delete_by_term("doc_id", doc_id)
+        except Exception:
+            writer.cancel()
+            raise
+        writer.commit()
+        part.searchers.invalidate()
+    return deleted
 
 def add_chunks(space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
-    ix = _ensure_index()
-    writer = ix.writer()
-    for i, text in enumerate(chunks):
-        uid = f"{doc_id}:{i}"
-        writer.update_document(uid=uid, doc_id=doc_id, space_id=space_id,
-                               doc_type=doc_type, chunk_index=i, text=text)
-    writer.commit()
-
-def search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8):
-    ix = _ensure_index()
-    qp = MultifieldParser(["text"], schema=_schema, group=OrGroup)
-    query = qp.parse(q)
-    weight = scoring.BM25F()
-    with ix.searcher(weighting=weight) as s:
-        filt = None
-        filters = []
-        if space_id:
-            filters.append(Term("space_id", space_id))
-        if doc_types:
-            filters.append(Or([Term("doc_type", dt) for dt in doc_types]))
-        if filters:
-            filt = filters[0] if len(filters) == 1 else And(filters)
+    if config.KEYWORD_WAL_ENABLED:
+        # Replicated mode: the log is the source of truth, every replica applies it
+        from .keyword_wal import get_wal
+
+        get_wal().append("add", space_id=space_id, doc_id=doc_id, doc_type=doc_type, chunks=list(chunks))
+        return
+    if config.KEYWORD_BATCH_WRITES:
+        from .keyword_writer import get_writer
+
+        get_writer().submit(space_id, doc_id, doc_type, chunks)
+        return
+    write_documents([(space_id, doc_id, doc_type, chunks)])
+
+def delete_doc(doc_id: str, space_id: Optional[str] = None):
+    if config.KEYWORD_WAL_ENABLED:
+        from .keyword_wal import get_wal
+
+        get_wal().append("delete", space_id=space_id, doc_id=doc_id)
+        return
+    # Queued adds must land first so a later delete isn't undone by them
+    flush()
+    delete_documents(doc_id, space_id)
+
+def flush(timeout: Optional[float] = None) -> bool:
+    """Wait until queued writes are applied (WAL replay or batched writer)"""
+    if config.KEYWORD_WAL_ENABLED:
+        from .keyword_wal import get_wal
+
+        get_wal().sync()
+        return True
+    if not config.KEYWORD_BATCH_WRITES:
+        return True
+    from .keyword_writer import get_writer
+
+    return get_writer().flush(timeout)
+
+def start_replication():
+    """Bootstrap from snapshot + log and start tailing (KEYWORD_WAL_ENABLED only)"""
+    if config.KEYWORD_WAL_ENABLED:
+        from .keyword_wal import get_wal
+
+        get_wal().start()
+
+def segment_count(ix=None) -> int:
+    ix = ix or _ensure_index()
+    return len(ix._segments())
+
+def stats() -> Dict:
+    out = {
+        "engine": "whoosh",
+        "partition_by_space": config.KEYWORD_PARTITION_BY_SPACE,
+        "cached_queries": len(_query_cache),
+    }
+    if not config.KEYWORD_PARTITION_BY_SPACE or config.KEYWORD_GLOBAL_INDEX:
+        ix = _ensure_index()
+        out["segments"] = segment_count(ix)
+        out["doc_count"] = ix.doc_count()
+    with _partitions_lock:
+        parts = list(_partitions.values())
+    out["open_indexes"] = {
+        part.key: {"segments": segment_count(part.ix), "searchers": part.searchers.stats()}
+        for part in parts
+    }
+    if config.KEYWORD_WAL_ENABLED:
+        from .keyword_wal import get_wal
+
+        out["wal"] = get_wal().stats()
+    elif config.KEYWORD_BATCH_WRITES:
+        from .keyword_writer import get_writer
+
+        out["writer"] = get_writer().stats()
+    return out
+
+def _parse_query(q: str):
+    """Parsed query from a small LRU (hot queries repeat across users)"""
+    with _query_cache_lock:
+        query = _query_cache.get(q)
+        if query is not None:
+            _query_cache.move_to_end(q)
+            return query
+    query = _parser.parse(q)
+    with _query_cache_lock:
+        _query_cache[q] = query
+        while len(_query_cache) > config.KEYWORD_QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return query
+
+@lru_cache(maxsize=256)
+def _build_filter(space_id: Optional[str], doc_types: Optional[Tuple[str, ...]],
+                  doc_ids: Optional[Tuple[str, ...]] = None):
+    filters = []
+    if space_id:
+        filters.append(Term("space_id", space_id))
+    if doc_types:
+        filters.append(Or([Term("doc_type", dt) for dt in doc_types]))
+    if doc_ids:
+        filters.append(Or([Term("doc_id", d) for d in doc_ids]))
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else And(filters)
+
+def _search_partition(part: _Partition, query, filt, top_k: int) -> List[Dict]:
+    with part.searchers.searcher() as s:
         results = s.search(query, limit=top_k, filter=filt)
         out = []
         for r in results:
+            payload = {
+                "doc_id": r["doc_id"],
+                "space_id": r["space_id"],
+                "doc_type": r.get("doc_type"),
+                "chunk_index": int(r["chunk_index"]),
+            }
+            if r.get("text"):
+                payload["text"] = r["text"]
             out.append({
                 "key": r["uid"],
                 "score": float(r.score),
-                "payload": {
-                    "doc_id": r["doc_id"],
-                    "space_id": r["space_id"],
-                    "doc_type": r.get("doc_type"),
-                    "chunk_index": int(r["chunk_index"]),
-                    "text": r["text"]
-                }
+                "payload": payload
             })
         return out
+
+def _space_partition_keys() -> List[str]:
+    """Space ids of all partitions on disk (cross-space fan-out without a global index)"""
+    if not KEYWORD_SPACE_INDEX_DIR.exists():
+        return []
+    keys = []
+    for path in sorted(KEYWORD_SPACE_INDEX_DIR.iterdir()):
+        marker = path / _SPACE_MARKER
+        if marker.is_file():
+            keys.append(marker.read_text(encoding="utf-8"))
+    return keys
+
+def search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+           doc_ids: Optional[List[str]] = None):
+    query = _parse_query(q)
+    types = tuple(doc_types) if doc_types else None
+    ids = tuple(sorted(doc_ids)) if doc_ids else None
+
+    if not config.KEYWORD_PARTITION_BY_SPACE:
+        return _search_partition(_get_partition(GLOBAL), query, _build_filter(space_id, types, ids), top_k)
+
+    if space_id:
+        part = _get_partition(space_id, create=False)
+        if part is not None:
+            # The partition holds only this space: no space_id filter needed
+            hits = _search_partition(part, query, _build_filter(None, types, ids), top_k)
+            if part.migrated or not index.exists_in(KEYWORD_INDEX_DIR):
+                return hits
+            # Not migrated yet: older documents may exist only in the global index
+            seen = {h["key"] for h in hits}
+            older = _search_partition(_get_partition(GLOBAL), query, _build_filter(space_id, types, ids), top_k)
+            hits.extend(h for h in older if h["key"] not in seen)
+            hits.sort(key=lambda h: h["score"], reverse=True)
+            return hits[:top_k]
+        # Not partitioned yet (indexed before KEYWORD_PARTITION_BY_SPACE): use the global index
+        if index.exists_in(KEYWORD_INDEX_DIR):
+            return _search_partition(_get_partition(GLOBAL), query, _build_filter(space_id, types, ids), top_k)
+        return []
+
+    if config.KEYWORD_GLOBAL_INDEX:
+        return _search_partition(_get_partition(GLOBAL), query, _build_filter(None, types, ids), top_k)
+
+    # Cross-space query without a global index: fan out and merge by score
+    hits = []
+    for key in _space_partition_keys():
+        part = _get_partition(key, create=False)
+        if part is not None:
+            hits.extend(_search_partition(part, query, _build_filter(None, types, ids), top_k))
+    hits.sort(key=lambda h: h["score"], reverse=True)
+    return hits[:top_k]
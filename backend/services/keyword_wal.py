@@ -0,0 +1,395 @@
+"""
+Keyword Index Write-Ahead Log
+Makes the Whoosh keyword index replica-safe (KEYWORD_WAL_ENABLED=true).
+
+Every mutation (add / update / delete) is appended as a JSON line to a shared
+log in KEYWORD_WAL_DIR instead of being written to the local index directly.
+Each replica tails the log and applies records in log order to its own local
+index, so all replicas converge to the same BM25 index. A new replica restores
+the latest snapshot (copy of the index directories + log position) and replays
+the log from there. A replica whose next segment was already pruned does the
+same; if no snapshot covers the gap, sync() raises WALGapError.
+
+Layout of KEYWORD_WAL_DIR:
+    log/000000000000.log ...   append-only segments, rotated by size
+    snapshots/<seg>-<offset>/  index copies with meta.json
+    LOCK                       flock for appends, rotation and snapshots
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+from . import config
+
+Position = Tuple[int, int]  # (segment number, byte offset)
+
+
+class WALGapError(RuntimeError):
+    """The replica's next log segment was pruned and no snapshot can replace it"""
+
+
+class KeywordWAL:
+    def __init__(
+        self,
+        wal_dir: Path,
+        state_path: Path,
+        segment_bytes: int = 64 * 1024 * 1024,
+        poll_ms: int = 1000,
+        keep_snapshots: int = 2,
+        fsync: bool = True,
+    ):
+        self.wal_dir = Path(wal_dir)
+        self.log_dir = self.wal_dir / "log"
+        self.snapshot_dir = self.wal_dir / "snapshots"
+        self.state_path = Path(state_path)
+        self.segment_bytes = max(segment_bytes, 1024)
+        self.poll_interval = max(poll_ms, 10) / 1000.0
+        self.keep_snapshots = max(keep_snapshots, 1)
+        self.fsync = fsync
+        self.origin = config.KEYWORD_REPLICA_ID
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+        self._apply_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._position: Optional[Position] = None
+
+        self.appended = 0
+        self.applied = 0
+        self.last_sync_ms = 0.0
+
+    # --- shared log ----------------------------------------------------------
+
+    @contextmanager
+    def _shared_lock(self):
+        """Cross-process (and cross-host on shared storage) exclusive lock"""
+        with open(self.wal_dir / "LOCK", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _segments(self) -> List[int]:
+        out = []
+        for path in self.log_dir.glob("*.log"):
+            try:
+                out.append(int(path.stem))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def _segment_path(self, seg: int) -> Path:
+        return self.log_dir / f"{seg:012d}.log"
+
+    def append(self, op: str, **fields) -> None:
+        """Append one mutation record; it is applied by the next sync()"""
+        record = {"op": op, "ts": time.time(), "origin": self.origin, **fields}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._shared_lock():
+            segments = self._segments()
+            seg = segments[-1] if segments else 0
+            path = self._segment_path(seg)
+            if path.exists() and path.stat().st_size + len(line) > self.segment_bytes:
+                seg += 1
+                path = self._segment_path(seg)
+            # One write() per record under the lock: readers never see interleaved lines
+            with open(path, "ab") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        self.appended += 1
+        self._wake.set()
+
+    # --- replica state -------------------------------------------------------
+
+    def _load_position(self) -> Optional[Position]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (FileNotFoundError, KeyError, ValueError, json.JSONDecodeError):
+            return None
+
+    def _save_position(self, position: Position) -> None:
+        self._position = position
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segment": position[0], "offset": position[1], "origin": self.origin}, f)
+        os.replace(tmp, self.state_path)
+
+    def position(self) -> Position:
+        with self._apply_lock:
+            if self._position is None:
+                self._bootstrap()
+            return self._position
+
+    def _bootstrap(self) -> None:
+        """Resume from the saved position, else restore the latest snapshot, else replay everything"""
+        position = self._load_position()
+        if position is None:
+            snapshot = self._latest_snapshot()
+            if snapshot is not None:
+                position = self._restore_snapshot(snapshot)
+            else:
+                segments = self._segments()
+                position = (segments[0] if segments else 0, 0)
+            self._save_position(position)
+        self._position = position
+
+    # --- tailing -------------------------------------------------------------
+
+    @staticmethod
+    def _read_from(path: Path, offset: int) -> Tuple[List[Dict], int]:
+        """Complete records after offset; a trailing partial line is left for later"""
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b"\n")
+        if end < 0:
+            return [], offset
+        records = []
+        for raw in data[:end].split(b"\n"):
+            if not raw.strip():
+                continue
+            try:
+                records.append(json.loads(raw))
+            except json.JSONDecodeError as e:
+                print(f"[KeywordWAL] Skipping corrupt record in {path.name}: {e}")
+        return records, offset + end + 1
+
+    def sync(self) -> int:
+        """Apply all records appended so far, in log order. Returns the number applied."""
+        start = time.perf_counter()
+        applied = 0
+        with self._apply_lock:
+            if self._position is None:
+                self._bootstrap()
+            seg, offset = self._position
+            while True:
+                segments = self._segments()
+                if not segments:
+                    break
+                if seg < segments[0]:
+                    # Records this replica never applied are gone: skipping to the
+                    # oldest segment would silently lose them
+                    seg, offset = self._restore_after_gap(seg, segments[0])
+                    continue
+                records, new_offset = self._read_from(self._segment_path(seg), offset)
+                if records:
+                    _apply(records)
+                    applied += len(records)
+                if new_offset != offset:
+                    offset = new_offset
+                    self._save_position((seg, offset))
+                    continue
+                newer = [s for s in segments if s > seg]
+                if not newer:
+                    break
+                # A newer segment exists, so this one is closed and fully read
+                seg, offset = newer[0], 0
+                self._save_position((seg, offset))
+        self.applied += applied
+        self.last_sync_ms = (time.perf_counter() - start) * 1000
+        return applied
+
+    def _restore_after_gap(self, seg: int, oldest: int) -> Position:
+        snapshot = self._latest_snapshot()
+        if snapshot is None or self._snapshot_position(snapshot)[0] < oldest:
+            raise WALGapError(
+                f"log segment {seg} was pruned before this replica applied it and no snapshot "
+                f"covers the gap (oldest segment {oldest}); rebuild the keyword index"
+            )
+        print(f"[KeywordWAL] Log segment {seg} was pruned before replay; restoring {snapshot.name}")
+        position = self._restore_snapshot(snapshot)
+        self._save_position(position)
+        return position
+
+    def start(self) -> None:
+        """Bootstrap and start the background tailer (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.position()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="keyword-wal-tailer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"[KeywordWAL] Final sync failed: {e}")
+
+    def _run(self):
+        while not self._stopping:
+            # Local appends wake the tailer early; remote ones are picked up by polling
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[KeywordWAL] Replay failed, will retry: {e}")
+
+    # --- snapshots -----------------------------------------------------------
+
+    def _latest_snapshot(self) -> Optional[Path]:
+        snapshots = sorted(p for p in self.snapshot_dir.iterdir() if (p / "meta.json").is_file())
+        return snapshots[-1] if snapshots else None
+
+    def create_snapshot(self) -> Dict:
+        """Copy the local index at the current log position and prune old snapshots/segments"""
+        from . import keyword_index
+
+        self.sync()
+        with self._apply_lock:
+            seg, offset = self._position
+            name = f"{seg:012d}-{offset:012d}"
+            final = self.snapshot_dir / name
+            if not final.exists():
+                tmp = self.snapshot_dir / f".{name}.{self.origin}.tmp"
+                shutil.rmtree(tmp, ignore_errors=True)
+                shutil.copytree(keyword_index.KEYWORD_INDEX_DIR, tmp / "global")
+                if keyword_index.KEYWORD_SPACE_INDEX_DIR.exists():
+                    shutil.copytree(keyword_index.KEYWORD_SPACE_INDEX_DIR, tmp / "spaces")
+                meta = {"segment": seg, "offset": offset, "created_at": time.time(), "origin": self.origin}
+                with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                with self._shared_lock():
+                    if final.exists():
+                        shutil.rmtree(tmp, ignore_errors=True)
+                    else:
+                        os.replace(tmp, final)
+        self._prune()
+        return {"snapshot": name, "segment": seg, "offset": offset}
+
+    @staticmethod
+    def _snapshot_position(snapshot: Path) -> Position:
+        with open(snapshot / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return int(meta["segment"]), int(meta["offset"])
+
+    def _restore_snapshot(self, snapshot: Path) -> Position:
+        from . import keyword_index
+
+        position = self._snapshot_position(snapshot)
+        # Copy next to the live directories (same filesystem), then swap them in
+        # by rename: concurrent searches never open a half-copied index
+        sources: Dict[Path, Optional[Path]] = {}
+        try:
+            for src, dst in (
+                (snapshot / "global", keyword_index.KEYWORD_INDEX_DIR),
+                (snapshot / "spaces", keyword_index.KEYWORD_SPACE_INDEX_DIR),
+            ):
+                if not src.exists():
+                    sources[dst] = None
+                    continue
+                tmp = dst.with_name(f".{dst.name}.restore-{self.origin}")
+                shutil.rmtree(tmp, ignore_errors=True)
+                shutil.copytree(src, tmp)
+                sources[dst] = tmp
+            keyword_index.replace_index_dirs(sources)
+        except Exception:
+            for tmp in sources.values():
+                if tmp is not None:
+                    shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        print(f"[KeywordWAL] Restored snapshot {snapshot.name}")
+        return position
+
+    def _prune(self) -> None:
+        with self._shared_lock():
+            snapshots = sorted(p for p in self.snapshot_dir.iterdir() if (p / "meta.json").is_file())
+            for old in snapshots[:-self.keep_snapshots]:
+                shutil.rmtree(old, ignore_errors=True)
+            kept = snapshots[-self.keep_snapshots:]
+            if not kept:
+                return
+            with open(kept[0] / "meta.json", "r", encoding="utf-8") as f:
+                oldest_needed = int(json.load(f)["segment"])
+            # Segments older than every kept snapshot are never replayed again
+            for seg in self._segments()[:-1]:
+                if seg < oldest_needed:
+                    self._segment_path(seg).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        segments = self._segments()
+        seg, offset = self._position or (None, None)
+        return {
+            "origin": self.origin,
+            "position": {"segment": seg, "offset": offset},
+            "log_segments": len(segments),
+            "appended": self.appended,
+            "applied": self.applied,
+            "last_sync_ms": round(self.last_sync_ms, 2),
+            "latest_snapshot": (self._latest_snapshot() or Path("")).name or None,
+        }
+
+
+def _apply(records: List[Dict]) -> None:
+    """Apply records to the local index, batching consecutive adds into one commit"""
+    from .keyword_index import delete_documents, write_documents
+
+    adds = []
+    for record in records:
+        op = record.get("op")
+        if op in ("add", "update"):
+            if op == "update":
+                if adds:
+                    write_documents(adds)
+                    adds = []
+                delete_documents(record["doc_id"], record.get("space_id"))
+            adds.append((record["space_id"], record["doc_id"], record["doc_type"], record["chunks"]))
+        elif op == "delete":
+            if adds:
+                write_documents(adds)
+                adds = []
+            delete_documents(record["doc_id"], record.get("space_id"))
+        else:
+            print(f"[KeywordWAL] Unknown op {op!r}, skipped")
+    if adds:
+        write_documents(adds)
+
+
+_wal: Optional[KeywordWAL] = None
+_wal_lock = threading.Lock()
+
+
+def get_wal() -> KeywordWAL:
+    global _wal
+    if _wal is None:
+        with _wal_lock:
+            if _wal is None:
+                _wal = KeywordWAL(
+                    config.KEYWORD_WAL_DIR,
+                    config.KEYWORD_WAL_STATE_PATH,
+                    segment_bytes=config.KEYWORD_WAL_SEGMENT_MB * 1024 * 1024,
+                    poll_ms=config.KEYWORD_WAL_POLL_MS,
+                    keep_snapshots=config.KEYWORD_WAL_KEEP_SNAPSHOTS,
+                    fsync=config.KEYWORD_WAL_FSYNC,
+                )
+    return _wal
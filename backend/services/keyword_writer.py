@@ -0,0 +1,299 @@
+"""
+Batched Whoosh Writer
+Single background thread that owns the Whoosh writer: documents submitted by
+many /ingest calls (or index_cli) are grouped into one commit every
+KEYWORD_COMMIT_INTERVAL_MS or KEYWORD_COMMIT_MAX_DOCS documents, so requests
+never wait on the writer lock and the index doesn't fill with tiny segments.
+A failed commit is retried with exponential backoff; after
+KEYWORD_COMMIT_MAX_ATTEMPTS the batch is committed document by document and
+the documents that still fail go to the dead-letter file. Segment merging runs
+on its own thread according to KEYWORD_MERGE_POLICY.
+"""
+
+import atexit
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from whoosh.writing import MERGE_SMALL
+
+from . import config
+
+# (space_id, doc_id, doc_type, chunks)
+PendingDoc = Tuple[str, str, str, List[str]]
+
+
+class KeywordWriter:
+    def __init__(
+        self,
+        commit_interval_ms: int = 500,
+        commit_max_docs: int = 200,
+        merge_policy: str = "small",
+        max_segments: int = 10,
+        max_attempts: int = 5,
+        retry_backoff_ms: int = 500,
+        dead_letter_path: Optional[Path] = None,
+    ):
+        self.commit_interval = max(commit_interval_ms, 10) / 1000.0
+        self.commit_max_docs = max(commit_max_docs, 1)
+        self.merge_policy = merge_policy
+        self.max_segments = max(max_segments, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_backoff = max(retry_backoff_ms, 0) / 1000.0
+        self.dead_letter_path = dead_letter_path
+
+        self._cond = threading.Condition()
+        self._pending: List[PendingDoc] = []
+        self._in_flight = 0
+        # Failed commits of the batch at the head of _pending; retried at _retry_at
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        # Indexes written since their last merge check, keyed by id()
+        self._merge_cond = threading.Condition()
+        self._merge_queue: Dict[int, object] = {}
+        self._merge_thread: Optional[threading.Thread] = None
+        self._merge_stopping = False
+
+        self.commits = 0
+        self.docs_committed = 0
+        self.merges = 0
+        self.failures = 0
+        self.dead_letters = 0
+        self.last_commit_ms = 0.0
+        self.last_merge_ms = 0.0
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="keyword-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
+        """Queue a document; it becomes searchable after the next batch commit"""
+        with self._cond:
+            self._start()
+            self._pending.append((space_id, doc_id, doc_type, list(chunks)))
+            if len(self._pending) >= self.commit_max_docs:
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is committed (or dead-lettered)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                self._start()
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._merge_cond:
+            self._merge_stopping = True
+            self._merge_cond.notify_all()
+        if self._merge_thread is not None:
+            self._merge_thread.join(timeout)
+            self._merge_thread = None
+
+    def _wait_for_batch(self):
+        # Called with self._cond held
+        deadline = time.monotonic() + self.commit_interval
+        while True:
+            if self._attempts:
+                # Backing off after a failure, even if the queue is full
+                until = self._retry_at
+            elif self._stopping or len(self._pending) >= self.commit_max_docs:
+                return
+            else:
+                until = deadline
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                return
+            self._cond.wait(remaining)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._wait_for_batch()
+                if self._stopping and not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                self._in_flight = len(batch)
+
+            if batch:
+                self._schedule_merge(self._commit(batch))
+
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _commit(self, batch: List[PendingDoc]) -> list:
+        """Commit a batch; returns the partitions (indexes) that were written"""
+        from .keyword_index import write_documents
+
+        start = time.perf_counter()
+        try:
+            # merge=False: merging is decided separately by the merge policy
+            written = write_documents(batch, merge=False)
+        except Exception as e:
+            self.failures += 1
+            with self._cond:
+                self._attempts += 1
+                if self._attempts < self.max_attempts:
+                    delay = self.retry_backoff * 2 ** (self._attempts - 1)
+                    print(
+                        f"[KeywordWriter] Commit of {len(batch)} docs failed "
+                        f"(attempt {self._attempts}/{self.max_attempts}), retry in {delay:.1f}s: {e}"
+                    )
+                    self._retry_at = time.monotonic() + delay
+                    # Back at the head of the queue: later submits of the same doc still win
+                    self._pending = batch + self._pending
+                    return []
+                self._attempts = 0
+            print(f"[KeywordWriter] Commit of {len(batch)} docs failed {self.max_attempts} times, committing one by one")
+            return self._commit_each(batch)
+        with self._cond:
+            self._attempts = 0
+        self.commits += 1
+        self.docs_committed += len(batch)
+        self.last_commit_ms = (time.perf_counter() - start) * 1000
+        return written
+
+    def _commit_each(self, batch: List[PendingDoc]) -> list:
+        """Last resort for a failing batch: isolate the documents that can't be indexed"""
+        from .keyword_index import write_documents
+
+        written = []
+        for doc in batch:
+            try:
+                written.extend(write_documents([doc], merge=False))
+            except Exception as e:
+                self._dead_letter(doc, e)
+                continue
+            self.commits += 1
+            self.docs_committed += 1
+        return written
+
+    def _dead_letter(self, doc: PendingDoc, error: Exception):
+        space_id, doc_id, doc_type, chunks = doc
+        self.dead_letters += 1
+        print(f"[KeywordWriter] Dropping {space_id}/{doc_id} from the keyword index: {error}")
+        if self.dead_letter_path is None:
+            return
+        record = {
+            "ts": time.time(),
+            "space_id": space_id,
+            "doc_id": doc_id,
+            "doc_type": doc_type,
+            "chunks": chunks,
+            "error": str(error),
+        }
+        try:
+            self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[KeywordWriter] Failed to write dead letter: {e}")
+
+    def _schedule_merge(self, partitions: list):
+        if self.merge_policy == "none" or not partitions:
+            return
+        with self._merge_cond:
+            for part in partitions:
+                self._merge_queue[id(part.ix)] = part.ix
+            if self._merge_thread is None or not self._merge_thread.is_alive():
+                self._merge_stopping = False
+                self._merge_thread = threading.Thread(target=self._run_merges, name="keyword-merge", daemon=True)
+                self._merge_thread.start()
+            self._merge_cond.notify_all()
+
+    def _run_merges(self):
+        # Merges hold the Whoosh writer lock while they run; the commit thread
+        # waits on it up to KEYWORD_WRITER_LOCK_TIMEOUT and retries otherwise
+        while True:
+            with self._merge_cond:
+                while not self._merge_queue and not self._merge_stopping:
+                    self._merge_cond.wait()
+                if not self._merge_queue:
+                    return
+                indexes = list(self._merge_queue.values())
+                self._merge_queue.clear()
+            for ix in indexes:
+                self._maybe_merge(ix)
+
+    def _maybe_merge(self, ix):
+        if self.merge_policy == "none":
+            return
+        from .keyword_index import segment_count
+
+        segments = segment_count(ix)
+        if segments <= self.max_segments:
+            return
+        start = time.perf_counter()
+        try:
+            writer = ix.writer(timeout=config.KEYWORD_WRITER_LOCK_TIMEOUT)
+            if self.merge_policy == "optimize":
+                writer.commit(optimize=True)
+            else:
+                writer.commit(mergetype=MERGE_SMALL)
+        except Exception as e:
+            print(f"[KeywordWriter] Segment merge failed: {e}")
+            return
+        self.merges += 1
+        self.last_merge_ms = (time.perf_counter() - start) * 1000
+        print(
+            f"[KeywordWriter] Merged segments ({self.merge_policy}): "
+            f"{segments} -> {segment_count(ix)} in {self.last_merge_ms:.0f}ms"
+        )
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending) + self._in_flight
+        return {
+            "pending_docs": pending,
+            "commits": self.commits,
+            "docs_committed": self.docs_committed,
+            "merges": self.merges,
+            "failures": self.failures,
+            "dead_letters": self.dead_letters,
+            "last_commit_ms": round(self.last_commit_ms, 2),
+            "last_merge_ms": round(self.last_merge_ms, 2),
+            "merge_policy": self.merge_policy,
+        }
+
+
+_writer: Optional[KeywordWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> KeywordWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = KeywordWriter(
+                    commit_interval_ms=config.KEYWORD_COMMIT_INTERVAL_MS,
+                    commit_max_docs=config.KEYWORD_COMMIT_MAX_DOCS,
+                    merge_policy=config.KEYWORD_MERGE_POLICY,
+                    max_segments=config.KEYWORD_MAX_SEGMENTS,
+                    max_attempts=config.KEYWORD_COMMIT_MAX_ATTEMPTS,
+                    retry_backoff_ms=config.KEYWORD_COMMIT_RETRY_BACKOFF_MS,
+                    dead_letter_path=config.KEYWORD_DEAD_LETTER_PATH,
+                )
+                # The thread is a daemon: commit what is still queued on interpreter exit
+                atexit.register(_writer.stop)
+    return _writer
@@ -0,0 +1,193 @@
+"""
+LLM Gateway
+Admission control in front of the LLM backend (rag.call_llm). Interactive
+/ask, streamed or on-demand summaries and background jobs share one
+Ollama/vLLM endpoint; the gateway caps requests in flight per backend and
+hands free slots out by priority, so a bulk summarization run queues behind
+/ask instead of pushing its latency into minutes.
+
+- priority comes from the calling context (llm_priority(...)); code that does
+  not set one is interactive. asyncio.to_thread copies the context, so MAP
+  calls made from a background job keep the job's priority;
+- a waiter is rejected when its class exceeds its max wait
+  (LLM_GATEWAY_MAX_WAIT_*), either up front (requests are already queued
+  ahead of it and the estimate — expected remaining time of the running calls
+  plus per-class EWMA service times of those ahead — is past the limit) or on
+  timeout;
+- queue depth, admissions, rejections and waits per class go to /metrics.
+"""
+
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from . import config
+from .llm_router import get_llm_router
+
+INTERACTIVE = 0
+STREAMING = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STREAMING: "streaming", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """LLM calls made inside the block (and threads started from it via to_thread) use this class"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class LLMOverloaded(Exception):
+    """Request rejected by admission control"""
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int, max_wait: Dict[int, float], max_queue: int = 0):
+        self.max_concurrency = max(1, max_concurrency)
+        # Seconds a class may wait for a slot; 0 = no limit
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._waiting: list = []
+        self._seq = itertools.count()
+        self.in_flight = 0
+        # token -> (priority, start) of admitted calls, for remaining-time estimates
+        self._running: Dict[int, tuple] = {}
+        self.ewma_service = {p: 0.0 for p in PRIORITY_NAMES}
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self.rejected = {p: 0 for p in PRIORITY_NAMES}
+        self.wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+
+    def _estimated_wait(self, ahead: list) -> float:
+        # First slot to free up (running calls, by their class EWMA), then the
+        # waiters ahead share max_concurrency slots
+        now = time.monotonic()
+        first_free = 0.0
+        if self._running and self.in_flight >= self.max_concurrency:
+            first_free = min(
+                max(0.0, self.ewma_service[p] - (now - started)) for p, started in self._running.values()
+            )
+        return first_free + sum(self.ewma_service[p] for p, _ in ahead) / self.max_concurrency
+
+    def _admit(self, priority: int) -> int:
+        token = next(self._seq)
+        self._running[token] = (priority, time.monotonic())
+        self.in_flight += 1
+        self.admitted[priority] += 1
+        return token
+
+    def acquire(self, priority: int) -> int:
+        """Wait for a slot; returns the token to pass to release()"""
+        limit = self.max_wait.get(priority, 0)
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight < self.max_concurrency and not self._waiting:
+                return self._admit(priority)
+            ahead = [entry for entry in self._waiting if entry[0] <= priority]
+            if self.max_queue and len(self._waiting) >= self.max_queue:
+                self.rejected[priority] += 1
+                raise LLMOverloaded(f"queue full ({len(self._waiting)} waiting)")
+            # Nobody ahead: the request is next in line, only the timeout below applies
+            estimate = self._estimated_wait(ahead) if ahead and limit else 0.0
+            if estimate > limit > 0:
+                self.rejected[priority] += 1
+                raise LLMOverloaded(
+                    f"estimated wait {estimate:.0f}s exceeds {limit:.0f}s ({PRIORITY_NAMES[priority]})"
+                )
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while not (self.in_flight < self.max_concurrency and self._waiting[0] == entry):
+                    remaining = limit - (time.monotonic() - start) if limit else None
+                    if remaining is not None and remaining <= 0:
+                        self.rejected[priority] += 1
+                        raise LLMOverloaded(f"no LLM slot within {limit:.0f}s ({PRIORITY_NAMES[priority]})")
+                    self._cond.wait(remaining)
+                heapq.heappop(self._waiting)
+                self.wait_total[priority] += time.monotonic() - start
+                return self._admit(priority)
+            except LLMOverloaded:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                raise
+            finally:
+                # The head of the queue may have changed
+                self._cond.notify_all()
+
+    def release(self, token: int) -> None:
+        with self._cond:
+            priority, started = self._running.pop(token)
+            self.in_flight -= 1
+            service = time.monotonic() - started
+            previous = self.ewma_service[priority]
+            self.ewma_service[priority] = service if not previous else 0.8 * previous + 0.2 * service
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: Optional[int] = None) -> Iterator[None]:
+        token = self.acquire(current_priority() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                queued[PRIORITY_NAMES[priority]] += 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": queued,
+                "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+                "rejected": {PRIORITY_NAMES[p]: n for p, n in self.rejected.items()},
+                "avg_wait_ms": {
+                    PRIORITY_NAMES[p]: round(1000 * self.wait_total[p] / self.admitted[p], 1) if self.admitted[p] else 0.0
+                    for p in PRIORITY_NAMES
+                },
+                "ewma_service_s": {PRIORITY_NAMES[p]: round(s, 3) for p, s in self.ewma_service.items()},
+            }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> Optional[LLMGateway]:
+    """Process-wide gateway for the configured backend, or None when LLM_GATEWAY_ENABLED is off"""
+    global _gateway
+    if not config.LLM_GATEWAY_ENABLED:
+        return None
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                per_endpoint = (
+                    config.LLM_GATEWAY_CONCURRENCY_VLLM if config.LLM_MODE == "vllm"
+                    else config.LLM_GATEWAY_CONCURRENCY_OLLAMA
+                )
+                # Capacity grows with the endpoint pool (replicas / MIG slices)
+                concurrency = sum(e.max_concurrency or per_endpoint for e in get_llm_router().endpoints)
+                _gateway = LLMGateway(
+                    concurrency,
+                    max_wait={
+                        INTERACTIVE: config.LLM_GATEWAY_MAX_WAIT_INTERACTIVE,
+                        STREAMING: config.LLM_GATEWAY_MAX_WAIT_STREAMING,
+                        BACKGROUND: config.LLM_GATEWAY_MAX_WAIT_BACKGROUND,
+                    },
+                    max_queue=config.LLM_GATEWAY_MAX_QUEUE,
+                )
+    return _gateway
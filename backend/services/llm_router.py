@@ -0,0 +1,272 @@
+"""
+LLM Router
+Pool of LLM endpoints serving the configured model (several vLLM instances
+or MIG slices, several Ollama hosts). Endpoints are listed under "endpoints"
+in config/llm_models.json:
+
+    {"name": "vllm-a", "provider": "vllm", "url": "http://vllm-a:8001/v1",
+     "model": "openai/gpt-oss-20b", "weight": 1, "max_concurrency": 16}
+
+Only endpoints of the current LLM_MODE serving LLM_MODEL (or with no "model")
+are used; with none configured the pool is the single LLM_OLLAMA_URL /
+LLM_VLLM_URL endpoint.
+
+- balancing: least outstanding requests (ties by latency EWMA) or latency EWMA
+  weighted by load, both divided by "weight";
+- failover: a transport error, timeout or 5xx retries on another replica
+  (LLM_ROUTER_MAX_ATTEMPTS in total);
+- circuit breaker: after LLM_ROUTER_FAILURE_THRESHOLD consecutive failures an
+  endpoint is skipped for LLM_ROUTER_COOLDOWN_SECONDS, then one trial request
+  decides whether it rejoins. A single-endpoint pool never opens it: there is
+  no replica to send the request to instead;
+- active health checks every LLM_HEALTH_CHECK_INTERVAL seconds close the
+  breaker without waiting for user traffic; a failed probe opens it only with
+  LLM_HEALTH_CHECK_OPENS_BREAKER.
+"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypeVar
+
+import requests
+
+from . import config
+
+T = TypeVar("T")
+
+
+class LLMUnavailable(Exception):
+    """No healthy endpoint is left for the request"""
+
+
+@dataclass
+class LLMEndpoint:
+    name: str
+    provider: str  # ollama | vllm
+    url: str
+    model: Optional[str] = None  # None = whatever LLM_MODEL is
+    weight: float = 1.0
+    max_concurrency: Optional[int] = None  # None = LLM_GATEWAY_CONCURRENCY_* of the provider
+
+    # Runtime state
+    in_flight: int = field(default=0, init=False)
+    ewma_latency: float = field(default=0.0, init=False)
+    consecutive_failures: int = field(default=0, init=False)
+    open_until: float = field(default=0.0, init=False)
+    probing: bool = field(default=False, init=False)
+    requests: int = field(default=0, init=False)
+    failures: int = field(default=0, init=False)
+
+    @property
+    def health_url(self) -> str:
+        if self.provider == "ollama":
+            return f"{self.url}/api/tags"
+        # OpenAI-compatible base URL ends with /v1; vLLM serves /health at the root
+        base = self.url[:-3] if self.url.rstrip("/").endswith("/v1") else self.url
+        return f"{base.rstrip('/')}/health"
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "url": self.url,
+            "state": "open" if self.open_until > now else ("half_open" if self.probing else "closed"),
+            "in_flight": self.in_flight,
+            "ewma_latency_s": round(self.ewma_latency, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+def _retryable(error: Exception) -> bool:
+    # 4xx is a problem with the request itself: another replica would reject it too
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.RequestException, ValueError))
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        strategy: str = "least_outstanding",
+        max_attempts: int = 2,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+        health_opens_breaker: bool = False,
+    ):
+        if not endpoints:
+            raise ValueError("LLM router needs at least one endpoint")
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.max_attempts = max(1, max_attempts)
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown_seconds
+        self.health_opens_breaker = health_opens_breaker
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _score(self, endpoint: LLMEndpoint):
+        weight = endpoint.weight or 1.0
+        if self.strategy == "ewma":
+            return endpoint.ewma_latency * (endpoint.in_flight + 1) / weight, endpoint.in_flight
+        return endpoint.in_flight / weight, endpoint.ewma_latency
+
+    def _pick(self, exclude: List[LLMEndpoint]) -> Optional[LLMEndpoint]:
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for endpoint in self.endpoints:
+                if endpoint in exclude or endpoint.probing:
+                    continue
+                if endpoint.open_until > now:
+                    continue
+                candidates.append(endpoint)
+            if not candidates:
+                return None
+            # An endpoint whose cooldown has run out gets a single trial request
+            chosen = min(candidates, key=self._score)
+            if chosen.open_until:
+                chosen.probing = True
+            chosen.in_flight += 1
+            chosen.requests += 1
+            return chosen
+
+    def _record(self, endpoint: LLMEndpoint, ok: bool, latency: Optional[float] = None) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+            self._mark(endpoint, ok)
+            if ok and latency is not None:
+                endpoint.ewma_latency = (
+                    latency if not endpoint.ewma_latency else 0.8 * endpoint.ewma_latency + 0.2 * latency
+                )
+
+    def _can_open(self) -> bool:
+        # With one endpoint an open breaker only turns every call into a failure
+        return len(self.endpoints) > 1
+
+    def _mark(self, endpoint: LLMEndpoint, ok: bool) -> None:
+        trial = endpoint.probing
+        endpoint.probing = False
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.open_until = 0.0
+            return
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if self._can_open() and (trial or endpoint.consecutive_failures >= self.failure_threshold):
+            print(f"[LLMRouter] {endpoint.name} unavailable, skipped for {self.cooldown:.0f}s")
+            endpoint.open_until = time.time() + self.cooldown
+
+    def call(self, fn: Callable[[LLMEndpoint], T]) -> T:
+        """Run fn against the best endpoint, failing over to others on retryable errors"""
+        tried: List[LLMEndpoint] = []
+        last_error: Optional[Exception] = None
+        while len(tried) < self.max_attempts:
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            start = time.monotonic()
+            try:
+                result = fn(endpoint)
+            except Exception as e:
+                if not _retryable(e):
+                    # The endpoint answered, the request itself is bad
+                    self._record(endpoint, ok=True)
+                    raise
+                self._record(endpoint, ok=False)
+                last_error = e
+                print(f"[LLMRouter] {endpoint.name} failed: {e}")
+                continue
+            self._record(endpoint, ok=True, latency=time.monotonic() - start)
+            return result
+        if last_error is not None:
+            raise last_error
+        raise LLMUnavailable("no healthy LLM endpoint")
+
+    def check_health(self) -> None:
+        """Active probe of every endpoint; updates the breakers"""
+        for endpoint in self.endpoints:
+            try:
+                requests.get(endpoint.health_url, timeout=5).raise_for_status()
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                if ok:
+                    if endpoint.open_until:
+                        print(f"[LLMRouter] {endpoint.name} healthy again")
+                    endpoint.consecutive_failures = 0
+                    endpoint.open_until = 0.0
+                elif self.health_opens_breaker and self._can_open() and endpoint.open_until <= time.time():
+                    # A failed probe opens the breaker at once: no user request should hit it
+                    print(f"[LLMRouter] {endpoint.name} failed health check, skipped for {self.cooldown:.0f}s")
+                    endpoint.open_until = time.time() + self.cooldown
+
+    def start_health_checks(self, interval: float) -> None:
+        if interval <= 0 or self._health_thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.check_health()
+
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=run, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(5)
+            self._health_thread = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+            }
+
+
+def load_endpoints(path: Path, provider: str, model: str) -> List[LLMEndpoint]:
+    """Endpoints from the "endpoints" list of the models file that can serve provider/model"""
+    endpoints = []
+    if path.exists():
+        with open(path, "r") as f:
+            data = json.load(f)
+        for item in data.get("endpoints", []):
+            endpoint = LLMEndpoint(**item)
+            if endpoint.provider == provider and endpoint.model in (None, model):
+                endpoints.append(endpoint)
+    if endpoints:
+        return endpoints
+    url = config.LLM_VLLM_URL if provider == "vllm" else config.LLM_OLLAMA_URL
+    return [LLMEndpoint(name=provider, provider=provider, url=url)]
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                endpoints = load_endpoints(config.LLM_ENDPOINTS_PATH, config.LLM_MODE, config.LLM_MODEL)
+                print(f"[LLMRouter] {len(endpoints)} endpoint(s): {', '.join(e.url for e in endpoints)}")
+                _router = LLMRouter(
+                    endpoints,
+                    strategy=config.LLM_ROUTER_STRATEGY,
+                    max_attempts=config.LLM_ROUTER_MAX_ATTEMPTS,
+                    failure_threshold=config.LLM_ROUTER_FAILURE_THRESHOLD,
+                    cooldown_seconds=config.LLM_ROUTER_COOLDOWN_SECONDS,
+                    health_opens_breaker=config.LLM_HEALTH_CHECK_OPENS_BREAKER,
+                )
+    return _router
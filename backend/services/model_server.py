@@ -0,0 +1,324 @@
+"""
+Local Model Server
+One process hosts the embedder, the cross-encoder and the doc-type classifier;
+API workers talk to it over a Unix socket (MODEL_SERVER_SOCKET) instead of
+loading their own copies, so RSS per worker stays small.
+
+Wire format: 4-byte big-endian length + JSON message, on a persistent
+connection per client thread. NumPy arrays (embedding matrices, rerank scores,
+classifier input vectors) travel as {"__ndarray__": ...}: arrays of at least
+MODEL_SERVER_SHM_MIN_BYTES are written to a POSIX shared-memory block that the
+receiver copies and unlinks, smaller ones are inlined as base64. The sender
+also unlinks its blocks once the exchange is over (the server on the client's
+next request or disconnect, the client after the reply), so a peer that dies
+before unlinking does not leak /dev/shm.
+
+Run the server with `python -m cli.model_server`; workers switch to the remote
+models as soon as MODEL_SERVER_SOCKET is set.
+"""
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import config
+
+_HEADER = struct.Struct(">I")
+
+
+# --- framing and array transport ---------------------------------------------
+
+def _send_msg(sock: socket.socket, msg: Dict) -> None:
+    data = json.dumps(msg, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_msg(sock: socket.socket) -> Dict:
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, length))
+
+
+def pack_array(arr: np.ndarray, created: Optional[List[str]] = None) -> Dict:
+    """
+    Describe an array for the peer; large arrays go through shared memory
+    (the block name is appended to created, for _release_blocks)
+    """
+    arr = np.ascontiguousarray(arr)
+    desc = {"shape": list(arr.shape), "dtype": arr.dtype.str}
+    if arr.nbytes < max(config.MODEL_SERVER_SHM_MIN_BYTES, 1):
+        desc["b64"] = base64.b64encode(arr.tobytes()).decode("ascii")
+        return {"__ndarray__": desc}
+    name = f"rag_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+    shm = shared_memory.SharedMemory(name=name, create=True, size=arr.nbytes)
+    try:
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    finally:
+        shm.close()
+    # The receiver unlinks the block; keep our resource tracker from removing it at exit
+    resource_tracker.unregister(shm._name, "shared_memory")
+    desc["shm"] = name
+    if created is not None:
+        created.append(name)
+    return {"__ndarray__": desc}
+
+
+def unpack_array(obj: Dict) -> np.ndarray:
+    desc = obj["__ndarray__"]
+    shape, dtype = tuple(desc["shape"]), np.dtype(desc["dtype"])
+    if "b64" in desc:
+        return np.frombuffer(base64.b64decode(desc["b64"]), dtype=dtype).reshape(shape).copy()
+    shm = shared_memory.SharedMemory(name=desc["shm"])
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _is_array(obj: Any) -> bool:
+    return isinstance(obj, dict) and "__ndarray__" in obj
+
+
+def _release_blocks(names: List[str]) -> None:
+    """Unlink blocks the receiver has not unlinked (it failed or disconnected)"""
+    while names:
+        name = names.pop()
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+
+# --- server ------------------------------------------------------------------
+
+class ModelHost:
+    """Models loaded once in the server process (always the local backends)"""
+
+    def __init__(self, embedder=None, reranker=None, classifier=None):
+        self.embedder = embedder
+        self.reranker = reranker
+        self.classifier = classifier
+        self.requests = 0
+        self.errors = 0
+
+    @classmethod
+    def load(cls, reranker: bool = True, classifier: bool = True) -> "ModelHost":
+        from . import categories, embeddings, rerank
+
+        return cls(
+            embeddings.load_local_embedder(),
+            rerank.load_local_reranker() if reranker else None,
+            categories.load_local_classifier() if classifier else None,
+        )
+
+    def handle(self, msg: Dict, created: Optional[List[str]] = None) -> Dict:
+        """Run one request; shared-memory blocks of the reply are recorded in created"""
+        op = msg.get("op")
+        self.requests += 1
+        if op == "info":
+            return {
+                "dimension": self.embedder.get_sentence_embedding_dimension() if self.embedder else None,
+                "reranker": self.reranker is not None,
+                "classifier": self.classifier is not None,
+                "embed_model": config.EMBED_MODEL,
+                "rerank_model": config.RERANK_MODEL,
+                "backend": config.INFERENCE_BACKEND,
+                "pid": os.getpid(),
+                "requests": self.requests,
+                "errors": self.errors,
+            }
+        if op == "embed":
+            texts = msg["texts"]
+            vectors = self.embedder.encode(texts, batch_size=msg.get("batch_size") or max(len(texts), 1))
+            return {"result": pack_array(np.asarray(vectors, dtype=np.float32), created)}
+        if op == "rerank":
+            pairs = [tuple(p) for p in msg["pairs"]]
+            scores = self.reranker.predict(pairs, batch_size=msg.get("batch_size") or max(len(pairs), 1))
+            return {"result": pack_array(np.asarray(scores, dtype=np.float32), created)}
+        if op == "classify":
+            if self.classifier is None:
+                raise RuntimeError("doc-type classifier is not loaded")
+            labels = self.classifier.predict(unpack_array(msg["vectors"]))
+            return {"result": [str(label) for label in labels]}
+        raise ValueError(f"unknown op {op!r}")
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        host: ModelHost = self.server.host
+        # Blocks of the last reply: the client is done with them once it sends
+        # the next request or goes away
+        outstanding: List[str] = []
+        try:
+            while True:
+                try:
+                    msg = _recv_msg(self.request)
+                except (ConnectionError, OSError):
+                    return
+                _release_blocks(outstanding)
+                try:
+                    reply = host.handle(msg, outstanding)
+                except Exception as e:
+                    host.errors += 1
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                try:
+                    _send_msg(self.request, reply)
+                except (ConnectionError, OSError):
+                    return
+        finally:
+            _release_blocks(outstanding)
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, host: ModelHost):
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.host = host
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+# --- client ------------------------------------------------------------------
+
+class ModelClient:
+    """Thread-safe client: one persistent connection per calling thread"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._info: Optional[Dict] = None
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def call(self, op: str, **fields) -> Any:
+        msg = {"op": op, **fields}
+        try:
+            for attempt in (1, 2):
+                try:
+                    sock = self._connect()
+                    _send_msg(sock, msg)
+                    reply = _recv_msg(sock)
+                    break
+                except (ConnectionError, OSError) as e:
+                    self._drop()
+                    if attempt == 2:
+                        raise RuntimeError(f"model server at {self.path} unavailable: {e}") from e
+                    # Server restarted or idle connection dropped: reconnect and resend once
+                    time.sleep(0.05)
+        finally:
+            # Request arrays the server did not consume (error, disconnect)
+            _release_blocks([v["__ndarray__"]["shm"] for v in fields.values()
+                             if _is_array(v) and "shm" in v["__ndarray__"]])
+        if "error" in reply:
+            raise RuntimeError(f"model server: {reply['error']}")
+        if op == "info":
+            return reply
+        result = reply["result"]
+        return unpack_array(result) if _is_array(result) else result
+
+    def info(self) -> Dict:
+        if self._info is None:
+            self._info = self.call("info")
+        return self._info
+
+
+class RemoteEmbedder:
+    """SentenceTransformer-compatible encode() backed by the model server"""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.client.info()["dimension"])
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, **_kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = self.client.call("embed", texts=texts, batch_size=batch_size)
+        return vectors[0] if single else vectors
+
+
+class RemoteCrossEncoder:
+    """CrossEncoder-compatible predict() backed by the model server"""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **_kwargs) -> np.ndarray:
+        return self.client.call("rerank", pairs=[list(p) for p in pairs], batch_size=batch_size)
+
+
+class RemoteClassifier:
+    """sklearn-style predict(X) for the doc-type classifier hosted by the model server"""
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+
+    def predict(self, vectors) -> List[str]:
+        return self.client.call("classify", vectors=pack_array(np.asarray(vectors, dtype=np.float32)))
+
+
+_client: Optional[ModelClient] = None
+_client_lock = threading.Lock()
+
+
+def remote_enabled() -> bool:
+    return bool(config.MODEL_SERVER_SOCKET)
+
+
+def get_client() -> ModelClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ModelClient(config.MODEL_SERVER_SOCKET, timeout=config.MODEL_SERVER_TIMEOUT)
+    return _client
@@ -0,0 +1,392 @@
+"""
+Array-backed BM25 Keyword Index
+In-process alternative to Whoosh (KEYWORD_ENGINE=numpy).
+
+Each segment is an immutable CSR posting matrix saved as .npy files and
+memory-mapped on open:
+    indptr.npy   int64[T+1]  posting range of term t: indptr[t]:indptr[t+1]
+    doc_ids.npy  int32[P]    segment-local doc ordinals
+    tfs.npy      uint16[P]   term frequencies
+    doc_len.npy  int32[N]    tokens per chunk
+    terms.json / docs.json   vocabulary and (uid, doc_id, space_id, doc_type, chunk_index)
+Deletions are tombstones (deleted.npy). Filtering by space_id / doc_type uses
+per-segment boolean bitmaps; scoring is vectorized BM25 with argpartition top-k.
+Small segments are merged when their number exceeds NUMPY_BM25_MAX_SEGMENTS.
+
+Several processes (uvicorn workers, index_cli) may share the directory:
+writers hold an flock on LOCK and re-read manifest.json before changing it,
+segment names are unique per writer, and readers reload the manifest when it
+changes on disk.
+"""
+
+import json
+import math
+import os
+import shutil
+import uuid
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+from . import config
+from .sparse_bm25 import tokenize
+
+# Same defaults as Whoosh BM25F
+K1 = 1.2
+B = 0.75
+
+_TF_MAX = np.iinfo(np.uint16).max
+
+
+class _Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        self.indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+        self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+        self.doc_len = np.load(path / "doc_len.npy", mmap_mode="r")
+        with open(path / "terms.json", "r", encoding="utf-8") as f:
+            self.term_rows: Dict[str, int] = {t: i for i, t in enumerate(json.load(f))}
+        with open(path / "docs.json", "r", encoding="utf-8") as f:
+            self.docs: List[list] = json.load(f)
+        self.load_deleted()
+        self._build_bitmaps()
+
+    def load_deleted(self):
+        """(Re)read tombstones from disk; another process may have added some"""
+        deleted_path = self.path / "deleted.npy"
+        self.set_deleted(
+            np.load(deleted_path) if deleted_path.exists() else np.zeros(len(self.docs), dtype=bool)
+        )
+
+    def set_deleted(self, deleted: np.ndarray):
+        """Replace the tombstone array (copy-on-write) and refresh live corpus stats"""
+        self.deleted = deleted
+        self.live_count = int(len(deleted) - deleted.sum())
+        self.live_tokens = int(np.asarray(self.doc_len)[~deleted].sum()) if len(deleted) else 0
+
+    def _build_bitmaps(self):
+        n = len(self.docs)
+        self.space_masks: Dict[str, np.ndarray] = {}
+        self.type_masks: Dict[str, np.ndarray] = {}
+        self.doc_rows: Dict[str, List[int]] = {}
+        for i, (_uid, doc_id, space_id, doc_type, _idx) in enumerate(self.docs):
+            self.space_masks.setdefault(space_id or "", np.zeros(n, dtype=bool))[i] = True
+            self.type_masks.setdefault(doc_type or "", np.zeros(n, dtype=bool))[i] = True
+            self.doc_rows.setdefault(doc_id, []).append(i)
+
+    def doc_freq(self, term: str) -> int:
+        """Live documents containing the term (tombstoned rows are not counted)"""
+        row = self.term_rows.get(term)
+        if row is None:
+            return 0
+        ids = self.doc_ids[int(self.indptr[row]):int(self.indptr[row + 1])]
+        return int(np.count_nonzero(~self.deleted[ids]))
+
+    def filter_mask(self, space_id: Optional[str], doc_types: Optional[List[str]],
+                    doc_ids: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """Live docs matching the filters; None when nothing in this segment can match"""
+        mask = ~self.deleted
+        if space_id:
+            space_mask = self.space_masks.get(space_id)
+            if space_mask is None:
+                return None
+            mask = mask & space_mask
+        if doc_types:
+            type_masks = [self.type_masks[dt] for dt in doc_types if dt in self.type_masks]
+            if not type_masks:
+                return None
+            mask = mask & np.logical_or.reduce(type_masks)
+        if doc_ids:
+            rows = [i for d in doc_ids for i in self.doc_rows.get(d, ())]
+            if not rows:
+                return None
+            doc_mask = np.zeros(len(self.docs), dtype=bool)
+            doc_mask[rows] = True
+            mask = mask & doc_mask
+        return mask if mask.any() else None
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        row = self.term_rows[term]
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+
+def _write_segment(path: Path, docs: List[list], term_docs: Dict[str, List[Tuple[int, int]]],
+                   doc_len: List[int]) -> None:
+    """Write a CSR segment into a temp dir and move it into place atomically"""
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    terms = sorted(term_docs)
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    for i, term in enumerate(terms):
+        indptr[i + 1] = indptr[i] + len(term_docs[term])
+    doc_ids = np.empty(int(indptr[-1]), dtype=np.int32)
+    tfs = np.empty(int(indptr[-1]), dtype=np.uint16)
+    for i, term in enumerate(terms):
+        postings = term_docs[term]
+        start = int(indptr[i])
+        doc_ids[start:start + len(postings)] = [d for d, _ in postings]
+        tfs[start:start + len(postings)] = [min(tf, _TF_MAX) for _, tf in postings]
+    np.save(tmp / "indptr.npy", indptr)
+    np.save(tmp / "doc_ids.npy", doc_ids)
+    np.save(tmp / "tfs.npy", tfs)
+    np.save(tmp / "doc_len.npy", np.asarray(doc_len, dtype=np.int32))
+    with open(tmp / "terms.json", "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    with open(tmp / "docs.json", "w", encoding="utf-8") as f:
+        json.dump(docs, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class ArrayBM25Index:
+    def __init__(self, root: Path, max_segments: int = 8):
+        self.root = Path(root)
+        self.max_segments = max(2, max_segments)
+        self._lock = Lock()
+        self._segments: List[_Segment] = []
+        # (inode, mtime, size) of the manifest this process has loaded
+        self._manifest_key: Optional[tuple] = None
+        self._load()
+
+    # --- persistence -------------------------------------------------------
+
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Cross-process lock: exclusive for writers, shared while a reader opens segments"""
+        with open(self.root / "LOCK", "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _current_manifest_key(self) -> Optional[tuple]:
+        try:
+            st = self._manifest_path().stat()
+        except FileNotFoundError:
+            return None
+        # os.replace gives every manifest version a new inode
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+
+    def _refresh(self):
+        """Re-read the manifest if it changed on disk (caller holds self._lock and the file lock)"""
+        key = self._current_manifest_key()
+        if key is None or key == self._manifest_key:
+            return
+        with open(self._manifest_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        opened = {s.name: s for s in self._segments}
+        segments = []
+        for name in data.get("segments", []):
+            seg = opened.get(name)
+            if seg is None:
+                seg = _Segment(self.root / name)
+            else:
+                seg.load_deleted()
+            segments.append(seg)
+        self._segments = segments
+        self._manifest_key = key
+
+    def _maybe_reload(self):
+        if self._current_manifest_key() != self._manifest_key:
+            with self._lock, self._file_lock(shared=True):
+                self._refresh()
+
+    def _save_manifest(self, segments: List[_Segment]):
+        tmp = self._manifest_path().with_suffix(f".json.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segments": [s.name for s in segments]}, f)
+        os.replace(tmp, self._manifest_path())
+        self._manifest_key = self._current_manifest_key()
+
+    def _new_segment_path(self) -> Path:
+        # Unique across writers sharing the directory
+        return self.root / f"seg_{uuid.uuid4().hex}"
+
+    @staticmethod
+    def _save_deleted(seg: _Segment):
+        tmp = seg.path / "deleted.tmp.npy"
+        np.save(tmp, seg.deleted)
+        os.replace(tmp, seg.path / "deleted.npy")
+
+    # --- writes ------------------------------------------------------------
+
+    def _mark_deleted(self, doc_id: str) -> bool:
+        changed = False
+        for seg in self._segments:
+            rows = seg.doc_rows.get(doc_id)
+            if rows and not seg.deleted[rows].all():
+                # Copy-on-write so concurrent searches keep a consistent view
+                deleted = seg.deleted.copy()
+                deleted[rows] = True
+                seg.set_deleted(deleted)
+                self._save_deleted(seg)
+                changed = True
+        return changed
+
+    def add_chunks(self, space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
+        """Index a document as a new segment; earlier versions of doc_id are tombstoned"""
+        docs, doc_len = [], []
+        term_docs: Dict[str, List[Tuple[int, int]]] = {}
+        for i, text in enumerate(chunks):
+            tokens = tokenize(text)
+            docs.append([f"{doc_id}:{i}", doc_id, space_id, doc_type, i])
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_docs.setdefault(term, []).append((i, tf))
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._mark_deleted(doc_id)
+            if docs:
+                path = self._new_segment_path()
+                _write_segment(path, docs, term_docs, doc_len)
+                self._segments = self._segments + [_Segment(path)]
+            self._save_manifest(self._segments)
+            if len(self._segments) > self.max_segments:
+                self._merge_small()
+
+    def delete_doc(self, doc_id: str):
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self._mark_deleted(doc_id):
+                # Rewritten manifest tells other processes to reload tombstones
+                self._save_manifest(self._segments)
+
+    def _merge_small(self):
+        """Merge the smaller half of the segments into one, dropping tombstoned docs"""
+        by_size = sorted(self._segments, key=lambda s: len(s.docs))
+        victims = by_size[: max(2, len(by_size) // 2)]
+        docs, doc_len = [], []
+        term_docs: Dict[str, List[Tuple[int, int]]] = {}
+        for seg in victims:
+            live = np.flatnonzero(~seg.deleted)
+            remap = np.full(len(seg.docs), -1, dtype=np.int64)
+            remap[live] = np.arange(len(docs), len(docs) + len(live))
+            docs.extend(seg.docs[i] for i in live)
+            doc_len.extend(int(seg.doc_len[i]) for i in live)
+            for term in seg.term_rows:
+                ids, tfs = seg.postings(term)
+                new_ids = remap[np.asarray(ids)]
+                keep = new_ids >= 0
+                if keep.any():
+                    term_docs.setdefault(term, []).extend(
+                        zip(new_ids[keep].tolist(), np.asarray(tfs)[keep].tolist())
+                    )
+        victim_names = {s.name for s in victims}
+        remaining = [s for s in self._segments if s.name not in victim_names]
+        if docs:
+            path = self._new_segment_path()
+            _write_segment(path, docs, term_docs, doc_len)
+            remaining.append(_Segment(path))
+        self._segments = remaining
+        self._save_manifest(remaining)
+        for seg in victims:
+            # Open memory maps keep the data alive on POSIX until readers drop them
+            shutil.rmtree(seg.path, ignore_errors=True)
+
+    # --- reads -------------------------------------------------------------
+
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    def search(self, q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+               doc_ids: Optional[List[str]] = None):
+        terms = list(dict.fromkeys(tokenize(q)))
+        self._maybe_reload()
+        segments = self._segments
+        if not terms or not segments or top_k <= 0:
+            return []
+
+        n_docs = sum(s.live_count for s in segments)
+        if n_docs == 0:
+            return []
+        avgdl = max(sum(s.live_tokens for s in segments) / n_docs, 1.0)
+        idf = {}
+        for term in terms:
+            df = sum(s.doc_freq(term) for s in segments)
+            if df:
+                idf[term] = max(0.0, math.log(1 + (n_docs - df + 0.5) / (df + 0.5)))
+        if not idf:
+            return []
+
+        hits: List[Tuple[float, _Segment, int]] = []
+        for seg in segments:
+            mask = seg.filter_mask(space_id, doc_types, doc_ids)
+            if mask is None:
+                continue
+            scores = np.zeros(len(seg.docs), dtype=np.float32)
+            for term, term_idf in idf.items():
+                if term not in seg.term_rows:
+                    continue
+                ids, tfs = seg.postings(term)
+                tf = np.asarray(tfs, dtype=np.float32)
+                norm = K1 * (1 - B + B * np.asarray(seg.doc_len[ids], dtype=np.float32) / avgdl)
+                # Doc ids are unique within a posting list, so fancy-index += is safe
+                scores[ids] += term_idf * tf * (K1 + 1) / (tf + norm)
+            scores[~mask] = 0.0
+            cand = np.flatnonzero(scores > 0)
+            if len(cand) > top_k:
+                cand = cand[np.argpartition(-scores[cand], top_k - 1)[:top_k]]
+            hits.extend((float(scores[i]), seg, int(i)) for i in cand)
+
+        hits.sort(key=lambda h: h[0], reverse=True)
+        out = []
+        for score, seg, i in hits[:top_k]:
+            uid, doc_id, doc_space, doc_type, chunk_index = seg.docs[i]
+            out.append({
+                "key": uid,
+                "score": score,
+                "payload": {
+                    "doc_id": doc_id,
+                    "space_id": doc_space,
+                    "doc_type": doc_type,
+                    "chunk_index": int(chunk_index),
+                },
+            })
+        return out
+
+
+_index: Optional[ArrayBM25Index] = None
+_index_lock = Lock()
+
+
+def get_index() -> ArrayBM25Index:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ArrayBM25Index(config.NUMPY_BM25_DIR, config.NUMPY_BM25_MAX_SEGMENTS)
+    return _index
+
+
+def add_chunks(space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
+    get_index().add_chunks(space_id, doc_id, doc_type, chunks)
+
+
+def search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+           doc_ids: Optional[List[str]] = None):
+    # Text is not stored here: results are hydrated from the chunk store / Qdrant
+    return get_index().search(q, space_id, doc_types, top_k, doc_ids)
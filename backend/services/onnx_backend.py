@@ -0,0 +1,197 @@
+"""
+ONNX Runtime Inference Backend
+CPU inference for the embedder and the cross-encoder (INFERENCE_BACKEND=onnx).
+
+On first use the HuggingFace transformer behind the SentenceTransformer /
+CrossEncoder is exported to ONNX (needs torch once), optionally quantized with
+dynamic int8 (ONNX_QUANTIZE=int8) and cached in ONNX_CACHE_DIR together with
+the tokenizer and pooling metadata. Later starts only need onnxruntime and the
+tokenizer. The wrappers expose the small part of the sentence-transformers API
+used here: encode / get_sentence_embedding_dimension and predict.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import config
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+def _require_ort():
+    if ort is None:
+        raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package")
+
+
+def _export_dir(model_name: str, kind: str) -> Path:
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+    return config.ONNX_CACHE_DIR / f"{kind}-{safe}"
+
+
+def _session(model_path: Path):
+    _require_ort()
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if config.ONNX_INTRA_OP_THREADS > 0:
+        opts.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    # One request = one model call; parallelism comes from intra-op threads
+    opts.inter_op_num_threads = 1
+    return ort.InferenceSession(str(model_path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def _export(hf_model, tokenizer, out_dir: Path, output_name: str, meta: Dict) -> None:
+    """Export a transformers model to ONNX with dynamic batch/sequence axes"""
+    import torch
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    hf_model.eval()
+    sample = tokenizer(["export sample"], ["export sample"] if meta.get("pairs") else None,
+                       return_tensors="pt", padding=True, truncation=True)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic[output_name] = {0: "batch"}
+    tmp_path = out_dir / "model.onnx.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model,
+            # Trailing dict = keyword arguments, so the forward() argument order doesn't matter
+            ({name: sample[name] for name in input_names},),
+            str(tmp_path),
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic,
+            opset_version=17,
+        )
+    os.replace(tmp_path, out_dir / "model.onnx")
+    tokenizer.save_pretrained(str(out_dir))
+    with open(out_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({**meta, "input_names": input_names}, f)
+
+
+def _model_path(out_dir: Path) -> Path:
+    """fp32 export, or its dynamic int8 version (created once) when ONNX_QUANTIZE=int8"""
+    fp32 = out_dir / "model.onnx"
+    if config.ONNX_QUANTIZE != "int8":
+        return fp32
+    int8 = out_dir / "model.int8.onnx"
+    if not int8.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = out_dir / "model.int8.onnx.tmp"
+        quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, int8)
+    return int8
+
+
+def _load_tokenizer(out_dir: Path):
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(str(out_dir))
+
+
+class OnnxEmbedder:
+    """SentenceTransformer replacement: transformer in ONNX Runtime + pooling/normalize in NumPy"""
+
+    def __init__(self, model_name: str):
+        _require_ort()
+        self.out_dir = _export_dir(model_name, "embed")
+        if not (self.out_dir / "meta.json").exists():
+            self._export(model_name)
+        with open(self.out_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.tokenizer = _load_tokenizer(self.out_dir)
+        self.session = _session(_model_path(self.out_dir))
+
+    def _export(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        st = SentenceTransformer(model_name, device="cpu")
+        transformer = st[0]
+        pooling = next((m for m in st if type(m).__name__ == "Pooling"), None)
+        meta = {
+            "model": model_name,
+            "max_length": int(st.max_seq_length or 256),
+            "dimension": int(st.get_sentence_embedding_dimension()),
+            "pooling": "cls" if pooling is not None and getattr(pooling, "pooling_mode_cls_token", False) else "mean",
+            "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        }
+        print(f"[ONNX] Exporting embedder {model_name} to {self.out_dir}")
+        _export(transformer.auto_model, transformer.tokenizer, self.out_dir, "last_hidden_state", meta)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.meta["dimension"])
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, **_kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = []
+        for start in range(0, len(texts), max(batch_size, 1)):
+            out.append(self._encode_batch(texts[start:start + batch_size]))
+        vectors = np.concatenate(out) if out else np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True,
+                             max_length=self.meta["max_length"], return_tensors="np")
+        feeds = {name: enc[name].astype(np.int64) for name in self.meta["input_names"]}
+        hidden = self.session.run(None, feeds)[0]
+        if self.meta["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.meta["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+
+class OnnxCrossEncoder:
+    """CrossEncoder replacement: logits from ONNX Runtime, sigmoid for single-label models"""
+
+    def __init__(self, model_name: str):
+        _require_ort()
+        self.out_dir = _export_dir(model_name, "rerank")
+        if not (self.out_dir / "meta.json").exists():
+            self._export(model_name)
+        with open(self.out_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.tokenizer = _load_tokenizer(self.out_dir)
+        self.session = _session(_model_path(self.out_dir))
+
+    def _export(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+
+        ce = CrossEncoder(model_name, device="cpu")
+        meta = {
+            "model": model_name,
+            "pairs": True,
+            "max_length": int(getattr(ce, "max_length", None) or 512),
+            "num_labels": int(ce.model.config.num_labels),
+        }
+        print(f"[ONNX] Exporting cross-encoder {model_name} to {self.out_dir}")
+        _export(ce.model, ce.tokenizer, self.out_dir, "logits", meta)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **_kwargs) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), max(batch_size, 1)):
+            batch = pairs[start:start + batch_size]
+            enc = self.tokenizer([p[0] for p in batch], [p[1] for p in batch], padding=True,
+                                 truncation=True, max_length=self.meta["max_length"], return_tensors="np")
+            feeds = {name: enc[name].astype(np.int64) for name in self.meta["input_names"]}
+            logits = self.session.run(None, feeds)[0]
+            if self.meta["num_labels"] == 1:
+                scores.append(1.0 / (1.0 + np.exp(-logits[:, 0])))
+            else:
+                scores.append(logits)
+        if not scores:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(scores).astype(np.float32)
@@ -0,0 +1,148 @@
+"""
+Payload Index Management
+Declares the payload indexes each Qdrant collection needs for filtered search
+and creates the missing ones at startup.
+"""
+
+from typing import Dict, List, Optional
+
+from . import config
+
+
+# Index schema per field: "keyword" | "integer" | "bool"
+MAIN_COLLECTION_INDEXES: Dict[str, str] = {
+    "space_id": "keyword",
+    "doc_type": "keyword",
+    "doc_id": "keyword",
+    "chunk_index": "integer",
+    "has_summary": "bool",
+}
+
+# Extra fields filtered by AccessControlService.build_access_filter
+ACL_INDEXES: Dict[str, str] = {
+    "channel_id": "keyword",
+    "visibility": "keyword",
+    "owner_id": "keyword",
+    "access_list": "keyword",
+    "agent_roles": "keyword",
+    "department": "keyword",
+    "security_level": "integer",
+}
+
+SUMMARY_INDEXES: Dict[str, str] = {
+    "doc_id": "keyword",
+    "space_id": "keyword",
+    "doc_type": "keyword",
+}
+
+CHAT_MESSAGES_INDEXES: Dict[str, str] = {
+    "thread_id": "keyword",
+    "space_id": "keyword",
+    "sender": "keyword",
+}
+
+THREAD_SUMMARIES_INDEXES: Dict[str, str] = {
+    "thread_id": "keyword",
+    "space_id": "keyword",
+    "chat_type": "keyword",
+}
+
+
+def _known_collections() -> List[str]:
+    from .summary_store import SUMMARY_COLLECTION
+    from .thread_store import CHAT_MESSAGES_COLLECTION, THREAD_SUMMARIES_COLLECTION
+
+    return [
+        config.QDRANT_COLLECTION,
+        SUMMARY_COLLECTION,
+        CHAT_MESSAGES_COLLECTION,
+        THREAD_SUMMARIES_COLLECTION,
+    ]
+
+
+def required_indexes(collection_name: str, with_acl: bool = False) -> Dict[str, str]:
+    """Declared indexes for a collection (empty dict for unknown collections)"""
+    from .summary_store import SUMMARY_COLLECTION
+    from .thread_store import CHAT_MESSAGES_COLLECTION, THREAD_SUMMARIES_COLLECTION
+
+    if collection_name == config.QDRANT_COLLECTION:
+        indexes = dict(MAIN_COLLECTION_INDEXES)
+        if with_acl:
+            indexes.update(ACL_INDEXES)
+        return indexes
+    if collection_name == SUMMARY_COLLECTION:
+        return dict(SUMMARY_INDEXES)
+    if collection_name == CHAT_MESSAGES_COLLECTION:
+        return dict(CHAT_MESSAGES_INDEXES)
+    if collection_name == THREAD_SUMMARIES_COLLECTION:
+        return dict(THREAD_SUMMARIES_INDEXES)
+    return {}
+
+
+def existing_indexes(cl, collection_name: str) -> Dict[str, str]:
+    """Payload indexes that already exist in the collection: field -> schema"""
+    info = cl.get_collection(collection_name)
+    schema = info.payload_schema or {}
+    out = {}
+    for field, field_info in schema.items():
+        data_type = getattr(field_info, "data_type", None)
+        out[field] = getattr(data_type, "value", data_type)
+    return out
+
+
+def ensure_payload_indexes(
+    cl,
+    collection_name: str,
+    indexes: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """
+    Create declared payload indexes that are missing in the collection
+
+    Returns: list of created field names
+    """
+    if indexes is None:
+        indexes = required_indexes(collection_name)
+    if not indexes:
+        return []
+
+    present = existing_indexes(cl, collection_name)
+    created = []
+    for field, schema in indexes.items():
+        if field in present:
+            continue
+        try:
+            cl.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=schema,
+            )
+            created.append(field)
+        except Exception as e:
+            print(f"[PayloadIndexes] Failed to create index {collection_name}.{field}: {e}")
+
+    if created:
+        print(f"[PayloadIndexes] Created indexes on {collection_name}: {', '.join(created)}")
+    return created
+
+
+def ensure_all_payload_indexes(cl) -> Dict[str, List[str]]:
+    """Startup bootstrap: fill in missing indexes on every known collection that exists"""
+    created = {}
+    for name in _known_collections():
+        # collection_exists also resolves aliases (the summary collection after re-embedding)
+        if cl.collection_exists(name):
+            created[name] = ensure_payload_indexes(cl, name)
+    return created
+
+
+def payload_index_status(cl, collection_name: str, indexes: Optional[Dict[str, str]] = None) -> Dict:
+    """Report declared vs existing indexes for /health"""
+    if indexes is None:
+        indexes = required_indexes(collection_name)
+    present = existing_indexes(cl, collection_name)
+    missing = sorted(field for field in indexes if field not in present)
+    return {
+        "ok": not missing,
+        "indexed": sorted(present),
+        "missing": missing,
+    }
@@ -0,0 +1,95 @@
+"""
+Qdrant Client Pool
+Process-wide sync and async Qdrant clients (REST or gRPC) plus memoized
+collection bootstrap, so hot paths don't reconnect or re-check collections.
+"""
+
+import asyncio
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from . import config
+
+
+_lock = Lock()
+_sync_client: Optional[QdrantClient] = None
+_async_clients: Dict[int, tuple] = {}
+# Close tasks of dropped clients (the loop only keeps weak references to tasks)
+_closing: set = set()
+_bootstrapped: set = set()
+
+
+def _client_kwargs() -> Dict:
+    return {
+        "url": config.QDRANT_URL,
+        "prefer_grpc": config.QDRANT_PREFER_GRPC,
+        "grpc_port": config.QDRANT_GRPC_PORT,
+        "timeout": config.QDRANT_TIMEOUT,
+    }
+
+
+def get_sync_client() -> QdrantClient:
+    """Shared synchronous client (thread-safe, keeps its connection pool)"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = QdrantClient(**_client_kwargs())
+    return _sync_client
+
+
+def get_async_client() -> AsyncQdrantClient:
+    """
+    Async client bound to the running event loop.
+
+    Connections belong to a loop, so background tasks that run their own
+    loop (asyncio.run) get a separate client; clients of closed loops are
+    dropped and closed on the current loop (HTTP pool, gRPC channels).
+    """
+    loop = asyncio.get_running_loop()
+    key = id(loop)
+    dropped = []
+    with _lock:
+        for stale_key in [k for k, (lp, _) in _async_clients.items() if lp.is_closed()]:
+            dropped.append(_async_clients.pop(stale_key)[1])
+        entry = _async_clients.get(key)
+        if entry is None or entry[0] is not loop:
+            if entry is not None:
+                dropped.append(entry[1])
+            entry = (loop, AsyncQdrantClient(**_client_kwargs()))
+            _async_clients[key] = entry
+    for stale in dropped:
+        task = loop.create_task(_close_quietly(stale))
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    return entry[1]
+
+
+async def _close_quietly(client: AsyncQdrantClient) -> None:
+    try:
+        await client.close()
+    except Exception as e:
+        print(f"[QdrantPool] Closing a dropped async client failed: {e}")
+
+
+def ensure_once(name: str, bootstrap: Callable[[], None]) -> None:
+    """
+    Run a collection bootstrap only once per process (until reset_bootstrap).
+    Bootstraps are idempotent, so a concurrent duplicate run is harmless.
+    """
+    if name in _bootstrapped:
+        return
+    bootstrap()
+    with _lock:
+        _bootstrapped.add(name)
+
+
+def reset_bootstrap(name: Optional[str] = None) -> None:
+    """Forget bootstrap state, e.g. after a collection was dropped externally"""
+    with _lock:
+        if name is None:
+            _bootstrapped.clear()
+        else:
+            _bootstrapped.discard(name)
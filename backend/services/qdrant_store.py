@@ -1,7 +1,7 @@
 
 import uuid
-from typing import List, Optional
-from qdrant_client import QdrantClient
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.models import (
     Distance,
     VectorParams,
@@ -10,31 +10,124 @@ from qdrant_client.models import (
     FieldCondition,
     MatchValue,
     MatchAny,
+    HasIdCondition,
     HnswConfigDiff,
     SearchParams,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParamsDiff,
+    SparseVectorParams,
+    SparseVector,
+    Modifier,
+    Prefetch,
+    FusionQuery,
+    Fusion,
+    Range,
+    OrderBy,
+    Direction,
 )
 from . import config
-from .config import QDRANT_URL, QDRANT_COLLECTION
-from .embeddings import embed, dim
+from .config import QDRANT_COLLECTION
+from .embeddings import embed, embed_query, embed_query_async, dim
+from .query_context import QueryContext
+from .payload_indexes import ensure_payload_indexes
+from .qdrant_pool import ensure_once, get_async_client, get_sync_client
+from .chunk_store import get_chunk_store, point_texts, save_chunks
+from .sparse_bm25 import encode_document, encode_query
+
+# Namespace for deterministic chunk point IDs (UUIDv5).
+_POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "quadrate-rag/chunks")
+
+
+def chunk_point_id(space_id: str, doc_id: str, chunk_index: int) -> str:
+    """Stable point ID for a chunk: re-ingesting the same chunk overwrites it."""
+    return str(uuid.uuid5(_POINT_NAMESPACE, f"{space_id}/{doc_id}/{int(chunk_index)}"))
 
-_client: Optional[QdrantClient] = None
 
 def client() -> QdrantClient:
-    global _client
-    if _client is None:
-        _client = QdrantClient(url=QDRANT_URL)
-        ensure_collection()
-    return _client
+    ensure_collection()
+    return get_sync_client()
+
+async def async_client() -> AsyncQdrantClient:
+    """Async client for use inside the event loop (collection bootstrap is memoized)"""
+    ensure_collection()
+    return get_async_client()
+
+def quantization_config(mode: Optional[str] = None):
+    """Collection quantization config for mode none|scalar|binary (None when disabled)"""
+    mode = (mode or config.QDRANT_QUANTIZATION).lower()
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=0.99,
+            always_ram=config.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(
+            always_ram=config.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode not in ("none", ""):
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION mode: {mode}")
+    return None
+
+def search_params(quantized: Optional[bool] = None) -> SearchParams:
+    """
+    Query-time search params. With quantization enabled, oversample quantized
+    candidates and rescore them with the original vectors; quantized=False
+    forces search over the originals (unquantized baseline).
+    """
+    if quantized is None:
+        quantized = config.QDRANT_QUANTIZATION != "none"
+        if not quantized:
+            return SearchParams(hnsw_ef=config.QDRANT_HNSW_EF_SEARCH)
+    if not quantized:
+        return SearchParams(
+            hnsw_ef=config.QDRANT_HNSW_EF_SEARCH,
+            quantization=QuantizationSearchParams(ignore=True),
+        )
+    return SearchParams(
+        hnsw_ef=config.QDRANT_HNSW_EF_SEARCH,
+        quantization=QuantizationSearchParams(
+            ignore=False,
+            rescore=config.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=config.QDRANT_QUANTIZATION_OVERSAMPLING,
+        ),
+    )
+
+def enable_quantization(mode: str):
+    """
+    Switch quantization on an existing collection (migration).
+    Qdrant rebuilds quantized segments in the background.
+    """
+    quant = quantization_config(mode)
+    on_disk = quant is not None
+    client().update_collection(
+        collection_name=QDRANT_COLLECTION,
+        vectors_config={"": VectorParamsDiff(on_disk=on_disk)},
+        quantization_config=quant if quant is not None else Disabled.DISABLED,
+    )
 
 def ensure_collection():
-    c = QdrantClient(url=QDRANT_URL)
+    ensure_once(QDRANT_COLLECTION, _bootstrap_collection)
+
+def _bootstrap_collection():
+    c = get_sync_client()
     try:
         c.get_collection(QDRANT_COLLECTION)
     except Exception:
+        quant = quantization_config()
         c.recreate_collection(
             collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(size=dim(), distance=Distance.COSINE),
+            vectors_config=VectorParams(size=dim(), distance=Distance.COSINE, on_disk=quant is not None),
             hnsw_config=HnswConfigDiff(m=config.QDRANT_HNSW_M, ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT),
+            quantization_config=quant,
+            # Always declared so switching KEYWORD_ENGINE later needs no new collection
+            sparse_vectors_config=sparse_vectors_config(),
         )
     else:
         try:
@@ -44,45 +137,240 @@ def ensure_collection():
             )
         except Exception:
             pass
+        if sparse_enabled() and not has_sparse_vector(c):
+            print(
+                f"[Qdrant] Collection '{QDRANT_COLLECTION}' has no sparse vector "
+                f"'{config.SPARSE_VECTOR_NAME}'; KEYWORD_ENGINE=qdrant_sparse needs the "
+                "collection to be recreated and documents re-ingested"
+            )
+    ensure_payload_indexes(c, QDRANT_COLLECTION)
+
+def sparse_enabled() -> bool:
+    return config.KEYWORD_ENGINE == "qdrant_sparse"
+
+def sparse_vectors_config() -> Dict[str, SparseVectorParams]:
+    """Named BM25 sparse vector; Qdrant applies IDF from its own collection statistics"""
+    return {config.SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+def has_sparse_vector(c: QdrantClient) -> bool:
+    info = c.get_collection(QDRANT_COLLECTION)
+    sparse = info.config.params.sparse_vectors or {}
+    return config.SPARSE_VECTOR_NAME in sparse
+
+def _point_vector(text: str):
+    vec = embed(text)
+    if not sparse_enabled():
+        return vec
+    indices, values = encode_document(text)
+    return {"": vec, config.SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}
 
 def upsert_chunks(space_id: str, doc_id: str, doc_type: str, chunks: List[str]):
+    if config.LEAN_PAYLOADS:
+        save_chunks(space_id, doc_id, chunks)
     points = []
     for idx, text in enumerate(chunks):
-        vec = embed(text)
+        vec = _point_vector(text)
         payload = {
             "doc_id": doc_id,
             "space_id": space_id,
             "doc_type": doc_type,
             "chunk_index": idx,
-            "text": text
         }
-        points.append(PointStruct(id=str(uuid.uuid4()), vector=vec, payload=payload))
+        if not config.LEAN_PAYLOADS:
+            payload["text"] = text
+        points.append(PointStruct(id=chunk_point_id(space_id, doc_id, idx), vector=vec, payload=payload))
     if points:
         client().upsert(collection_name=QDRANT_COLLECTION, points=points)
+    delete_stale_points(client(), doc_id, space_id, [p.id for p in points])
 
-def delete_by_doc(doc_id: str):
-    from qdrant_client.models import Filter, FieldCondition, MatchValue
-    client().delete(QDRANT_COLLECTION, points_selector=Filter(
-        must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]
+def delete_stale_points(c: QdrantClient, doc_id: str, space_id: str, keep_ids: List[str]):
+    """
+    Re-ingest: drop the document's points not in keep_ids (the old tail when it
+    has fewer chunks now, pre-UUIDv5 random-id points). Called after the upsert
+    so the document never disappears from search.
+    """
+    c.delete(QDRANT_COLLECTION, points_selector=Filter(
+        must=_doc_conditions(doc_id, space_id),
+        must_not=[HasIdCondition(has_id=keep_ids)],
     ))
 
-def semantic_search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8):
-    qv = embed(q)
-    flt = None
+def get_chunks(space_id: str, doc_id: str, indices: Iterable[int]) -> List[Dict]:
+    """
+    Fetch chunks by (doc_id, chunk_index) with a direct point retrieve.
+
+    Returns found chunks ordered by chunk_index in the same shape as search hits.
+    """
+    ids = [chunk_point_id(space_id, doc_id, idx) for idx in sorted(set(indices))]
+    if not ids:
+        return []
+    points = client().retrieve(
+        collection_name=QDRANT_COLLECTION,
+        ids=ids,
+        with_payload=True,
+        with_vectors=False,
+    )
+    points.sort(key=lambda p: p.payload.get("chunk_index", 0))
+    for p, text in zip(points, point_texts(points)):
+        p.payload["text"] = text
+    return [{"key": f"{p.payload.get('doc_id')}:{p.payload.get('chunk_index')}",
+             "score": 0.0,
+             "payload": p.payload} for p in points]
+
+def _doc_conditions(doc_id: str, space_id: Optional[str]) -> List[FieldCondition]:
+    must = [FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]
+    if space_id:
+        must.append(FieldCondition(key="space_id", match=MatchValue(value=space_id)))
+    return must
+
+def delete_by_doc(doc_id: str, space_id: Optional[str] = None):
+    if config.LEAN_PAYLOADS or config.CHUNK_STORE_PATH.exists():
+        get_chunk_store().delete_doc(doc_id)
+    # By filter (doc_id/space_id are indexed): also catches points with legacy random ids
+    client().delete(QDRANT_COLLECTION, points_selector=Filter(must=_doc_conditions(doc_id, space_id)))
+
+def _search_filter(space_id: Optional[str], doc_types: Optional[List[str]],
+                   doc_ids: Optional[List[str]] = None) -> Optional[Filter]:
     must = []
     if space_id:
         must.append(FieldCondition(key="space_id", match=MatchValue(value=space_id)))
     if doc_types:
         must.append(FieldCondition(key="doc_type", match=MatchAny(any=doc_types)))
-    if must:
-        flt = Filter(must=must)
+    if doc_ids:
+        must.append(FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids))))
+    return Filter(must=must) if must else None
+
+def _to_results(hits) -> List[Dict]:
+    return [{"key": f"{h.payload.get('doc_id')}:{h.payload.get('chunk_index')}",
+             "score": float(h.score),
+             "payload": h.payload} for h in hits]
+
+def semantic_search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+                    quantized: Optional[bool] = None, ctx: Optional[QueryContext] = None,
+                    doc_ids: Optional[List[str]] = None):
+    qv = ctx.vector if ctx is not None else embed_query(q)
     hits = client().search(
         collection_name=QDRANT_COLLECTION,
         query_vector=qv,
-        query_filter=flt,
+        query_filter=_search_filter(space_id, doc_types, doc_ids),
         limit=top_k,
-        search_params=SearchParams(hnsw_ef=config.QDRANT_HNSW_EF_SEARCH),
+        search_params=search_params(quantized),
     )
-    return [{"key": f"{h.payload.get('doc_id')}:{h.payload.get('chunk_index')}",
-             "score": float(h.score),
-             "payload": h.payload} for h in hits]
+    return _to_results(hits)
+
+async def semantic_search_async(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+                                ctx: Optional[QueryContext] = None, doc_ids: Optional[List[str]] = None):
+    """semantic_search that awaits Qdrant instead of blocking the event loop"""
+    qv = await ctx.vector_async() if ctx is not None else await embed_query_async(q)
+    cl = await async_client()
+    hits = await cl.search(
+        collection_name=QDRANT_COLLECTION,
+        query_vector=qv,
+        query_filter=_search_filter(space_id, doc_types, doc_ids),
+        limit=top_k,
+        search_params=search_params(),
+    )
+    return _to_results(hits)
+
+def _sparse_query(q: str) -> SparseVector:
+    indices, values = encode_query(q)
+    return SparseVector(indices=indices, values=values)
+
+def _hybrid_request(q: str, qv: List[float], space_id: Optional[str], doc_types: Optional[List[str]],
+                    top_k: int, doc_ids: Optional[List[str]] = None) -> Dict:
+    """
+    Query API request: dense and sparse prefetch fused server-side with RRF.
+    Each prefetch takes top_k * 2 candidates so fusion has overlap to work with.
+    """
+    flt = _search_filter(space_id, doc_types, doc_ids)
+    prefetch_limit = top_k * 2
+    return {
+        "collection_name": QDRANT_COLLECTION,
+        "prefetch": [
+            Prefetch(query=qv, filter=flt, limit=prefetch_limit, params=search_params()),
+            Prefetch(query=_sparse_query(q), using=config.SPARSE_VECTOR_NAME, filter=flt, limit=prefetch_limit),
+        ],
+        "query": FusionQuery(fusion=Fusion.RRF),
+        "query_filter": flt,
+        "limit": top_k,
+        "with_payload": True,
+    }
+
+def sparse_search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+                  doc_ids: Optional[List[str]] = None):
+    """BM25 keyword search over the sparse vector (KEYWORD_ENGINE=qdrant_sparse)"""
+    sparse = _sparse_query(q)
+    if not sparse.indices:
+        return []
+    res = client().query_points(
+        collection_name=QDRANT_COLLECTION,
+        query=sparse,
+        using=config.SPARSE_VECTOR_NAME,
+        query_filter=_search_filter(space_id, doc_types, doc_ids),
+        limit=top_k,
+        with_payload=True,
+    )
+    return _to_results(res.points)
+
+def hybrid_search(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+                  ctx: Optional[QueryContext] = None, doc_ids: Optional[List[str]] = None):
+    """Dense + BM25 sparse search fused by Qdrant (RRF) in a single round trip"""
+    qv = ctx.vector if ctx is not None else embed_query(q)
+    res = client().query_points(**_hybrid_request(q, qv, space_id, doc_types, top_k, doc_ids))
+    return _to_results(res.points)
+
+async def hybrid_search_async(q: str, space_id: Optional[str], doc_types: Optional[List[str]], top_k: int = 8,
+                              ctx: Optional[QueryContext] = None, doc_ids: Optional[List[str]] = None):
+    qv = await ctx.vector_async() if ctx is not None else await embed_query_async(q)
+    cl = await async_client()
+    res = await cl.query_points(**_hybrid_request(q, qv, space_id, doc_types, top_k, doc_ids))
+    return _to_results(res.points)
+
+def _document_filter(doc_id: str, space_id: str, start: int = 0, end: Optional[int] = None) -> Filter:
+    return Filter(must=[
+        FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
+        FieldCondition(key="space_id", match=MatchValue(value=space_id)),
+        FieldCondition(key="chunk_index", range=Range(gte=start, lt=end)),
+    ])
+
+def _document_page_request(doc_id: str, space_id: str, start: int, end: Optional[int], page_size: int) -> Dict:
+    # Keyset pagination on chunk_index: order_by scrolls don't return a next-page offset
+    return {
+        "collection_name": QDRANT_COLLECTION,
+        "scroll_filter": _document_filter(doc_id, space_id, start, end),
+        "order_by": OrderBy(key="chunk_index", direction=Direction.ASC),
+        "limit": page_size,
+        "with_payload": True,
+        "with_vectors": False,
+    }
+
+def iter_document_chunks(doc_id: str, space_id: str, start: int = 0, end: Optional[int] = None,
+                         page_size: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """(chunk_index, text) of a document in chunk order, one page in memory at a time"""
+    page_size = max(page_size or config.CHUNK_SCROLL_PAGE_SIZE, 1)
+    while True:
+        points, _ = client().scroll(**_document_page_request(doc_id, space_id, start, end, page_size))
+        for p, text in zip(points, point_texts(points)):
+            yield int(p.payload.get("chunk_index", 0)), text
+        if len(points) < page_size:
+            return
+        start = int(points[-1].payload.get("chunk_index", 0)) + 1
+
+async def iter_document_chunks_async(doc_id: str, space_id: str, start: int = 0, end: Optional[int] = None,
+                                     page_size: Optional[int] = None) -> AsyncIterator[Tuple[int, str]]:
+    page_size = max(page_size or config.CHUNK_SCROLL_PAGE_SIZE, 1)
+    cl = await async_client()
+    while True:
+        points, _ = await cl.scroll(**_document_page_request(doc_id, space_id, start, end, page_size))
+        for p, text in zip(points, point_texts(points)):
+            yield int(p.payload.get("chunk_index", 0)), text
+        if len(points) < page_size:
+            return
+        start = int(points[-1].payload.get("chunk_index", 0)) + 1
+
+def count_document_chunks(doc_id: str, space_id: str) -> int:
+    return client().count(QDRANT_COLLECTION, count_filter=_document_filter(doc_id, space_id), exact=True).count
+
+async def count_document_chunks_async(doc_id: str, space_id: str) -> int:
+    cl = await async_client()
+    res = await cl.count(QDRANT_COLLECTION, count_filter=_document_filter(doc_id, space_id), exact=True)
+    return res.count
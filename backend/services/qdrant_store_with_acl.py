@@ -3,7 +3,6 @@ Enhanced Qdrant Store with Access Control Integration
 Example implementation showing how to integrate access control
 """
 
-import uuid
 from typing import List, Optional, Dict
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
@@ -18,73 +17,44 @@ from qdrant_client.models import (
     SearchParams,
 )
 from . import config
-from .config import QDRANT_URL, QDRANT_COLLECTION
-from .embeddings import embed, dim
+from .config import QDRANT_COLLECTION
+from .embeddings import embed, embed_query, dim
+from .query_context import QueryContext
+from .qdrant_store import chunk_point_id, delete_stale_points, quantization_config, search_params
+from .chunk_store import save_chunks
+from .payload_indexes import ensure_payload_indexes, required_indexes
+from .qdrant_pool import ensure_once, get_sync_client
 from .access_control import AccessContext, AccessControlService, augment_payload_with_access_control
 
-_client: Optional[QdrantClient] = None
-
-
 def client() -> QdrantClient:
-    global _client
-    if _client is None:
-        _client = QdrantClient(url=QDRANT_URL)
-        ensure_collection()
-    return _client
+    ensure_collection()
+    return get_sync_client()
 
 
 def ensure_collection():
     """Create collection with proper indexing for access control fields"""
-    c = QdrantClient(url=QDRANT_URL)
+    ensure_once(f"{QDRANT_COLLECTION}:acl", _bootstrap_collection)
+
+
+def _bootstrap_collection():
+    c = get_sync_client()
     try:
         c.get_collection(QDRANT_COLLECTION)
     except Exception:
+        quant = quantization_config()
         c.recreate_collection(
             collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(size=dim(), distance=Distance.COSINE),
+            vectors_config=VectorParams(size=dim(), distance=Distance.COSINE, on_disk=quant is not None),
             hnsw_config=HnswConfigDiff(
                 m=config.QDRANT_HNSW_M, 
                 ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT
             ),
+            quantization_config=quant,
         )
-        
-        # Create payload indexes for efficient filtering
-        # These indexes dramatically speed up filtered searches
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="space_id",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="channel_id",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="owner_id",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="visibility",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="doc_type",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="department",
-            field_schema="keyword"
-        )
-        c.create_payload_index(
-            collection_name=QDRANT_COLLECTION,
-            field_name="security_level",
-            field_schema="integer"
-        )
+    
+    # Payload indexes for efficient filtering (also fills in missing ones
+    # on collections created before the ACL fields were introduced)
+    ensure_payload_indexes(c, QDRANT_COLLECTION, required_indexes(QDRANT_COLLECTION, with_acl=True))
 
 
 def upsert_chunks_with_acl(
@@ -106,6 +76,8 @@ def upsert_chunks_with_acl(
         access_metadata: Access control metadata from augment_payload_with_access_control
         channel_id: Optional channel ID for channel-scoped documents
     """
+    if config.LEAN_PAYLOADS:
+        save_chunks(space_id, doc_id, chunks)
     points = []
     for idx, text in enumerate(chunks):
         vec = embed(text)
@@ -115,20 +87,23 @@ def upsert_chunks_with_acl(
             "channel_id": channel_id or "",
             "doc_type": doc_type,
             "chunk_index": idx,
-            "text": text,
             **access_metadata  # Add access control fields
         }
-        points.append(PointStruct(id=str(uuid.uuid4()), vector=vec, payload=payload))
+        if not config.LEAN_PAYLOADS:
+            payload["text"] = text
+        points.append(PointStruct(id=chunk_point_id(space_id, doc_id, idx), vector=vec, payload=payload))
     
     if points:
         client().upsert(collection_name=QDRANT_COLLECTION, points=points)
+    delete_stale_points(client(), doc_id, space_id, [p.id for p in points])
 
 
 def semantic_search_with_acl(
     q: str,
     access_context: AccessContext,
     doc_types: Optional[List[str]] = None,
-    top_k: int = 8
+    top_k: int = 8,
+    ctx: Optional[QueryContext] = None,
 ) -> List[Dict]:
     """
     Semantic search with access control
@@ -138,11 +113,12 @@ def semantic_search_with_acl(
         access_context: Access context (user or agent)
         doc_types: Optional document type filter
         top_k: Number of results
+        ctx: Request query context (reuses its query vector)
         
     Returns:
         List of search results accessible by the context
     """
-    qv = embed(q)
+    qv = ctx.vector if ctx is not None else embed_query(q)
     
     # Build filter using access control service
     acl_service = AccessControlService()
@@ -153,7 +129,7 @@ def semantic_search_with_acl(
         query_vector=qv,
         query_filter=flt,
         limit=top_k,
-        search_params=SearchParams(hnsw_ef=config.QDRANT_HNSW_EF_SEARCH),
+        search_params=search_params(),
     )
     
     # Double-check access at result level (defense in depth)
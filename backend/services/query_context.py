@@ -0,0 +1,74 @@
+"""
+Request-Scoped Query Context
+One object per /search or /ask request that carries the query and everything
+derived from it: the query vector, the keyword set used by snippet compression
+and the rerank cascade, the normalized doc types, the rerank cache hash, and
+per-request memos of compressed snippets and candidate vectors. Each artifact
+is computed on first use and then shared by qdrant_store, rerank, MMR and the
+prompt builder instead of being recomputed at every stage.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .context import _extract_keywords, compress_text
+from .embeddings import embed_batch, embed_query, embed_query_async
+
+
+@dataclass
+class QueryContext:
+    text: str
+    space_id: Optional[str] = None
+    doc_types: Optional[List[str]] = None
+
+    _vector: Optional[List[float]] = field(default=None, init=False, repr=False)
+    _keywords: Optional[set] = field(default=None, init=False, repr=False)
+    _snippets: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    _text_vectors: Dict[str, List[float]] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def normalized(self) -> str:
+        return " ".join(self.text.lower().split())
+
+    @property
+    def query_hash(self) -> str:
+        return hashlib.sha1(self.normalized.encode("utf-8")).hexdigest()
+
+    @property
+    def keywords(self) -> set:
+        if self._keywords is None:
+            self._keywords = _extract_keywords(self.text)
+        return self._keywords
+
+    @property
+    def vector(self) -> List[float]:
+        """Query embedding, computed once (through the micro-batcher when enabled)"""
+        if self._vector is None:
+            with self._lock:
+                if self._vector is None:
+                    self._vector = embed_query(self.text)
+        return self._vector
+
+    async def vector_async(self) -> List[float]:
+        if self._vector is None:
+            self._vector = await embed_query_async(self.text)
+        return self._vector
+
+    def compress(self, text: str) -> str:
+        """compress_text for this query, memoized per candidate text"""
+        snippet = self._snippets.get(text)
+        if snippet is None:
+            snippet = compress_text(text, self.text, keywords=self.keywords)
+            self._snippets[text] = snippet
+        return snippet
+
+    def text_vectors(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings of candidate texts; the missing ones are encoded in one batch"""
+        missing = [t for t in dict.fromkeys(texts) if t and t not in self._text_vectors]
+        if missing:
+            for text, vec in zip(missing, embed_batch(missing)):
+                self._text_vectors[text] = vec
+        return [self._text_vectors.get(t, []) if t else [] for t in texts]
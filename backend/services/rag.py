@@ -14,8 +14,10 @@ from .config import (
     LLM_TIMEOUT,
     OLLAMA_NUM_CTX,
 )
-from .context import compress_text
+from .query_context import QueryContext
 from .llm_config import get_current_model_config
+from .llm_gateway import PRIORITY_NAMES, LLMOverloaded, current_priority, get_llm_gateway
+from .llm_router import get_llm_router
 
 
 def calculate_dynamic_max_tokens(prompt: str, context_window: int, safety_margin: int = 500, verbose: bool = True) -> int:
@@ -59,12 +61,13 @@ def calculate_dynamic_max_tokens(prompt: str, context_window: int, safety_margin
     
     return final_result
 
-def build_prompt(context_items: List[Dict], question: str) -> str:
+def build_prompt(context_items: List[Dict], question: str, ctx: Optional[QueryContext] = None) -> str:
+    ctx = ctx or QueryContext(question)
     ctx_lines = []
     for i, it in enumerate(context_items, 1):
         pl = it["payload"]
         raw_text = pl.get("text") or ""
-        text = compress_text(raw_text, question)[:CONTEXT_SNIPPET_MAX_CHARS]
+        text = ctx.compress(raw_text)[:CONTEXT_SNIPPET_MAX_CHARS]
         ctx_lines.append(
             f"[{i}] doc_id={pl.get('doc_id')} chunk={pl.get('chunk_index')} type={pl.get('doc_type')}\n\"{text}\""
         )
@@ -77,7 +80,59 @@ def build_prompt(context_items: List[Dict], question: str) -> str:
         "Ответь кратко и по делу. Если перечисляешь дедлайны — укажи дату и источник (doc_id/chunk)."
     )
 
+def _ollama_generate(base_url: str, prompt: str, num_predict: int) -> str:
+    r = requests.post(
+        f"{base_url}/api/generate",
+        json={
+            "model": LLM_MODEL,
+            "prompt": prompt,
+            "stream": LLM_STREAM_ENABLED,
+            "options": {"num_predict": num_predict},
+        },
+        timeout=LLM_TIMEOUT,
+        stream=LLM_STREAM_ENABLED,
+    )
+    r.raise_for_status()
+    
+    if not LLM_STREAM_ENABLED:
+        return r.json().get("response", "")
+    parts = []
+    buffer = ""
+    for raw_line in r.iter_lines(decode_unicode=True):
+        if raw_line is None:
+            continue
+        line = buffer + raw_line
+        buffer = ""
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            buffer = line
+            continue
+        chunk = data.get("response")
+        if chunk:
+            parts.append(chunk)
+        if data.get("done"):
+            break
+    return "".join(parts).strip()
+
+
 def call_llm(prompt: str, max_tokens: Optional[int] = None) -> str:
+    gateway = get_llm_gateway()
+    if gateway is None or LLM_MODE not in ("ollama", "vllm"):
+        return _call_backend(prompt, max_tokens)
+    # Слот у шлюза по приоритету вызывающего контекста (см. llm_gateway.llm_priority)
+    priority = current_priority()
+    try:
+        with gateway.slot(priority):
+            return _call_backend(prompt, max_tokens)
+    except LLMOverloaded as e:
+        print(f"[LLMGateway] Rejected {PRIORITY_NAMES[priority]} request: {e}")
+        return f"[LLM ошибка: перегрузка — {e}]"
+
+
+def _call_backend(prompt: str, max_tokens: Optional[int] = None) -> str:
     request_start = datetime.now()
     start_time = time.time()
     prompt_tokens = len(prompt.split())
@@ -105,46 +160,14 @@ def call_llm(prompt: str, max_tokens: Optional[int] = None) -> str:
         print(f"  ⏰ LLM send time: {llm_send_time.strftime('%H:%M:%S.%f')[:-3]}")
         
         try:
-            r = requests.post(
-                "http://ollama:11434/api/generate",
-                json={
-                    "model": LLM_MODEL,
-                    "prompt": prompt,
-                    "stream": LLM_STREAM_ENABLED,
-                    "options": {"num_predict": num_predict},
-                },
-                timeout=LLM_TIMEOUT,
-                stream=LLM_STREAM_ENABLED,
+            # Реплика из пула эндпоинтов (балансировка, failover на другую реплику)
+            response_text = get_llm_router().call(
+                lambda endpoint: _ollama_generate(endpoint.url, prompt, num_predict)
             )
-            r.raise_for_status()
             
             llm_receive_time = datetime.now()
             elapsed_time = time.time() - start_time
             
-            if LLM_STREAM_ENABLED:
-                parts = []
-                buffer = ""
-                for raw_line in r.iter_lines(decode_unicode=True):
-                    if raw_line is None:
-                        continue
-                    line = buffer + raw_line
-                    buffer = ""
-                    if not line:
-                        continue
-                    try:
-                        data = json.loads(line)
-                    except json.JSONDecodeError:
-                        buffer = line
-                        continue
-                    chunk = data.get("response")
-                    if chunk:
-                        parts.append(chunk)
-                    if data.get("done"):
-                        break
-                response_text = "".join(parts).strip()
-            else:
-                response_text = r.json().get("response", "")
-            
             response_tokens = len(response_text.split())
             response_chars = len(response_text)
             
@@ -174,7 +197,7 @@ def call_llm(prompt: str, max_tokens: Optional[int] = None) -> str:
     elif LLM_MODE == "vllm":
         # Import vLLM support
         try:
-            from .rag_vllm import call_vllm
+            from .rag_vllm import vllm_chat_completion
             kwargs = {}
             if max_tokens is not None:
                 kwargs["max_tokens"] = max_tokens
@@ -187,7 +210,9 @@ def call_llm(prompt: str, max_tokens: Optional[int] = None) -> str:
                 print(f"  - Max output tokens: {max_tokens}")
             print(f"  ⏰ Request time: {request_start.strftime('%H:%M:%S.%f')[:-3]}")
             
-            response_text = call_vllm(prompt, **kwargs)
+            response_text = get_llm_router().call(
+                lambda endpoint: vllm_chat_completion(prompt, base_url=endpoint.url, **kwargs)
+            )
             
             elapsed_time = time.time() - start_time
             response_tokens = len(response_text.split())
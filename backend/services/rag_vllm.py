@@ -13,12 +13,13 @@ VLLM_URL = os.getenv("LLM_VLLM_URL", "http://vllm:8001/v1")
 VLLM_API_KEY = os.getenv("VLLM_API_KEY", "dummy")  # vLLM doesn't require real key
 
 
-def call_vllm(prompt: str, model: Optional[str] = None, **kwargs) -> str:
+def vllm_chat_completion(prompt: str, base_url: Optional[str] = None, model: Optional[str] = None, **kwargs) -> str:
     """
-    Call vLLM using OpenAI-compatible API
+    One chat completion against a vLLM endpoint; raises on transport/HTTP errors
     
     Args:
         prompt: The prompt to send to the model
+        base_url: OpenAI-compatible base URL (default: VLLM_URL)
         model: Model name (optional, uses LLM_MODEL from config)
         **kwargs: Additional parameters (temperature, max_tokens, etc.)
     
@@ -28,7 +29,7 @@ def call_vllm(prompt: str, model: Optional[str] = None, **kwargs) -> str:
     model = model or config.LLM_MODEL
     
     # vLLM OpenAI-compatible endpoint
-    url = f"{VLLM_URL}/chat/completions"
+    url = f"{base_url or VLLM_URL}/chat/completions"
     
     headers = {
         "Content-Type": "application/json",
@@ -57,25 +58,39 @@ def call_vllm(prompt: str, model: Optional[str] = None, **kwargs) -> str:
     if "presence_penalty" in kwargs:
         payload["presence_penalty"] = kwargs["presence_penalty"]
     
-    try:
-        response = requests.post(
-            url,
-            json=payload,
-            headers=headers,
-            timeout=config.LLM_TIMEOUT
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Extract answer from OpenAI-compatible response
-        if "choices" in result and len(result["choices"]) > 0:
-            message = result["choices"][0].get("message", {})
-            content = message.get("content", "")
-            return content.strip()
-        
-        return "[vLLM error: unexpected response format]"
+    response = requests.post(
+        url,
+        json=payload,
+        headers=headers,
+        timeout=config.LLM_TIMEOUT
+    )
+    response.raise_for_status()
+    
+    result = response.json()
+    
+    # Extract answer from OpenAI-compatible response
+    if "choices" in result and len(result["choices"]) > 0:
+        message = result["choices"][0].get("message", {})
+        content = message.get("content", "")
+        return content.strip()
     
+    return "[vLLM error: unexpected response format]"
+
+
+def call_vllm(prompt: str, model: Optional[str] = None, **kwargs) -> str:
+    """
+    Call vLLM using OpenAI-compatible API (errors are returned as text)
+    
+    Args:
+        prompt: The prompt to send to the model
+        model: Model name (optional, uses LLM_MODEL from config)
+        **kwargs: Additional parameters (temperature, max_tokens, etc.)
+    
+    Returns:
+        Generated text response
+    """
+    try:
+        return vllm_chat_completion(prompt, model=model, **kwargs)
     except requests.exceptions.Timeout:
         return f"[vLLM error: timeout after {config.LLM_TIMEOUT}s]"
     except requests.exceptions.RequestException as e:
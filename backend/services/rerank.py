@@ -1,48 +1,160 @@
-from typing import Dict, List
+import hashlib
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
 
 from . import config
-from .context import compress_text
+from .cache import TTLCache
+from .query_context import QueryContext
 
 _model = None
 
+# (query-hash, text-hash) -> cross-encoder score
+_score_cache = TTLCache(config.RERANK_CACHE_MAX_ITEMS, config.RERANK_CACHE_TTL_SECONDS)
+
+_stats_lock = Lock()
+_stats = {"requests": 0, "pairs_scored": 0, "cache_hits": 0, "cascade_skipped": 0}
+
+
+def load_local_reranker():
+    if config.INFERENCE_BACKEND == "onnx":
+        from .onnx_backend import OnnxCrossEncoder
+
+        return OnnxCrossEncoder(config.RERANK_MODEL)
+    from sentence_transformers import CrossEncoder
+
+    device = None  # auto
+    return CrossEncoder(config.RERANK_MODEL, device=device)
+
 
 def _get_reranker():
     global _model
     if _model is None:
-        from sentence_transformers import CrossEncoder
+        from .model_server import RemoteCrossEncoder, get_client, remote_enabled
 
-        device = None  # auto
-        _model = CrossEncoder(config.RERANK_MODEL, device=device)
+        _model = RemoteCrossEncoder(get_client()) if remote_enabled() else load_local_reranker()
     return _model
 
 
+def _length_batches(texts: List[str]) -> List[List[int]]:
+    """
+    Group text indices (shortest first) so that batch_size * longest text stays
+    within RERANK_BATCH_TOKEN_BUDGET: short snippets run in large batches, long
+    ones in small batches, with little padding inside each batch.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    budget = max(config.RERANK_BATCH_TOKEN_BUDGET, 1)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        # ~4 chars per token is close enough for sizing
+        tokens = max(len(texts[i]) // 4, 1)
+        if current and (
+            len(current) >= config.RERANK_BATCH_SIZE or (len(current) + 1) * tokens > budget
+        ):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
 def _predict_scores(query: str, texts: List[str]) -> List[float]:
     if not texts:
         return []
     model = _get_reranker()
-    pairs = [(query, text) for text in texts]
-    return model.predict(pairs, batch_size=config.RERANK_BATCH_SIZE).tolist()
+    scores: List[float] = [0.0] * len(texts)
+    for batch in _length_batches(texts):
+        pairs = [(query, texts[i]) for i in batch]
+        for i, score in zip(batch, model.predict(pairs, batch_size=len(pairs)).tolist()):
+            scores[i] = score
+    return scores
 
 
 _predict_scores_original = _predict_scores
 
 
-def apply_rerank(query: str, candidates: List[Dict]) -> List[Dict]:
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def _cached_scores(ctx: QueryContext, texts: List[str]) -> List[float]:
+    """Cross-encoder scores, reusing cached (query, text) pairs and scoring only the misses"""
+    query = ctx.text
+    if not config.RERANK_CACHE_ENABLED:
+        return _predict_scores(query, texts)
+    keys = [(ctx.query_hash, _hash(text)) for text in texts]
+    scores: List[Optional[float]] = [_score_cache.get(key) for key in keys]
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        fresh = _predict_scores(query, [texts[i] for i in missing])
+        for i, score in zip(missing, fresh):
+            scores[i] = score
+            _score_cache.set(keys[i], score)
+    with _stats_lock:
+        _stats["cache_hits"] += len(texts) - len(missing)
+        _stats["pairs_scored"] += len(missing)
+    return scores
+
+
+def _lexical_overlap(keywords: set, text: str) -> float:
+    if not keywords:
+        return 0.0
+    lowered = text.lower()
+    return sum(1 for kw in keywords if kw in lowered) / len(keywords)
+
+
+def _cascade(keywords: set, subset: List[Dict], texts: List[str]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Cheap first stage: split candidate positions into confidently relevant,
+    ambiguous (sent to the cross-encoder) and confidently irrelevant.
+
+    Relevant: covers at least RERANK_CASCADE_HIGH of the query keywords.
+    Irrelevant: keyword overlap at most RERANK_CASCADE_LOW and ranked below the
+    first RERANK_CASCADE_PROTECT_TOP fused results (top semantic matches may
+    share no words with the query).
+    """
+    if not config.RERANK_CASCADE_ENABLED or not keywords:
+        return [], list(range(len(subset))), []
+    high, ambiguous, low = [], [], []
+    for pos, text in enumerate(texts):
+        overlap = _lexical_overlap(keywords, text)
+        if overlap >= config.RERANK_CASCADE_HIGH:
+            high.append(pos)
+        elif overlap <= config.RERANK_CASCADE_LOW and pos >= config.RERANK_CASCADE_PROTECT_TOP:
+            low.append(pos)
+        else:
+            ambiguous.append(pos)
+    return high, ambiguous, low
+
+
+def apply_rerank(query: str, candidates: List[Dict], ctx: Optional[QueryContext] = None) -> List[Dict]:
     if not config.RERANK_ENABLED:
         return candidates
+    ctx = ctx or QueryContext(query)
     valid = [c for c in candidates if (c.get("payload") or {}).get("text")]
     if not valid:
         return candidates
     top_n = min(len(valid), config.RERANK_MAX_CANDIDATES)
     subset = valid[:top_n]
-    texts = [compress_text(c["payload"]["text"], query) for c in subset]
+    texts = [ctx.compress(c["payload"]["text"]) for c in subset]
+    high, ambiguous, low = _cascade(ctx.keywords, subset, texts)
     try:
-        scores = _predict_scores(query, texts)
+        scores = _cached_scores(ctx, [texts[i] for i in ambiguous])
     except Exception:
         return candidates
-    scored = list(zip(subset, scores))
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["cascade_skipped"] += len(high) + len(low)
+    scored = list(zip([subset[i] for i in ambiguous], scores))
     scored.sort(key=lambda item: item[1], reverse=True)
-    ordered = [item[0] for item in scored]
+    # Confident matches keep their fused order ahead of the cross-encoder ranking
+    ordered = [subset[i] for i in high] + [item[0] for item in scored] + [subset[i] for i in low]
     seen_keys = {item.get("key") for item in ordered}
     ordered.extend([c for c in candidates if c.get("key") not in seen_keys])
     return ordered
+
+
+def stats() -> Dict:
+    with _stats_lock:
+        return dict(_stats)
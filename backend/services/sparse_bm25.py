@@ -0,0 +1,82 @@
+"""
+Sparse BM25 Encoder
+Local RU/EN tokenizer and BM25 term weighting for Qdrant sparse vectors.
+
+Documents get the BM25 term-frequency part (saturation + length normalization);
+IDF is applied by Qdrant itself (sparse vector modifier=idf), so corpus
+statistics stay correct without a local vocabulary or re-indexing.
+Terms are mapped to sparse indices by a stable hash (crc32).
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from . import config
+
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    # English
+    "a an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were will with what which who how when where why not no do does "
+    # Russian
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по "
+    "только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если "
+    "уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей "
+    "может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз "
+    "тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом "
+    "один почти мой тем чтобы нее были куда зачем всех никогда можно при наконец два об "
+    "другой хоть после над больше тот через эти нас про всего них какая много разве три "
+    "эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более "
+    "всегда конечно всю между это".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords (ё folded to е)"""
+    tokens = []
+    for tok in _TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+        if tok in STOPWORDS:
+            continue
+        if len(tok) < 2 and not tok.isdigit():
+            continue
+        tokens.append(tok)
+    return tokens
+
+
+def term_index(term: str) -> int:
+    """Stable sparse index for a term (unsigned 32-bit)"""
+    return zlib.crc32(term.encode("utf-8")) & 0xFFFFFFFF
+
+
+def _to_sparse(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+    indices = sorted(weights)
+    return indices, [weights[i] for i in indices]
+
+
+def encode_document(text: str) -> Tuple[List[int], List[float]]:
+    """
+    BM25 document-side weights: tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+
+    Returns: (indices, values) for a Qdrant SparseVector
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    k1 = config.SPARSE_BM25_K1
+    b = config.SPARSE_BM25_B
+    norm = k1 * (1 - b + b * len(tokens) / max(config.SPARSE_BM25_AVG_LEN, 1.0))
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(tokens).items():
+        idx = term_index(term)
+        # crc32 collisions are rare; merge them instead of dropping a term
+        weights[idx] = weights.get(idx, 0.0) + tf * (k1 + 1) / (tf + norm)
+    return _to_sparse(weights)
+
+
+def encode_query(text: str) -> Tuple[List[int], List[float]]:
+    """Query-side vector: each distinct term once with weight 1 (IDF comes from Qdrant)"""
+    return _to_sparse({term_index(term): 1.0 for term in set(tokenize(text))})
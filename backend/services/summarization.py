@@ -4,13 +4,17 @@ Provides map-reduce summarization for large documents that exceed context limits
 """
 
 import asyncio
+import hashlib
 import time
-from typing import List, Dict, Optional, AsyncGenerator
+import weakref
+from typing import List, Dict, Optional, AsyncGenerator, AsyncIterable, AsyncIterator, Tuple, Union
 from .rag import call_llm, calculate_dynamic_max_tokens
 from .chunking import split_markdown
 from . import config
 from .llm_config import get_current_model_config
 from .language_detection import detect_language, get_language_instruction, get_language_name
+from .cache import TTLCache
+from .summary_cache import ContentHash, document_key, get_summary_cache, partial_key
 
 
 def count_tokens_simple(text: str) -> int:
@@ -18,6 +22,125 @@ def count_tokens_simple(text: str) -> int:
     return len(text.split())
 
 
+# One semaphore per event loop (sync wrappers run their own loops via asyncio.run)
+_map_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def map_concurrency() -> int:
+    """Map-phase LLM calls allowed in flight for the current backend"""
+    if config.LLM_MODE == "vllm":
+        return max(1, config.SUMMARY_MAP_CONCURRENCY_VLLM)
+    return max(1, config.SUMMARY_MAP_CONCURRENCY_OLLAMA)
+
+
+def _map_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _map_semaphores.get(loop)
+    if sem is None:
+        sem = asyncio.Semaphore(map_concurrency())
+        _map_semaphores[loop] = sem
+    return sem
+
+
+# Error strings returned instead of a summary (rag.call_llm for Ollama / vLLM,
+# rag_vllm, and this module); they must never be cached or stored
+_FAILURE_PREFIXES = ("[LLM", "[vLLM", "[Error", "[Summarization failed")
+
+
+def _is_failed(summary: str) -> bool:
+    return summary.startswith(_FAILURE_PREFIXES)
+
+
+async def _aiter(items: Union[List[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if isinstance(items, list):
+        for item in items:
+            yield item
+    else:
+        async for item in items:
+            yield item
+
+
+async def map_summaries(
+    texts: Union[List[str], AsyncIterable[str]],
+    max_summary_tokens: int,
+    focus: Optional[str] = None
+) -> AsyncIterator[Tuple[int, str, float]]:
+    """
+    MAP phase: summarize texts concurrently (at most map_concurrency() LLM calls
+    in flight across all documents summarized on the current event loop: the
+    app's loop, or one per summary job worker; the LLM gateway caps the process).
+
+    `texts` may be an async iterator (e.g. windows read from Qdrant page by page);
+    it is consumed only as fast as calls complete, so at most map_concurrency()
+    windows are held in memory. Yields (index, summary, seconds) in completion
+    order, not input order.
+    """
+    cache = get_summary_cache()
+
+    async def run(index: int, text: str) -> Tuple[int, str, float]:
+        key = partial_key(text, max_summary_tokens, focus) if cache is not None else None
+        cached = await asyncio.to_thread(cache.get, key) if key is not None else None
+        if cached is not None:
+            return index, cached, 0.0
+        async with _map_semaphore():
+            started = time.time()
+            summary = await summarize_text(text, max_summary_tokens=max_summary_tokens, focus=focus)
+        if key is not None and not _is_failed(summary):
+            await asyncio.to_thread(cache.put, key, "partial", summary)
+        return index, summary, time.time() - started
+
+    limit = map_concurrency()
+    pending = set()
+
+    async def completed():
+        nonlocal pending
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        return sorted((task.result() for task in done), key=lambda item: item[0])
+
+    try:
+        index = 0
+        async for text in _aiter(texts):
+            while len(pending) >= limit:
+                for item in await completed():
+                    yield item
+            pending.add(asyncio.ensure_future(run(index, text)))
+            index += 1
+        while pending:
+            for item in await completed():
+                yield item
+    finally:
+        # Client disconnected or a chunk failed: don't leave calls queued
+        for task in pending:
+            task.cancel()
+
+
+def _map_focus(focus: Optional[str], whole_document: bool) -> Optional[str]:
+    """
+    With the summary cache, MAP partials of whole documents are unfocused (shared
+    by every focus) and the focus goes to REDUCE. Query-time chunk sets are
+    rarely seen twice, so their MAP keeps the focus.
+    """
+    return None if whole_document and get_summary_cache() is not None else focus
+
+
+async def pack_windows(
+    chunks: AsyncIterable[Tuple[int, str]],
+    window_tokens: int
+) -> AsyncIterator[str]:
+    """Consecutive document chunks joined into MAP windows of about window_tokens words"""
+    parts: List[str] = []
+    tokens = 0
+    async for _, text in chunks:
+        text_tokens = count_tokens_simple(text)
+        if parts and tokens + text_tokens > window_tokens:
+            yield "\n\n".join(parts)
+            parts, tokens = [], 0
+        parts.append(text)
+        tokens += text_tokens
+    if parts:
+        yield "\n\n".join(parts)
+
+
 def split_text_by_tokens(text: str, max_tokens: int = 8000, overlap: int = 500) -> List[str]:
     """
     Split text into chunks by token count
@@ -68,10 +191,11 @@ SUMMARY (in {lang_name}):"""
     actual_max = min(max_summary_tokens, dynamic_max)
     print(f"[FINAL MAX_TOKENS DECISION] Requested: {max_summary_tokens}, Available: {dynamic_max}, Using: {actual_max}")
     
-    summary = call_llm(prompt, max_tokens=actual_max)
+    # call_llm is blocking; run it in a worker thread so map chunks overlap
+    summary = await asyncio.to_thread(call_llm, prompt, max_tokens=actual_max)
     
     # Remove common LLM artifacts
-    if summary.startswith("[LLM"):
+    if _is_failed(summary):
         return summary  # Error message, return as-is
     
     return summary.strip()
@@ -81,7 +205,8 @@ async def summarize_long_text(
     text: str,
     chunk_size: int = 8000,
     chunk_overlap: int = 500,
-    focus: Optional[str] = None
+    focus: Optional[str] = None,
+    whole_document: bool = False
 ) -> str:
     """
     Map-Reduce summarization for long texts
@@ -91,6 +216,7 @@ async def summarize_long_text(
         chunk_size: Size of chunks for MAP phase
         chunk_overlap: Overlap between chunks
         focus: Optional focus area
+        whole_document: Text is a stored document (MAP partials may be shared across focuses)
         
     Returns:
         Final summary
@@ -106,19 +232,27 @@ async def summarize_long_text(
     # MAP PHASE: Split and summarize each chunk
     chunks = split_text_by_tokens(text, max_tokens=chunk_size, overlap=chunk_overlap)
     print(f"[Summarization] Split into {len(chunks)} chunks")
-    
-    summaries = []
-    for i, chunk in enumerate(chunks, 1):
-        print(f"[Summarization] Processing chunk {i}/{len(chunks)}...")
-        
-        summary = await summarize_text(
-            chunk,
-            max_summary_tokens=300,  # Each chunk → ~300 words
-            focus=focus
-        )
-        
-        if not summary.startswith("[LLM"):
-            summaries.append(f"Part {i}: {summary}")
+    return await _map_reduce(chunks, chunk_size=chunk_size, focus=focus, whole_document=whole_document)
+
+
+async def _map_reduce(
+    windows: Union[List[str], AsyncIterable[str]],
+    chunk_size: int,
+    focus: Optional[str] = None,
+    whole_document: bool = False
+) -> str:
+    """MAP over windows (list or async stream), then REDUCE the partial summaries"""
+    print(f"[Summarization] MAP phase: {map_concurrency()} chunks in flight")
+    map_focus = _map_focus(focus, whole_document)
+    by_index: Dict[int, str] = {}
+    done = 0
+    # Each chunk → ~300 words
+    async for index, summary, seconds in map_summaries(windows, max_summary_tokens=300, focus=map_focus):
+        done += 1
+        print(f"[Summarization] Chunk {index + 1} done ({done} completed) in {seconds:.1f}s")
+        if not _is_failed(summary):
+            by_index[index] = summary
+    summaries = [f"Part {i + 1}: {by_index[i]}" for i in sorted(by_index)]
     
     if not summaries:
         return "[Summarization failed: no chunks could be processed]"
@@ -129,36 +263,133 @@ async def summarize_long_text(
     combined = "\n\n".join(summaries)
     combined_tokens = count_tokens_simple(combined)
     
-    # If combined summaries are short enough, return as-is
-    if combined_tokens < chunk_size:
+    # If combined summaries are short enough, return as-is (unless the focus
+    # still has to be applied because MAP ran unfocused)
+    if combined_tokens < chunk_size and not (focus and map_focus is None):
         print(f"[Summarization] REDUCE phase: Combined summary is {combined_tokens} tokens")
         return combined
     
+    if config.SUMMARY_REDUCE_MODE == "tree":
+        final_summary = await tree_reduce(summaries, max_output_tokens=2000, focus=focus)
+        print(f"[Summarization] Complete!")
+        return final_summary
+    
     # Otherwise, do a final summarization
     print(f"[Summarization] REDUCE phase: Combining {len(summaries)} summaries...")
+    final_summary = await _reduce_call(combined, max_output_tokens=2000, focus=focus)  # Limit reduce phase to 2000 tokens
+    print(f"[Summarization] Complete!")
     
+    return final_summary
+
+
+def _reduce_prompt(combined: str, focus: Optional[str] = None) -> str:
     detected_lang = detect_language(combined)
     lang_instruction = get_language_instruction(detected_lang)
     lang_name = get_language_name(detected_lang)
+    focus_instruction = f"\nFocus specifically on: {focus}" if focus else ""
     
-    final_prompt = f"""{lang_instruction}
+    return f"""{lang_instruction}
 Create a comprehensive summary from these partial summaries.
-Preserve all key facts, numbers, dates, and important details.
+Preserve all key facts, numbers, dates, and important details.{focus_instruction}
 Remember: USE THE SAME LANGUAGE ({lang_name}) as the partial summaries!
 
 PARTIAL SUMMARIES (Language: {lang_name}):
 {combined}
 
 FINAL SUMMARY (in {lang_name}):"""
-    
+
+
+async def _reduce_call(combined: str, max_output_tokens: int, focus: Optional[str] = None) -> str:
+    prompt = _reduce_prompt(combined, focus)
     model_config = get_current_model_config()
-    dynamic_max = calculate_dynamic_max_tokens(final_prompt, model_config.context_window, verbose=True)
-    actual_max = min(2000, dynamic_max)  # Limit reduce phase to 2000 tokens
-    
-    final_summary = call_llm(final_prompt, max_tokens=actual_max)
-    print(f"[Summarization] Complete!")
-    
-    return final_summary
+    dynamic_max = calculate_dynamic_max_tokens(prompt, model_config.context_window, verbose=True)
+    actual_max = min(max_output_tokens, dynamic_max)
+    return await asyncio.to_thread(call_llm, prompt, max_tokens=actual_max)
+
+
+# Reduce nodes by content hash: re-summarizing the same document (or a document
+# that shares sections with an earlier one) skips the unchanged subtrees
+_node_cache = TTLCache(config.SUMMARY_NODE_CACHE_MAX_ITEMS, config.SUMMARY_NODE_CACHE_TTL_SECONDS)
+_TREE_MAX_DEPTH = 8
+
+
+def reduce_batch_tokens() -> int:
+    """Input budget of one reduce node (words), explicit or a third of the model context"""
+    if config.SUMMARY_REDUCE_BATCH_TOKENS > 0:
+        return config.SUMMARY_REDUCE_BATCH_TOKENS
+    return max(1000, get_current_model_config().context_window // 3)
+
+
+def _group_by_tokens(parts: List[str], budget: int) -> List[List[str]]:
+    """Consecutive parts packed into groups of at most `budget` words (at least 2 parts when possible)"""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for part in parts:
+        tokens = count_tokens_simple(part)
+        if current and current_tokens + tokens > budget and len(current) >= 2:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _reduce_node(parts: List[str], max_output_tokens: int, focus: Optional[str] = None) -> str:
+    combined = "\n\n".join(parts)
+    key = hashlib.sha1(
+        f"{config.LLM_MODEL}|{max_output_tokens}|{focus or ''}|{combined}".encode("utf-8")
+    ).hexdigest()
+    cached = _node_cache.get(key)
+    if cached is not None:
+        return cached
+    summary = (await _reduce_call(combined, max_output_tokens, focus)).strip()
+    if not _is_failed(summary):
+        _node_cache.set(key, summary)
+    return summary
+
+
+async def tree_reduce(
+    parts: List[str],
+    max_output_tokens: int = 2000,
+    node_output_tokens: int = 800,
+    batch_tokens: Optional[int] = None,
+    focus: Optional[str] = None
+) -> str:
+    """
+    Recursive REDUCE: pack partial summaries into context-sized groups, reduce
+    every group of a level concurrently (same in-flight limit as the MAP phase),
+    and repeat on the results until one group is left for the final call.
+    Depth grows logarithmically with the number of parts; each node is cached
+    by content hash.
+    """
+    budget = batch_tokens or reduce_batch_tokens()
+    level = [p for p in parts if p]
+    if not level:
+        return ""
+    depth = 0
+    while True:
+        groups = _group_by_tokens(level, budget)
+        if len(groups) == 1 or depth >= _TREE_MAX_DEPTH:
+            print(f"[Summarization] Tree REDUCE: final node over {len(level)} parts (depth {depth})")
+            return await _reduce_node(level, max_output_tokens, focus)
+        depth += 1
+        print(f"[Summarization] Tree REDUCE level {depth}: {len(level)} parts -> {len(groups)} nodes")
+        
+        async def run(group: List[str]) -> str:
+            async with _map_semaphore():
+                return await _reduce_node(group, node_output_tokens, focus)
+        
+        reduced = await asyncio.gather(*(run(g) for g in groups))
+        # A failed node keeps its inputs for the next level instead of losing them
+        level = []
+        for group, summary in zip(groups, reduced):
+            if _is_failed(summary):
+                level.extend(group)
+            else:
+                level.append(f"Section {len(level) + 1}: {summary}")
 
 
 async def summarize_chunks(
@@ -221,38 +452,49 @@ async def summarize_document_by_id(
     Returns:
         Document summary
     """
-    from .qdrant_store import client
-    from qdrant_client.models import Filter, FieldCondition, MatchValue
-    
-    # Get all chunks of the document
-    results = client().scroll(
-        collection_name=config.QDRANT_COLLECTION,
-        scroll_filter=Filter(
-            must=[
-                FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
-                FieldCondition(key="space_id", match=MatchValue(value=space_id)),
-            ]
-        ),
-        limit=1000  # Max chunks per document
-    )
-    
-    if not results[0]:
+    from .qdrant_store import iter_document_chunks_async
+    
+    cache = get_summary_cache()
+    if cache is not None:
+        # Keyed by content, not doc_id: an identical re-ingested document hits too
+        texts_hash = ContentHash()
+        async for _, text in iter_document_chunks_async(doc_id, space_id):
+            texts_hash.update(text)
+        key = document_key(texts_hash.hexdigest(), focus)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            print(f"[Summarization] Summary cache hit for {doc_id}")
+            return cached
+        summary = await _summarize_document(doc_id, space_id, focus)
+        if not _is_failed(summary):
+            await asyncio.to_thread(cache.put, key, "document", summary)
+        return summary
+    return await _summarize_document(doc_id, space_id, focus)
+
+
+async def _summarize_document(doc_id: str, space_id: str, focus: Optional[str] = None) -> str:
+    from .qdrant_store import iter_document_chunks_async
+    
+    # Chunks are read page by page in chunk_index order and packed into MAP
+    # windows as they arrive; the full document text is never assembled
+    chunk_size = 8000
+    windows = pack_windows(iter_document_chunks_async(doc_id, space_id), window_tokens=chunk_size)
+    first = await anext(windows, None)
+    if first is None:
         return f"[Error: Document {doc_id} not found]"
-    
-    # Sort chunks by index
-    sorted_chunks = sorted(
-        results[0],
-        key=lambda x: x.payload.get("chunk_index", 0)
-    )
-    
-    # Combine all chunks
-    full_text = "\n\n".join([
-        chunk.payload.get("text", "")
-        for chunk in sorted_chunks
-    ])
-    
-    # Summarize
-    return await summarize_long_text(full_text, focus=focus)
+    second = await anext(windows, None)
+    if second is None:
+        # Fits in one window (or is a single oversized chunk)
+        return await summarize_long_text(first, chunk_size=chunk_size, focus=focus, whole_document=True)
+    
+    async def all_windows():
+        yield first
+        yield second
+        async for window in windows:
+            yield window
+    
+    print(f"[Summarization] Document {doc_id} is large. Starting streamed Map-Reduce...")
+    return await _map_reduce(all_windows(), chunk_size=chunk_size, focus=focus, whole_document=True)
 
 
 # Synchronous wrappers for FastAPI (if needed)
@@ -278,6 +520,10 @@ def summarize_long_text_sync(text: str, chunk_size: int = 8000, focus: Optional[
         loop.close()
 
 
+def _map_eta(tokens: int, in_flight: int, tokens_per_second: float) -> int:
+    return int(tokens / max(in_flight, 1) / tokens_per_second) + 5  # +5s для reduce
+
+
 async def summarize_document_streaming(
     doc_id: str,
     space_id: str,
@@ -287,6 +533,7 @@ async def summarize_document_streaming(
     Progressive streaming summarization with detailed progress
     
     Yields events:
+    - type: "cached" - готовый summary из кэша (по содержимому и focus)
     - type: "start" - начало процесса
     - type: "processing" - обработка
     - type: "progress" - прогресс Map фазы
@@ -295,46 +542,69 @@ async def summarize_document_streaming(
     - type: "summary" - финальный summary
     - type: "complete" - завершение
     """
-    from services.qdrant_store import client
-    from qdrant_client.models import Filter, FieldCondition, MatchValue
+    from .qdrant_store import iter_document_chunks_async
     
     start_time = time.time()
     model_config = get_current_model_config()
-    
-    # Получить все чанки документа
-    results = client().scroll(
-        collection_name=config.QDRANT_COLLECTION,
-        scroll_filter=Filter(
-            must=[
-                FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
-                FieldCondition(key="space_id", match=MatchValue(value=space_id)),
-            ]
-        ),
-        limit=1000,
-        with_payload=True,
-        with_vectors=False
-    )
-    
-    if not results[0]:
+    threshold = 8000
+    tokens_per_chunk = 6000
+    
+    # Первый проход по чанкам (постранично, по chunk_index): подсчёт токенов и
+    # план окон MAP по границам чанков. Текст держим, только пока документ
+    # помещается в простую стратегию; окна читаются заново при обработке.
+    plan: List[Tuple[int, int, int]] = []  # (первый chunk_index, последний + 1, токены)
+    small_texts: Optional[List[str]] = []
+    total_chunks = 0
+    total_tokens = 0
+    window_start: Optional[int] = None
+    window_end = 0
+    window_tokens = 0
+    texts_hash = ContentHash()
+    async for chunk_index, text in iter_document_chunks_async(doc_id, space_id):
+        text_tokens = count_tokens_simple(text)
+        texts_hash.update(text)
+        total_chunks += 1
+        total_tokens += text_tokens
+        if small_texts is not None:
+            small_texts.append(text)
+            if total_tokens > threshold:
+                small_texts = None
+        if window_start is not None and window_tokens + text_tokens > tokens_per_chunk:
+            plan.append((window_start, window_end, window_tokens))
+            window_start, window_tokens = None, 0
+        if window_start is None:
+            window_start = chunk_index
+        window_end = chunk_index + 1
+        window_tokens += text_tokens
+    if window_start is not None:
+        plan.append((window_start, window_end, window_tokens))
+    
+    if total_chunks == 0:
         yield {
             "type": "error",
             "message": f"Document {doc_id} not found"
         }
         return
     
-    chunks = results[0]
-    texts = [c.payload.get("text", "") for c in chunks]
-    combined_text = "\n\n".join(texts)
-    total_tokens = count_tokens_simple(combined_text)
-    
-    # Определить стратегию
-    threshold = 8000
+    # Кэш по содержимому документа + focus: без вызовов LLM
+    cache = get_summary_cache()
+    cache_key = document_key(texts_hash.hexdigest(), focus) if cache is not None else None
+    cached = await asyncio.to_thread(cache.get, cache_key) if cache_key is not None else None
+    if cached is not None:
+        yield {
+            "type": "cached",
+            "summary": cached,
+            "progress": 100,
+            "total_chunks": total_chunks
+        }
+        return
     
     if total_tokens <= threshold:
         # Простая суммаризация
+        combined_text = "\n\n".join(small_texts)
         yield {
             "type": "start",
-            "total_chunks": len(chunks),
+            "total_chunks": total_chunks,
             "total_tokens": total_tokens,
             "strategy": "simple",
             "progress": 0
@@ -352,6 +622,8 @@ async def summarize_document_streaming(
         chunk_start = time.time()
         summary = await summarize_text(combined_text, max_summary_tokens=2000, focus=focus)
         chunk_time = time.time() - chunk_start
+        if cache_key is not None and not _is_failed(summary):
+            await asyncio.to_thread(cache.put, cache_key, "document", summary)
         
         yield {
             "type": "summary",
@@ -369,11 +641,11 @@ async def summarize_document_streaming(
         
     else:
         # Map-Reduce стратегия
-        num_map_chunks = (total_tokens // 6000) + 1
+        num_map_chunks = len(plan)
         
         yield {
             "type": "start",
-            "total_chunks": len(chunks),
+            "total_chunks": total_chunks,
             "total_tokens": total_tokens,
             "strategy": "map_reduce",
             "map_chunks": num_map_chunks,
@@ -388,62 +660,56 @@ async def summarize_document_streaming(
             "eta_seconds": int((total_tokens / model_config.tokens_per_second) * 1.5)  # Map-Reduce overhead
         }
         
-        # MAP фаза
-        chunk_summaries = []
-        tokens_per_chunk = 6000
+        # MAP фаза: чанки суммаризируются параллельно, события идут по мере готовности
+        async def map_texts():
+            # Окно читается из Qdrant только когда до него доходит очередь
+            for first, end, _ in plan:
+                yield "\n\n".join([
+                    text async for _, text in iter_document_chunks_async(doc_id, space_id, start=first, end=end)
+                ])
         
-        for i in range(num_map_chunks):
-            start_idx = int(i * tokens_per_chunk * 0.85)  # 15% overlap
-            end_idx = int(min((i + 1) * tokens_per_chunk, len(combined_text)))
-            
-            # Найти границу предложения
-            if end_idx < len(combined_text):
-                next_period = combined_text.find('. ', end_idx)
-                if next_period != -1 and next_period < end_idx + 200:
-                    end_idx = next_period + 1
-            
-            chunk_text = combined_text[start_idx:end_idx].strip()
-            chunk_tokens = count_tokens_simple(chunk_text)
-            
-            # Оценка оставшегося времени
-            remaining_chunks = num_map_chunks - i
-            avg_tokens_per_chunk = chunk_tokens
-            eta = int((remaining_chunks * avg_tokens_per_chunk / model_config.tokens_per_second) + 5)  # +5s для reduce
-            
-            yield {
-                "type": "progress",
-                "stage": "map",
-                "current": i + 1,
-                "total": num_map_chunks,
-                "progress": 10 + int(60 * (i + 1) / num_map_chunks),
-                "message": f"Processing chunk {i+1}/{num_map_chunks} ({chunk_tokens} tokens)...",
-                "eta_seconds": eta
-            }
-            
-            # Суммаризировать чанк
-            chunk_start = time.time()
-            chunk_summary = await summarize_text(
-                chunk_text,
-                max_summary_tokens=800,
-                focus=focus
-            )
-            chunk_time = time.time() - chunk_start
-            
-            chunk_summaries.append(chunk_summary)
+        by_index: Dict[int, str] = {}
+        in_flight = map_concurrency()
+        
+        yield {
+            "type": "progress",
+            "stage": "map",
+            "current": 0,
+            "total": num_map_chunks,
+            "progress": 10,
+            "message": f"Processing {num_map_chunks} chunks, {in_flight} in parallel...",
+            "eta_seconds": _map_eta(total_tokens, in_flight, model_config.tokens_per_second)
+        }
+        
+        map_stream = map_summaries(map_texts(), max_summary_tokens=800, focus=_map_focus(focus, whole_document=True))
+        async for index, chunk_summary, chunk_time in map_stream:
+            by_index[index] = chunk_summary
+            done = len(by_index)
+            remaining = sum(plan[i][2] for i in range(num_map_chunks) if i not in by_index)
             
             # Отдать промежуточный результат
             preview_length = 150
             yield {
                 "type": "partial_summary",
-                "chunk": i + 1,
+                "chunk": index + 1,
                 "summary": chunk_summary[:preview_length] + "..." if len(chunk_summary) > preview_length else chunk_summary,
                 "full_summary": chunk_summary,
                 "tokens": count_tokens_simple(chunk_summary),
                 "processing_time": round(chunk_time, 2)
             }
             
-            # Небольшая пауза для клиента
-            await asyncio.sleep(0.1)
+            yield {
+                "type": "progress",
+                "stage": "map",
+                "current": done,
+                "total": num_map_chunks,
+                "progress": 10 + int(60 * done / num_map_chunks),
+                "message": f"Chunk {index + 1} done ({done}/{num_map_chunks})",
+                "eta_seconds": _map_eta(remaining, in_flight, model_config.tokens_per_second)
+            }
+        
+        # Reduce работает с секциями в исходном порядке документа
+        chunk_summaries = [by_index[i] for i in range(num_map_chunks)]
         
         # REDUCE фаза
         yield {
@@ -470,12 +736,22 @@ Maintain key information and structure.
             reduce_prompt += f"\n\nFocus on: {focus}"
         
         reduce_start = time.time()
-        final_summary = await summarize_text(
-            reduce_prompt,
-            max_summary_tokens=model_config.summarization_max_output,
-            focus=None  # Focus уже в промпте
-        )
+        if config.SUMMARY_REDUCE_MODE == "tree" and count_tokens_simple(combined_summaries) > reduce_batch_tokens():
+            # Секции не помещаются в один промпт: иерархическое объединение
+            final_summary = await tree_reduce(
+                [f"Section {i+1}:\n{summary}" for i, summary in enumerate(chunk_summaries)],
+                max_output_tokens=model_config.summarization_max_output,
+                focus=focus
+            )
+        else:
+            final_summary = await summarize_text(
+                reduce_prompt,
+                max_summary_tokens=model_config.summarization_max_output,
+                focus=None  # Focus уже в промпте
+            )
         reduce_time = time.time() - reduce_start
+        if cache_key is not None and not _is_failed(final_summary):
+            await asyncio.to_thread(cache.put, cache_key, "document", final_summary)
         
         yield {
             "type": "summary",
@@ -0,0 +1,159 @@
+"""
+Summary Cache
+Persistent SQLite cache for summarization results that does not depend on
+doc_id, so re-ingesting an identical document (new doc_id, same chunks) or
+repeating a focused request is served without LLM calls.
+
+- document summaries: key = (hash of the ordered chunk texts, normalized focus,
+  LLM model, prompt version);
+- MAP partial summaries: key = (hash of the window text, output budget, focus,
+  model, prompt version). While the cache is on, MAP of whole documents runs
+  without focus, so a new focus on a known document only re-runs REDUCE;
+  query-time summaries of retrieved chunks keep a focused MAP.
+
+Expired rows are deleted by put() at most once per PURGE_INTERVAL_SECONDS
+(and by purge()). The calls are blocking SQLite; async code runs them via
+asyncio.to_thread.
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from . import config
+
+# Bump when the summarization prompts change: old entries stop matching
+PROMPT_VERSION = "1"
+
+# How often put() sweeps out expired rows
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def normalize_focus(focus: Optional[str]) -> str:
+    return " ".join((focus or "").lower().split())
+
+
+class ContentHash:
+    """Incremental hash of a document's chunk texts in chunk order"""
+
+    def __init__(self):
+        self._h = hashlib.sha256()
+
+    def update(self, text: str) -> None:
+        self._h.update(text.encode("utf-8"))
+        self._h.update(b"\x1e")
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def content_hash(texts: Iterable[str]) -> str:
+    h = ContentHash()
+    for text in texts:
+        h.update(text)
+    return h.hexdigest()
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def document_key(doc_hash: str, focus: Optional[str]) -> str:
+    return _key("doc", doc_hash, normalize_focus(focus), config.LLM_MODEL, PROMPT_VERSION)
+
+
+def partial_key(text: str, max_tokens: int, focus: Optional[str] = None) -> str:
+    return _key("map", content_hash([text]), max_tokens, normalize_focus(focus), config.LLM_MODEL, PROMPT_VERSION)
+
+
+class SummaryCache:
+    def __init__(self, path: Path, ttl_seconds: int = 0):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.purged = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS summaries_created ON summaries (created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (self.ttl > 0 and time.time() - row[1] > self.ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, kind: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, kind, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, kind, value, now),
+            )
+            conn.commit()
+        if self.ttl > 0 and now >= self._next_purge:
+            self.purge()
+
+    def purge(self) -> int:
+        """Delete expired rows; returns how many"""
+        if self.ttl <= 0:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,)).rowcount
+            conn.commit()
+            self._next_purge = now + min(self.ttl, PURGE_INTERVAL_SECONDS)
+        self.purged += deleted
+        return deleted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = dict(self._connect().execute("SELECT kind, COUNT(*) FROM summaries GROUP BY kind").fetchall())
+        return {"entries": rows, "hits": self.hits, "misses": self.misses, "purged": self.purged}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: Optional[SummaryCache] = None
+
+
+def get_summary_cache() -> Optional[SummaryCache]:
+    """Process-wide cache, or None when SUMMARY_CACHE_ENABLED is off"""
+    global _cache
+    if not config.SUMMARY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = SummaryCache(config.SUMMARY_CACHE_PATH, ttl_seconds=config.SUMMARY_CACHE_TTL_SECONDS)
+    return _cache
@@ -0,0 +1,402 @@
+"""
+Summary Jobs
+Durable queue for document summarization (/bulk-summarize, regenerate, ingest
+with generate_summary, /summarize-poll). Jobs live in SQLite, so a restart
+resumes them instead of losing them. A fixed pool of SUMMARY_JOB_WORKERS
+threads runs them, which caps how much of the LLM background summarization can
+take from interactive /ask.
+
+- priorities: interactive requests (poll) before regenerate before bulk,
+  both in the queue and at the LLM gateway (only bulk jobs run as background);
+- deduplication: one active (queued/running) job per (doc_id, space_id, focus),
+  a repeated enqueue returns it (raising its priority if needed);
+- retries: a failed run is requeued with exponential backoff up to
+  SUMMARY_JOB_MAX_ATTEMPTS;
+- progress: the streaming summarizer's events update the job row, which
+  /summarize-status and /documents/{doc_id}/summary-status report;
+- several processes may share the file: a job is claimed with a conditional
+  UPDATE and held under a lease (owner + lease_until) that the worker renews;
+  a 'running' job is taken over only after its lease has run out.
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import config
+from .llm_gateway import BACKGROUND, STREAMING, llm_priority
+from .summary_cache import normalize_focus
+
+# Lower value runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BULK = 10
+
+_COLUMNS = (
+    "id", "doc_id", "space_id", "doc_type", "focus", "priority", "status", "attempts",
+    "run_after", "progress", "stage", "result", "error", "created_at", "updated_at", "finished_at",
+    "owner", "lease_until",
+)
+
+# Claimable: queued and due, or running under a lease nobody renews any more
+_CLAIMABLE = (
+    "((status = 'queued' AND run_after <= ?)"
+    " OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))"
+)
+
+ProgressFn = Callable[[int, str], None]
+RunFn = Callable[[Dict, ProgressFn], str]
+
+
+class SummaryJobQueue:
+    def __init__(
+        self,
+        path: Path,
+        run_fn: RunFn,
+        workers: int = 1,
+        max_attempts: int = 3,
+        backoff_seconds: float = 30.0,
+        retention_seconds: int = 0,
+        lease_seconds: float = 120.0,
+    ):
+        self.path = Path(path)
+        self.run_fn = run_fn
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff_seconds
+        self.retention = retention_seconds
+        self.lease = max(lease_seconds, 1.0)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " doc_id TEXT NOT NULL,"
+                " space_id TEXT NOT NULL,"
+                " doc_type TEXT,"
+                " focus TEXT NOT NULL DEFAULT '',"
+                " priority INTEGER NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " run_after REAL NOT NULL,"
+                " progress INTEGER NOT NULL DEFAULT 0,"
+                " stage TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " owner TEXT,"
+                " lease_until REAL)"
+            )
+            present = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in present:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            # Deduplication: at most one active job per document and focus
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS jobs_active ON jobs (doc_id, space_id, focus)"
+                " WHERE status IN ('queued', 'running')"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def enqueue(
+        self,
+        doc_id: str,
+        space_id: str,
+        doc_type: Optional[str] = None,
+        focus: Optional[str] = None,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> Tuple[Dict, bool]:
+        """Queue a summarization job; returns (job, created) — an active duplicate is reused"""
+        focus = normalize_focus(focus)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            existing = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+                " WHERE doc_id = ? AND space_id = ? AND focus = ? AND status IN ('queued', 'running')",
+                (doc_id, space_id, focus),
+            ).fetchone()
+            if existing is not None:
+                if priority < existing["priority"]:
+                    conn.execute(
+                        "UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?", (priority, now, existing["id"])
+                    )
+                    conn.commit()
+                job = self._row(existing)
+                job["priority"] = min(priority, job["priority"])
+                return job, False
+            job_id = uuid.uuid4().hex
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, doc_id, space_id, doc_type, focus, priority, status, run_after,"
+                    " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, doc_id, space_id, doc_type, focus, priority, now, now, now),
+                )
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # Another process queued the same document in between
+                conn.rollback()
+                row = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+                    " WHERE doc_id = ? AND space_id = ? AND focus = ? AND status IN ('queued', 'running')",
+                    (doc_id, space_id, focus),
+                ).fetchone()
+                return self._row(row), False
+            row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        self._wake.set()
+        return self._row(row), True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def latest_for(self, doc_id: str, space_id: str) -> Optional[Dict]:
+        """Most recent job for a document (any focus, any status)"""
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE doc_id = ? AND space_id = ?"
+                " ORDER BY created_at DESC LIMIT 1",
+                (doc_id, space_id),
+            ).fetchone()
+        return self._row(row)
+
+    def _claim(self) -> Tuple[Optional[Dict], Optional[float]]:
+        """Take the next due job under a lease; otherwise return when the earliest retry or lease is due"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            while True:
+                row = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE {_CLAIMABLE}"
+                    " ORDER BY priority, created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    next_due = conn.execute(
+                        "SELECT MIN(CASE status WHEN 'queued' THEN run_after ELSE lease_until END)"
+                        " FROM jobs WHERE status IN ('queued', 'running')"
+                    ).fetchone()[0]
+                    return None, next_due
+                if row["status"] == "running":
+                    print(f"[SummaryJobs] {row['doc_id']}: lease of {row['owner']} expired, taking over")
+                # Only one process wins the conditional UPDATE; the others pick another row
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, stage = 'start',"
+                    f" owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND {_CLAIMABLE}",
+                    (self.owner, now + self.lease, now, row["id"], now, now),
+                ).rowcount
+                conn.commit()
+                if claimed:
+                    break
+        job = self._row(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["owner"] = self.owner
+        job["lease_until"] = now + self.lease
+        return job, None
+
+    def _update(self, job_id: str, **fields) -> None:
+        """Update a job this queue holds; a no-op once another process has taken it over"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND owner = ?", (*fields.values(), job_id, self.owner)
+            )
+            conn.commit()
+
+    def _renew_leases(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + self.lease, self.owner),
+            )
+            conn.commit()
+
+    def _heartbeat(self) -> None:
+        while not self._halt.wait(self.lease / 3):
+            try:
+                self._renew_leases()
+            except Exception as e:
+                print(f"[SummaryJobs] Lease renewal failed: {e}")
+
+    def run_once(self) -> bool:
+        """Claim and run one due job in the calling thread; False when nothing is due"""
+        job, _ = self._claim()
+        if job is None:
+            return False
+        self._execute(job)
+        return True
+
+    def _execute(self, job: Dict) -> None:
+        def report(progress: int, stage: str) -> None:
+            self._update(job["id"], progress=int(progress), stage=stage, lease_until=time.time() + self.lease)
+
+        try:
+            result = self.run_fn(job, report)
+        except Exception as e:
+            if job["attempts"] < self.max_attempts:
+                delay = self.backoff * (2 ** (job["attempts"] - 1))
+                print(f"[SummaryJobs] {job['doc_id']}: attempt {job['attempts']} failed ({e}), retry in {delay:.0f}s")
+                self._update(job["id"], status="queued", run_after=time.time() + delay, error=str(e), stage="retry")
+            else:
+                print(f"[SummaryJobs] {job['doc_id']}: failed after {job['attempts']} attempts: {e}")
+                self._update(job["id"], status="failed", error=str(e), stage="failed", finished_at=time.time())
+            return
+        self._update(
+            job["id"], status="done", result=result, error=None, progress=100, stage="complete",
+            finished_at=time.time(),
+        )
+        print(f"[SummaryJobs] {job['doc_id']}: done (attempt {job['attempts']})")
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                job, next_due = self._claim()
+            except Exception as e:
+                print(f"[SummaryJobs] Queue read failed: {e}")
+                job, next_due = None, None
+            if job is not None:
+                self._execute(job)
+                continue
+            timeout = 5.0 if next_due is None else min(5.0, max(0.05, next_due - time.time()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def start(self) -> None:
+        """Drop expired finished jobs and start the workers (plus the lease heartbeat)"""
+        if self._threads:
+            return
+        # Jobs left 'running' by a dead process are claimed again once their lease runs out
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if self.retention > 0:
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - self.retention,)
+                )
+            conn.commit()
+        self._stopping = False
+        self._halt.clear()
+        heartbeat = threading.Thread(target=self._heartbeat, name="summary-job-lease", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"summary-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        # A job still running stays 'running' in SQLite and is resumed once its lease expires
+        self._stopping = True
+        self._halt.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, "jobs": counts}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+async def _summarize_with_progress(job: Dict, report: ProgressFn) -> Tuple[str, int]:
+    from .summarization import _is_failed, summarize_document_streaming
+
+    summary, total_chunks = None, 0
+    async for event in summarize_document_streaming(job["doc_id"], job["space_id"], job["focus"] or None):
+        kind = event.get("type")
+        total_chunks = event.get("total_chunks", total_chunks)
+        if kind == "error":
+            raise RuntimeError(event.get("message", "summarization failed"))
+        if kind in ("cached", "summary"):
+            summary = event.get("summary") if kind == "cached" else event.get("text")
+        elif "progress" in event:
+            report(event["progress"], event.get("stage", kind))
+    if not summary or _is_failed(summary):
+        raise RuntimeError(summary or "empty summary")
+    return summary, total_chunks
+
+
+def gateway_priority(job_priority: int) -> int:
+    """LLM gateway class for a job: bulk runs in the background, poll / regenerate / ingest ahead of it"""
+    return BACKGROUND if job_priority >= PRIORITY_BULK else STREAMING
+
+
+def run_summary_job(job: Dict, report: ProgressFn) -> str:
+    """Default job body: streaming summarization, then store the (unfocused) summary"""
+    from .summary_store import save_document_summary, update_main_collection_summary_flag
+
+    with llm_priority(gateway_priority(job.get("priority", PRIORITY_BULK))):
+        summary, total_chunks = asyncio.run(_summarize_with_progress(job, report))
+    if not job["focus"]:
+        summary_id = save_document_summary(
+            doc_id=job["doc_id"],
+            space_id=job["space_id"],
+            summary=summary,
+            doc_type=job["doc_type"],
+            original_chunks=total_chunks,
+        )
+        update_main_collection_summary_flag(job["doc_id"], job["space_id"], summary_id)
+    return summary
+
+
+_queue: Optional[SummaryJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> SummaryJobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = SummaryJobQueue(
+                    config.SUMMARY_JOBS_PATH,
+                    run_summary_job,
+                    workers=config.SUMMARY_JOB_WORKERS,
+                    max_attempts=config.SUMMARY_JOB_MAX_ATTEMPTS,
+                    backoff_seconds=config.SUMMARY_JOB_BACKOFF_SECONDS,
+                    retention_seconds=config.SUMMARY_JOB_RETENTION_SECONDS,
+                    lease_seconds=config.SUMMARY_JOB_LEASE_SECONDS,
+                )
+    return _queue
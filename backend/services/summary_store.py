@@ -1,6 +1,9 @@
 """
 Document Summary Storage
-Separate Qdrant collection for storing document summaries
+Separate Qdrant collection for storing document summaries.
+Each summary is stored with its embedding (same model as the chunks), so the
+collection doubles as a document-level index for two-stage retrieval: find the
+closest documents by summary first, then search chunks only inside them.
 """
 
 import os
@@ -13,8 +16,16 @@ from qdrant_client.models import (
     Filter,
     FieldCondition,
     MatchValue,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
 )
 from . import config
+from .cache import TTLCache
+from .embeddings import dim, embed, embed_batch
+from .payload_indexes import ensure_payload_indexes, required_indexes
+from .qdrant_pool import ensure_once
 
 
 SUMMARY_COLLECTION = "document_summaries"
@@ -28,41 +39,114 @@ def get_client():
 
 def ensure_summary_collection():
     """
-    Ensure summary collection exists
+    Ensure summary collection exists (checked once per process)
     Structure: stores document summaries with metadata
     """
+    ensure_once(SUMMARY_COLLECTION, _bootstrap_summary_collection)
+
+
+def _bootstrap_summary_collection():
     cl = get_client()
     
-    collections = cl.get_collections().collections
-    if any(c.name == SUMMARY_COLLECTION for c in collections):
+    # SUMMARY_COLLECTION is either a plain collection or an alias to
+    # "<name>_<dim>" left by a re-embedding migration
+    if cl.collection_exists(SUMMARY_COLLECTION):
+        size = cl.get_collection(SUMMARY_COLLECTION).config.params.vectors.size
+        if size != dim():
+            # Коллекция со старым dummy-вектором (size=1) или от другой модели эмбеддингов
+            _reembed_summaries(cl, size)
         return
     
-    print(f"[SummaryStore] Creating collection: {SUMMARY_COLLECTION}")
+    migrated = _versioned_name()
+    if cl.collection_exists(migrated):
+        # Migration stopped between dropping the old collection and creating the alias
+        _point_alias(cl, migrated)
+        return
+    
+    _create_summary_collection(cl, SUMMARY_COLLECTION)
+
+
+def _versioned_name() -> str:
+    return f"{SUMMARY_COLLECTION}_{dim()}"
+
+
+def _create_summary_collection(cl, name: str):
+    print(f"[SummaryStore] Creating collection: {name}")
     
-    # Создаем коллекцию с dummy vector (для совместимости с Qdrant)
-    # Реально vector не используется, храним только payload
     cl.create_collection(
-        collection_name=SUMMARY_COLLECTION,
+        collection_name=name,
         vectors_config=VectorParams(
-            size=1,  # Минимальный размер
+            size=dim(),
             distance=Distance.COSINE
         )
     )
     
     # Создаем индексы для быстрого поиска
-    cl.create_payload_index(
-        collection_name=SUMMARY_COLLECTION,
-        field_name="doc_id",
-        field_schema="keyword"
-    )
+    ensure_payload_indexes(cl, name, required_indexes(SUMMARY_COLLECTION))
     
-    cl.create_payload_index(
-        collection_name=SUMMARY_COLLECTION,
-        field_name="space_id",
-        field_schema="keyword"
-    )
+    print(f"[SummaryStore] Collection {name} created")
+
+
+def _alias_target(cl) -> Optional[str]:
+    for alias in cl.get_aliases().aliases:
+        if alias.alias_name == SUMMARY_COLLECTION:
+            return alias.collection_name
+    return None
+
+
+def _point_alias(cl, target: str):
+    """Make SUMMARY_COLLECTION resolve to target, dropping whatever it was before"""
+    previous = _alias_target(cl)
+    operations = []
+    if previous is None:
+        if cl.collection_exists(SUMMARY_COLLECTION):
+            # A plain collection: the alias cannot be created while the name is taken
+            cl.delete_collection(SUMMARY_COLLECTION)
+    else:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=SUMMARY_COLLECTION)))
+    operations.append(CreateAliasOperation(
+        create_alias=CreateAlias(collection_name=target, alias_name=SUMMARY_COLLECTION)
+    ))
+    cl.update_collection_aliases(change_aliases_operations=operations)
+    if previous is not None and previous != target:
+        cl.delete_collection(previous)
+
+
+def _reembed_summaries(cl, old_size: int):
+    """
+    Re-embed every summary into a new "<name>_<dim>" collection and switch
+    SUMMARY_COLLECTION to it only once it is fully populated: a failure midway
+    leaves the existing summaries untouched.
+    """
+    target = _versioned_name()
+    print(f"[SummaryStore] {SUMMARY_COLLECTION} has {old_size}-dim vectors, re-embedding summaries into {target}")
+    if cl.collection_exists(target):
+        # Leftover of an interrupted attempt
+        cl.delete_collection(target)
+    _create_summary_collection(cl, target)
+    
+    total = 0
+    offset = None
+    while True:
+        batch, offset = cl.scroll(
+            collection_name=SUMMARY_COLLECTION,
+            limit=64,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        if batch:
+            vectors = embed_batch([p.payload.get("summary", "") for p in batch])
+            cl.upsert(
+                collection_name=target,
+                points=[PointStruct(id=p.id, vector=v, payload=p.payload) for p, v in zip(batch, vectors)]
+            )
+            total += len(batch)
+        if offset is None:
+            break
     
-    print(f"[SummaryStore] Collection {SUMMARY_COLLECTION} created")
+    _point_alias(cl, target)
+    print(f"[SummaryStore] Re-embedded {total} summaries, {SUMMARY_COLLECTION} -> {target}")
 
 
 def save_document_summary(
@@ -98,6 +182,7 @@ def save_document_summary(
         "model": config.LLM_MODEL,
         "llm_mode": config.LLM_MODE,
     }
+    vector = embed(summary)
     
     if existing:
         # Обновить существующий summary
@@ -119,10 +204,10 @@ def save_document_summary(
         
         if results[0]:
             point_id = results[0][0].id
-            cl.set_payload(
+            # Новый текст — новый вектор: точка перезаписывается целиком
+            cl.upsert(
                 collection_name=SUMMARY_COLLECTION,
-                payload=payload,
-                points=[point_id]
+                points=[PointStruct(id=point_id, vector=vector, payload=payload)]
             )
             return str(point_id)
     
@@ -137,7 +222,7 @@ def save_document_summary(
         points=[
             PointStruct(
                 id=summary_id,
-                vector=[0.0],  # Dummy vector
+                vector=vector,
                 payload=payload
             )
         ]
@@ -146,6 +231,99 @@ def save_document_summary(
     return summary_id
 
 
+def _summary_search_request(query_vector: List[float], space_id: Optional[str], top_n: int) -> Dict:
+    # doc_type is not filtered here: summaries saved on the fly may have none;
+    # the chunk-level stage applies the doc_type filter
+    return {
+        "collection_name": SUMMARY_COLLECTION,
+        "query": query_vector,
+        "query_filter": Filter(must=[
+            FieldCondition(key="space_id", match=MatchValue(value=space_id))
+        ]) if space_id else None,
+        "limit": top_n,
+        "with_payload": ["doc_id"],
+    }
+
+
+def search_summaries(query_vector: List[float], space_id: Optional[str], top_n: int = 20) -> List[Dict]:
+    """Closest documents by summary vector: [{"doc_id", "score"}]"""
+    ensure_summary_collection()
+    res = get_client().query_points(**_summary_search_request(query_vector, space_id, top_n))
+    return [{"doc_id": h.payload.get("doc_id"), "score": float(h.score)} for h in res.points]
+
+
+async def search_summaries_async(query_vector: List[float], space_id: Optional[str], top_n: int = 20) -> List[Dict]:
+    from .qdrant_store import async_client
+    
+    ensure_summary_collection()
+    cl = await async_client()
+    res = await cl.query_points(**_summary_search_request(query_vector, space_id, top_n))
+    return [{"doc_id": h.payload.get("doc_id"), "score": float(h.score)} for h in res.points]
+
+
+# doc_ids without a summary per space (two-stage retrieval); ingest invalidates its space
+_unsummarized_cache = TTLCache(maxsize=256, ttl=60)
+
+
+def list_unsummarized_doc_ids(space_id: Optional[str], limit: int) -> Optional[List[str]]:
+    """
+    doc_ids whose first chunk carries no has_summary flag (None when there are more than limit)
+    """
+    from .qdrant_store import client as get_qdrant_client
+    
+    cache_key = (space_id, limit)
+    cached = _unsummarized_cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+    
+    must = [FieldCondition(key="chunk_index", match=MatchValue(value=0))]
+    if space_id:
+        must.append(FieldCondition(key="space_id", match=MatchValue(value=space_id)))
+    scroll_filter = Filter(
+        must=must,
+        must_not=[FieldCondition(key="has_summary", match=MatchValue(value=True))],
+    )
+    doc_ids: List[str] = []
+    offset = None
+    result: Optional[List[str]] = None
+    while True:
+        points, offset = get_qdrant_client().scroll(
+            collection_name=config.QDRANT_COLLECTION,
+            scroll_filter=scroll_filter,
+            limit=config.CHUNK_SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=["doc_id"],
+            with_vectors=False,
+        )
+        doc_ids.extend(p.payload.get("doc_id") for p in points if p.payload.get("doc_id"))
+        if len(doc_ids) > limit:
+            break
+        if offset is None:
+            result = list(dict.fromkeys(doc_ids))
+            break
+    _unsummarized_cache.set(cache_key, (result,))
+    return result
+
+
+def invalidate_unsummarized() -> None:
+    _unsummarized_cache.clear()
+
+
+def two_stage_doc_ids(hits: List[Dict], space_id: Optional[str]) -> Optional[List[str]]:
+    """
+    Documents for the chunk-level stage: summary hits plus every document that has
+    no summary yet (otherwise it would be unreachable). None = search all chunks:
+    no summary hits, or too many unsummarized documents for a doc_id filter.
+    """
+    doc_ids = [h["doc_id"] for h in hits if h.get("doc_id")]
+    if not doc_ids:
+        return None
+    unsummarized = list_unsummarized_doc_ids(space_id, config.TWO_STAGE_MAX_UNSUMMARIZED)
+    if unsummarized is None:
+        return None
+    return list(dict.fromkeys(doc_ids + unsummarized))
+
+
 def get_document_summary(doc_id: str, space_id: str) -> Optional[Dict]:
     """
     Get saved summary for a document
@@ -231,6 +409,19 @@ def delete_document_summary(doc_id: str, space_id: str) -> bool:
         points_selector=[point_id]
     )
     
+    # Документ снова без summary: вернуть его в выборку двухэтапного поиска
+    from .qdrant_store import client as get_qdrant_client
+    get_qdrant_client().set_payload(
+        collection_name=config.QDRANT_COLLECTION,
+        payload={"has_summary": False},
+        points=Filter(must=[
+            FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
+            FieldCondition(key="space_id", match=MatchValue(value=space_id)),
+            FieldCondition(key="chunk_index", match=MatchValue(value=0)),
+        ]),
+    )
+    invalidate_unsummarized()
+    
     print(f"[SummaryStore] Deleted summary for {doc_id}")
     return True
 
@@ -338,30 +529,40 @@ def update_main_collection_summary_flag(doc_id: str, space_id: str, summary_id:
     """
     Update first chunk of document in main collection with summary reference
     """
-    from .qdrant_store import client as get_qdrant_client
+    from .qdrant_store import client as get_qdrant_client, chunk_point_id
     
     cl = get_qdrant_client()
     
-    # Найти первый чанк документа
-    results = cl.scroll(
+    # Первый чанк адресуется напрямую по детерминированному ID
+    point_id = chunk_point_id(space_id, doc_id, 0)
+    found = cl.retrieve(
         collection_name=config.QDRANT_COLLECTION,
-        scroll_filter=Filter(
-            must=[
-                FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
-                FieldCondition(key="space_id", match=MatchValue(value=space_id)),
-                FieldCondition(key="chunk_index", match=MatchValue(value=0)),
-            ]
-        ),
-        limit=1,
-        with_payload=True,
+        ids=[point_id],
+        with_payload=False,
         with_vectors=False
     )
     
-    if not results[0]:
-        print(f"[SummaryStore] Warning: Document {doc_id} first chunk not found")
-        return
-    
-    point = results[0][0]
+    if not found:
+        # Документы, проиндексированные до перехода на UUIDv5 — ищем через scroll
+        results = cl.scroll(
+            collection_name=config.QDRANT_COLLECTION,
+            scroll_filter=Filter(
+                must=[
+                    FieldCondition(key="doc_id", match=MatchValue(value=doc_id)),
+                    FieldCondition(key="space_id", match=MatchValue(value=space_id)),
+                    FieldCondition(key="chunk_index", match=MatchValue(value=0)),
+                ]
+            ),
+            limit=1,
+            with_payload=False,
+            with_vectors=False
+        )
+        
+        if not results[0]:
+            print(f"[SummaryStore] Warning: Document {doc_id} first chunk not found")
+            return
+        
+        point_id = results[0][0].id
     
     # Обновить payload с флагом и ссылкой на summary
     cl.set_payload(
@@ -370,7 +571,7 @@ def update_main_collection_summary_flag(doc_id: str, space_id: str, summary_id:
             "has_summary": True,
             "summary_id": summary_id,
         },
-        points=[point.id]
+        points=[point_id]
     )
     
     print(f"[SummaryStore] Updated main collection flag for {doc_id}")
@@ -15,6 +15,8 @@ from qdrant_client.models import (
     MatchValue,
 )
 from . import config
+from .payload_indexes import ensure_payload_indexes
+from .qdrant_pool import ensure_once
 
 
 # Collections
@@ -34,7 +36,13 @@ def ensure_chat_collections():
     
     1. chat_messages - stores individual chat messages
     2. thread_summaries - stores structured thread summaries
+    
+    Checked once per process.
     """
+    ensure_once(CHAT_MESSAGES_COLLECTION, _bootstrap_chat_collections)
+
+
+def _bootstrap_chat_collections():
     cl = get_client()
     collections = cl.get_collections().collections
     existing = {c.name for c in collections}
@@ -52,23 +60,7 @@ def ensure_chat_collections():
         )
         
         # Indexes for fast queries
-        cl.create_payload_index(
-            collection_name=CHAT_MESSAGES_COLLECTION,
-            field_name="thread_id",
-            field_schema="keyword"
-        )
-        
-        cl.create_payload_index(
-            collection_name=CHAT_MESSAGES_COLLECTION,
-            field_name="space_id",
-            field_schema="keyword"
-        )
-        
-        cl.create_payload_index(
-            collection_name=CHAT_MESSAGES_COLLECTION,
-            field_name="sender",
-            field_schema="keyword"
-        )
+        ensure_payload_indexes(cl, CHAT_MESSAGES_COLLECTION)
         
         print(f"[ThreadStore] Collection {CHAT_MESSAGES_COLLECTION} created")
     
@@ -84,17 +76,7 @@ def ensure_chat_collections():
             )
         )
         
-        cl.create_payload_index(
-            collection_name=THREAD_SUMMARIES_COLLECTION,
-            field_name="thread_id",
-            field_schema="keyword"
-        )
-        
-        cl.create_payload_index(
-            collection_name=THREAD_SUMMARIES_COLLECTION,
-            field_name="space_id",
-            field_schema="keyword"
-        )
+        ensure_payload_indexes(cl, THREAD_SUMMARIES_COLLECTION)
         
         print(f"[ThreadStore] Collection {THREAD_SUMMARIES_COLLECTION} created")
 
@@ -3,6 +3,7 @@ Thread Summarization
 Structured summarization of conversation threads with action items extraction
 """
 
+import asyncio
 import json
 import re
 from typing import Dict, List, Optional
@@ -58,7 +59,8 @@ Provide a clear, coherent summary in 2-4 paragraphs.
 Remember: USE THE SAME LANGUAGE ({lang_name}) as the messages above!
 SUMMARY (in {lang_name}):"""
     
-    summary = call_llm(base_prompt)
+    # call_llm blocks (and may wait for an LLM gateway slot): keep it off the event loop
+    summary = await asyncio.to_thread(call_llm, base_prompt)
     
     result = {
         "summary": summary,
@@ -90,7 +92,7 @@ If no action items found, return empty array: []
 Remember: USE THE SAME LANGUAGE ({lang_name}) as the messages!"""
         
         try:
-            action_response = call_llm(action_prompt)
+            action_response = await asyncio.to_thread(call_llm, action_prompt)
             # Try to extract JSON from response
             action_items = extract_json_from_text(action_response)
             if not isinstance(action_items, list):
@@ -121,7 +123,7 @@ If no decisions found, return "No explicit decisions made."
 Remember: USE THE SAME LANGUAGE ({lang_name}) as the messages!"""
         
         try:
-            decisions_text = call_llm(decision_prompt)
+            decisions_text = await asyncio.to_thread(call_llm, decision_prompt)
             # Parse decisions (each line starting with "-")
             decisions = [
                 line.strip('- ').strip()
@@ -152,7 +154,7 @@ Remember: USE THE SAME LANGUAGE ({lang_name}) as the messages!
 Topics:"""
         
         try:
-            topics_text = call_llm(topic_prompt)
+            topics_text = await asyncio.to_thread(call_llm, topic_prompt)
             # Parse topics
             topics = [
                 t.strip()
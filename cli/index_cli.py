@@ -5,10 +5,11 @@ sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
 from services.parsers import parse_pdf_bytes, parse_docx_bytes, parse_xlsx_bytes, parse_csv_bytes, parse_txt_bytes
 from services.chunking import split_markdown
 from services.qdrant_store import upsert_chunks, ensure_collection
-from services.keyword_index import add_chunks as kw_add
+from services.keyword_engine import add_chunks as kw_add, flush as kw_flush
 from services.embeddings import get_embedder
 from services.text_cleaning import clean_chunk
 from services.categories import guess_doc_type
+from services.chunk_summaries import generate_chunk_summaries_task
 from services import config
 from argparse import ArgumentParser
 
@@ -31,6 +32,8 @@ def main():
     ap = ArgumentParser(description="Batch ingest directory into vector+BM25 indices")
     ap.add_argument("--dir", required=True)
     ap.add_argument("--space", required=True)
+    ap.add_argument("--chunk-summaries", action="store_true", default=config.CHUNK_SUMMARIES_ENABLED,
+                    help="generate per-chunk LLM summaries for /ask summarize mode")
     args = ap.parse_args()
 
     ensure_collection()
@@ -67,9 +70,12 @@ def main():
             doc_type = guess_doc_type(text, doc_path.name, doc_path)
             upsert_chunks(args.space, doc_id, doc_type, cleaned_chunks)
             kw_add(args.space, doc_id, doc_type, cleaned_chunks)
+            if args.chunk_summaries:
+                generate_chunk_summaries_task(args.space, doc_id, cleaned_chunks)
             total_docs += 1
             total_chunks += len(cleaned_chunks)
             print(f"[ok] {f}: {len(cleaned_chunks)} chunks (doc_id={doc_id}, doc_type={doc_type})")
+    kw_flush()
     print(f"Done. docs={total_docs}, chunks={total_chunks}")
 
 if __name__ == "__main__":
@@ -0,0 +1,25 @@
+import json, sys, pathlib
+# add backend to path
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
+from services.keyword_wal import get_wal
+from services import config
+from argparse import ArgumentParser
+
+def main():
+    ap = ArgumentParser(description="Keyword index write-ahead log: replay, snapshot, status")
+    ap.add_argument("command", choices=["status", "sync", "snapshot"])
+    args = ap.parse_args()
+
+    if not config.KEYWORD_WAL_ENABLED:
+        print("KEYWORD_WAL_ENABLED is false: the backend writes the local index directly")
+    wal = get_wal()
+    if args.command == "sync":
+        print(f"Applied {wal.sync()} records")
+    elif args.command == "snapshot":
+        # Run on a replica whose local index is complete; new replicas start from it
+        print(json.dumps(wal.create_snapshot(), ensure_ascii=False))
+    wal.position()
+    print(json.dumps(wal.stats(), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import json, signal, sys, pathlib, threading
+# add backend to path
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
+from services import config
+from services.model_server import ModelHost, ModelServer
+from argparse import ArgumentParser
+
+def main():
+    ap = ArgumentParser(description="Serve the embedder, reranker and doc-type classifier to API workers over a Unix socket")
+    ap.add_argument("--socket", default=config.MODEL_SERVER_SOCKET or "/tmp/rag-models.sock")
+    ap.add_argument("--no-reranker", action="store_true", help="do not load the cross-encoder")
+    ap.add_argument("--no-classifier", action="store_true", help="do not load the doc-type classifier")
+    args = ap.parse_args()
+
+    host = ModelHost.load(reranker=not args.no_reranker, classifier=not args.no_classifier)
+    server = ModelServer(args.socket, host)
+    info = host.handle({"op": "info"})
+    print(f"[ModelServer] Listening on {args.socket}: {json.dumps(info, ensure_ascii=False)}", flush=True)
+
+    def _stop(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        print("[ModelServer] Stopped", flush=True)
+
+if __name__ == "__main__":
+    main()
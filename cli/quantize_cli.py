@@ -0,0 +1,24 @@
+
+import sys, pathlib
+# add backend to path
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
+from services.qdrant_store import client, enable_quantization
+from services import config
+from argparse import ArgumentParser
+
+def main():
+    ap = ArgumentParser(description="Enable/disable vector quantization on the existing Qdrant collection")
+    ap.add_argument("--mode", required=True, choices=["scalar", "binary", "none"])
+    args = ap.parse_args()
+
+    before = client().get_collection(config.QDRANT_COLLECTION)
+    print(f"Collection {config.QDRANT_COLLECTION}: points={before.points_count}, "
+          f"quantization={before.config.quantization_config}")
+    enable_quantization(args.mode)
+    after = client().get_collection(config.QDRANT_COLLECTION)
+    print(f"Updated: quantization={after.config.quantization_config}, status={after.status}")
+    print("Qdrant rebuilds segments in the background; set QDRANT_QUANTIZATION="
+          f"{args.mode} for the backend so searches use matching params.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Throughput of the torch (sentence-transformers) path vs ONNX Runtime fp32/int8 on CPU."""
+import argparse
+import json
+import pathlib
+import sys
+import time
+from typing import Callable, Dict, List
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
+
+from services import config  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "Договор поставки оборудования подписан сторонами и вступает в силу с момента оплаты.",
+    "Quarterly revenue grew by 12 percent while operating costs stayed flat.",
+    "Сотрудник обязан согласовать отпуск с руководителем не позднее чем за две недели.",
+    "The incident was caused by an expired TLS certificate on the load balancer.",
+]
+
+
+def measure(fn: Callable[[], object], repeats: int) -> float:
+    fn()  # warm-up (graph optimization, allocations)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def load_texts(path: str, n: int) -> List[str]:
+    if path:
+        lines = [l.strip() for l in pathlib.Path(path).read_text(encoding="utf-8").splitlines() if l.strip()]
+    else:
+        lines = SAMPLE_TEXTS
+    return [lines[i % len(lines)] for i in range(n)]
+
+
+def bench_embeddings(texts: List[str], batch: int, repeats: int) -> Dict:
+    from sentence_transformers import SentenceTransformer
+
+    from services.onnx_backend import OnnxEmbedder
+
+    models = {"torch": SentenceTransformer(config.EMBED_MODEL, device="cpu")}
+    for quantize in ("none", "int8"):
+        with mock.patch.object(config, "ONNX_QUANTIZE", quantize):
+            models[f"onnx-{'fp32' if quantize == 'none' else 'int8'}"] = OnnxEmbedder(config.EMBED_MODEL)
+
+    reference = models["torch"].encode(texts[:batch])
+    out = {}
+    for name, model in models.items():
+        single = measure(lambda: model.encode(texts[0]), repeats)
+        batched = measure(lambda: model.encode(texts[:batch], batch_size=batch), repeats)
+        vectors = model.encode(texts[:batch])
+        cosine = np.sum(reference * vectors, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+        )
+        out[name] = {
+            "single_ms": round(single * 1000, 2),
+            "batch_texts_per_s": round(batch / batched, 1),
+            "min_cosine_vs_torch": round(float(cosine.min()), 5),
+        }
+    return out
+
+
+def bench_rerank(texts: List[str], batch: int, repeats: int) -> Dict:
+    from sentence_transformers import CrossEncoder
+
+    from services.onnx_backend import OnnxCrossEncoder
+
+    models = {"torch": CrossEncoder(config.RERANK_MODEL, device="cpu")}
+    for quantize in ("none", "int8"):
+        with mock.patch.object(config, "ONNX_QUANTIZE", quantize):
+            models[f"onnx-{'fp32' if quantize == 'none' else 'int8'}"] = OnnxCrossEncoder(config.RERANK_MODEL)
+
+    pairs = [("договор поставки оборудования", t) for t in texts[:batch]]
+    reference = np.argsort(-models["torch"].predict(pairs))
+    out = {}
+    for name, model in models.items():
+        elapsed = measure(lambda: model.predict(pairs, batch_size=batch), repeats)
+        order = np.argsort(-model.predict(pairs))
+        out[name] = {
+            "pairs_per_s": round(len(pairs) / elapsed, 1),
+            "same_order_as_torch": bool((order == reference).all()),
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--texts", default="", help="file with one text per line (default: built-in samples)")
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--repeats", type=int, default=10)
+    ap.add_argument("--threads", type=int, default=config.ONNX_INTRA_OP_THREADS,
+                    help="ONNX intra-op threads (0 = onnxruntime default)")
+    args = ap.parse_args()
+
+    config.ONNX_INTRA_OP_THREADS = args.threads
+    texts = load_texts(args.texts, args.batch)
+    report = {
+        "embed_model": config.EMBED_MODEL,
+        "rerank_model": config.RERANK_MODEL,
+        "threads": args.threads,
+        "embeddings": bench_embeddings(texts, args.batch, args.repeats),
+        "rerank": bench_rerank(texts, args.batch, args.repeats),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Compare recall@k and latency of quantized search against the unquantized baseline."""
+import argparse
+import json
+import pathlib
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "backend"))
+
+from qdrant_client.models import FieldCondition, Filter, MatchValue  # noqa: E402
+
+from services import config  # noqa: E402
+from services.chunk_store import point_texts  # noqa: E402
+from services.embeddings import embed  # noqa: E402
+from services.qdrant_store import client, search_params  # noqa: E402
+
+
+def sample_queries(space_id: Optional[str], n: int, words: int = 12) -> List[str]:
+    """Use the opening words of indexed chunks as realistic queries."""
+    flt = None
+    if space_id:
+        flt = Filter(must=[FieldCondition(key="space_id", match=MatchValue(value=space_id))])
+    points, _ = client().scroll(
+        collection_name=config.QDRANT_COLLECTION,
+        scroll_filter=flt,
+        limit=n,
+        with_payload=True,
+        with_vectors=False,
+    )
+    # LEAN_PAYLOADS: the text lives in the chunk store, not in the payload
+    return [" ".join(text.split()[:words]) for text in point_texts(points) if text]
+
+
+def run(vector, space_id: Optional[str], top_k: int, quantized: bool):
+    flt = None
+    if space_id:
+        flt = Filter(must=[FieldCondition(key="space_id", match=MatchValue(value=space_id))])
+    start = time.perf_counter()
+    hits = client().search(
+        collection_name=config.QDRANT_COLLECTION,
+        query_vector=vector,
+        query_filter=flt,
+        limit=top_k,
+        search_params=search_params(quantized),
+    )
+    latency = (time.perf_counter() - start) * 1000
+    return [str(h.id) for h in hits], latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("queries", nargs="*", help="Queries (default: sampled from indexed chunks)")
+    parser.add_argument("--space", help="Optional space_id")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=50, help="Queries to sample when none are given")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query for latency")
+    args = parser.parse_args()
+
+    queries = args.queries or sample_queries(args.space, args.sample)
+    if not queries:
+        print("No queries (collection empty?)")
+        return
+
+    recalls, base_lat, quant_lat = [], [], []
+    for q in queries:
+        vec = embed(q)
+        for _ in range(args.repeat):
+            base_ids, lat_b = run(vec, args.space, args.top_k, quantized=False)
+            quant_ids, lat_q = run(vec, args.space, args.top_k, quantized=True)
+            base_lat.append(lat_b)
+            quant_lat.append(lat_q)
+        if base_ids:
+            recalls.append(len(set(base_ids) & set(quant_ids)) / len(base_ids))
+
+    def pct(values, p):
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * p))], 2)
+
+    report = {
+        "collection": config.QDRANT_COLLECTION,
+        "quantization": config.QDRANT_QUANTIZATION,
+        "oversampling": config.QDRANT_QUANTIZATION_OVERSAMPLING,
+        "rescore": config.QDRANT_QUANTIZATION_RESCORE,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        f"recall@{args.top_k}": round(statistics.mean(recalls), 4) if recalls else None,
+        "baseline_latency_ms": {"p50": pct(base_lat, 0.5), "p95": pct(base_lat, 0.95)},
+        "quantized_latency_ms": {"p50": pct(quant_lat, 0.5), "p95": pct(quant_lat, 0.95)},
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend.services.chunk_store import ChunkStore, strip_text
+
+
+class ChunkStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ChunkStore(Path(self.tmp_dir) / "chunks.sqlite3")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_put_and_get_many(self):
+        self.store.put_many([
+            ("p1", "doc_1", "space", 0, "первый"),
+            ("p2", "doc_1", "space", 1, "второй"),
+        ])
+        self.assertEqual(self.store.get_many(["p2", "p1", "missing"]), {"p1": "первый", "p2": "второй"})
+
+    def test_put_replaces_and_delete_doc(self):
+        self.store.put_many([("p1", "doc_1", "space", 0, "old")])
+        self.store.put_many([("p1", "doc_1", "space", 0, "new"), ("p3", "doc_2", "space", 0, "other")])
+        self.assertEqual(self.store.get_many(["p1"]), {"p1": "new"})
+        self.assertEqual(self.store.delete_doc("doc_1"), 1)
+        self.assertEqual(self.store.get_many(["p1", "p3"]), {"p3": "other"})
+
+    def test_strip_text_keeps_original(self):
+        items = [{"key": "d:0", "payload": {"doc_id": "d", "text": "abc"}}]
+        stripped = strip_text(items)
+        self.assertNotIn("text", stripped[0]["payload"])
+        self.assertEqual(items[0]["payload"]["text"], "abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import chunk_summaries, config, summarization
+from backend.services.chunk_store import ChunkStore
+from backend.services.qdrant_store import chunk_point_id
+
+
+def _hit(doc_id, chunk_index, text):
+    return {"payload": {"doc_id": doc_id, "space_id": "space", "chunk_index": chunk_index, "text": text}}
+
+
+class ChunkSummariesTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ChunkStore(Path(self.tmp_dir) / "chunks.sqlite3")
+        summarization._map_semaphores.clear()
+        patches = [
+            mock.patch.object(chunk_summaries, "get_chunk_store", return_value=self.store),
+            mock.patch.object(config, "LLM_MODEL", "model-a"),
+            mock.patch.object(config, "SUMMARY_CACHE_ENABLED", False),
+            mock.patch.object(summarization, "calculate_dynamic_max_tokens", return_value=1000),
+            mock.patch.object(
+                summarization, "call_llm",
+                side_effect=lambda prompt, max_tokens=None: "short " + prompt.split("BODY-")[1].split()[0],
+            ),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_generate_and_lookup(self):
+        stored = asyncio.run(chunk_summaries.generate_chunk_summaries(
+            "space", "doc_1", [f"BODY-{i} long chunk text" for i in range(3)]
+        ))
+        self.assertEqual(stored, 3)
+        hits = [_hit("doc_1", 2, "x"), _hit("doc_1", 0, "y"), _hit("doc_2", 0, "z")]
+        self.assertEqual(chunk_summaries.lookup_chunk_summaries(hits), ["short 2", "short 0", None])
+
+    def test_model_change_makes_summaries_stale(self):
+        asyncio.run(chunk_summaries.generate_chunk_summaries("space", "doc_1", ["BODY-0 text"]))
+        with mock.patch.object(config, "LLM_MODEL", "model-b"):
+            self.assertEqual(chunk_summaries.lookup_chunk_summaries([_hit("doc_1", 0, "x")]), [None])
+
+    def test_failed_calls_are_not_stored(self):
+        with mock.patch.object(summarization, "call_llm", return_value="[LLM error: timeout]"):
+            stored = asyncio.run(chunk_summaries.generate_chunk_summaries("space", "doc_1", ["BODY-0 text"]))
+        self.assertEqual(stored, 0)
+
+    def test_vllm_errors_are_not_stored(self):
+        with mock.patch.object(summarization, "call_llm", return_value="[vLLM ошибка: timeout]"):
+            stored = asyncio.run(chunk_summaries.generate_chunk_summaries("space", "doc_1", ["BODY-0 text"]))
+        self.assertEqual(stored, 0)
+        self.assertEqual(chunk_summaries.lookup_chunk_summaries([_hit("doc_1", 0, "x")]), [None])
+
+    def test_reingest_drops_stale_summaries(self):
+        asyncio.run(chunk_summaries.generate_chunk_summaries(
+            "space", "doc_1", [f"BODY-{i} long chunk text" for i in range(3)]
+        ))
+        def reply(prompt, max_tokens=None):
+            return "new 0" if "BODY-0" in prompt else "[LLM error: timeout]"
+
+        with mock.patch.object(summarization, "call_llm", side_effect=reply):
+            stored = asyncio.run(chunk_summaries.generate_chunk_summaries(
+                "space", "doc_1", ["BODY-0 edited", "BODY-1 edited"]
+            ))
+        self.assertEqual(stored, 1)
+        hits = [_hit("doc_1", i, "x") for i in range(3)]
+        self.assertEqual(chunk_summaries.lookup_chunk_summaries(hits), ["new 0", None, None])
+
+    def test_context_falls_back_to_chunk_text(self):
+        hits = [_hit("doc_1", 0, "first chunk"), _hit("doc_1", 1, "second chunk")]
+        context = chunk_summaries.build_summary_context(hits, ["short 0", None])
+        self.assertEqual(
+            context,
+            "[Source: doc_1 chunk 0]\nshort 0\n\n---\n\n[Source: doc_1 chunk 1]\nsecond chunk",
+        )
+
+    def test_delete_doc_drops_summaries(self):
+        self.store.put_summaries([(chunk_point_id("space", "doc_1", 0), "v", "doc_1", "s")])
+        self.store.delete_doc("doc_1")
+        self.assertEqual(self.store.get_summaries([chunk_point_id("space", "doc_1", 0)], "v"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from backend.services.embed_batcher import EmbeddingBatcher
+
+
+class _RecordingEncoder:
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class EmbeddingBatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.encoder = _RecordingEncoder()
+
+    def _batcher(self, **kwargs):
+        batcher = EmbeddingBatcher(self.encoder, **kwargs)
+        self.addCleanup(batcher.stop)
+        return batcher
+
+    def test_concurrent_requests_share_one_batch(self):
+        batcher = self._batcher(window_ms=100, max_batch=8)
+        futures = [batcher.submit("q" * (i + 1)) for i in range(5)]
+        results = [f.result(timeout=5) for f in futures]
+
+        self.assertEqual(len(self.encoder.calls), 1)
+        self.assertEqual([r[0] for r in results], [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(batcher.stats()["max_batch"], 5)
+
+    def test_max_batch_splits_queue(self):
+        batcher = self._batcher(window_ms=50, max_batch=2)
+        futures = [batcher.submit(f"text {i}") for i in range(5)]
+        for f in futures:
+            f.result(timeout=5)
+
+        self.assertTrue(all(len(call) <= 2 for call in self.encoder.calls))
+        self.assertEqual(sum(len(call) for call in self.encoder.calls), 5)
+
+    def test_duplicate_texts_encoded_once(self):
+        batcher = self._batcher(window_ms=100, max_batch=8)
+        futures = [batcher.submit("same query") for _ in range(4)]
+        results = [f.result(timeout=5) for f in futures]
+
+        self.assertEqual(self.encoder.calls, [["same query"]])
+        self.assertEqual(len({tuple(r) for r in results}), 1)
+
+    def test_encoder_error_reaches_every_caller(self):
+        def failing(_texts):
+            raise RuntimeError("boom")
+
+        batcher = EmbeddingBatcher(failing, window_ms=20, max_batch=4)
+        self.addCleanup(batcher.stop)
+        futures = [batcher.submit("a"), batcher.submit("b")]
+        for f in futures:
+            with self.assertRaises(RuntimeError):
+                f.result(timeout=5)
+        # The scheduler keeps serving after a failed batch
+        batcher.encode_fn = self.encoder
+        self.assertEqual(batcher.embed("ok", timeout=5), [2.0, 1.0])
+
+    def test_cancelled_callers_are_skipped_and_scheduler_survives(self):
+        self.encoder.delay = 0.1
+        batcher = self._batcher(window_ms=50, max_batch=8)
+        gone, kept = batcher.submit("gone"), batcher.submit("kept")
+        self.assertTrue(gone.cancel())
+        self.assertEqual(kept.result(timeout=5), [4.0, 1.0])
+        self.assertEqual(self.encoder.calls, [["kept"]])
+
+        # Cancelling while the batch is being encoded is refused, not a crash
+        late = batcher.submit("late")
+        while len(self.encoder.calls) < 2:
+            time.sleep(0.005)
+        self.assertFalse(late.cancel())
+        self.assertEqual(late.result(timeout=5), [4.0, 1.0])
+        self.assertEqual(batcher.embed("after", timeout=5), [5.0, 1.0])
+
+    def test_async_callers(self):
+        batcher = self._batcher(window_ms=50, max_batch=8)
+
+        async def run():
+            return await asyncio.gather(*(batcher.embed_async(t) for t in ("a", "bb", "ccc")))
+
+        results = asyncio.run(run())
+        self.assertEqual([r[0] for r in results], [1.0, 2.0, 3.0])
+        self.assertEqual(len(self.encoder.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import config, keyword_index
+
+
+class _TempIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._orig_dirs = (keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR)
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR = Path(self._tmp.name) / "global"
+        keyword_index.KEYWORD_SPACE_INDEX_DIR = Path(self._tmp.name) / "spaces"
+        patcher = mock.patch.object(config, "KEYWORD_BATCH_WRITES", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR = self._orig_dirs
+        self._tmp.cleanup()
+
+
+class KeywordSearcherPoolTests(_TempIndexTestCase):
+    def test_reuses_searcher_and_sees_new_commits(self):
+        keyword_index.add_chunks("space", "d1", "note", ["квартальный отчет"])
+        self.assertEqual([h["key"] for h in keyword_index.search("отчет", "space", None)], ["d1:0"])
+
+        with keyword_index._get_partition(keyword_index.GLOBAL).searchers.searcher() as first:
+            pass
+        with keyword_index._get_partition(keyword_index.GLOBAL).searchers.searcher() as second:
+            self.assertIs(first, second)
+
+        keyword_index.add_chunks("space", "d2", "note", ["годовой отчет"])
+        keys = {h["key"] for h in keyword_index.search("отчет", "space", None)}
+        self.assertEqual(keys, {"d1:0", "d2:0"})
+        self.assertGreaterEqual(keyword_index._get_partition(keyword_index.GLOBAL).searchers.stats()["refreshes"], 1)
+
+    def test_doc_ids_restrict_search(self):
+        keyword_index.add_chunks("space", "d1", "note", ["квартальный отчет"])
+        keyword_index.add_chunks("space", "d2", "note", ["годовой отчет"])
+        hits = keyword_index.search("отчет", "space", None, doc_ids=["d2"])
+        self.assertEqual([h["key"] for h in hits], ["d2:0"])
+
+    def test_parsed_queries_are_cached(self):
+        keyword_index.add_chunks("space", "d1", "note", ["договор"])
+        keyword_index.search("договор", "space", ["note"])
+        self.assertIs(keyword_index._parse_query("договор"), keyword_index._parse_query("договор"))
+
+
+class KeywordPartitionTests(_TempIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, value in (("KEYWORD_PARTITION_BY_SPACE", True), ("KEYWORD_OPEN_INDEXES_MAX", 1)):
+            patcher = mock.patch.object(config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_space_queries_hit_own_partition_and_global_sees_all(self):
+        keyword_index.add_chunks("alpha", "a1", "note", ["бюджет проекта"])
+        keyword_index.add_chunks("beta team", "b1", "note", ["бюджет отдела"])
+
+        self.assertEqual([h["key"] for h in keyword_index.search("бюджет", "alpha", None)], ["a1:0"])
+        self.assertEqual([h["key"] for h in keyword_index.search("бюджет", "beta team", None)], ["b1:0"])
+        keys = {h["key"] for h in keyword_index.search("бюджет", None, None)}
+        self.assertEqual(keys, {"a1:0", "b1:0"})
+        # Only one space index stays open, the global one is pinned
+        self.assertLessEqual(len([k for k in keyword_index._partitions if k != keyword_index.GLOBAL]), 1)
+
+    def test_space_partition_picks_up_documents_indexed_before_partitioning(self):
+        with mock.patch.object(config, "KEYWORD_PARTITION_BY_SPACE", False):
+            keyword_index.add_chunks("alpha", "old", "note", ["бюджет прошлого года"])
+            keyword_index.add_chunks("beta", "other", "note", ["бюджет другого пространства"])
+
+        # A partition left by an older version (no copy, no marker): both indexes are searched
+        keyword_index._Partition("alpha", keyword_index._partition_path("alpha")).close()
+        self.assertFalse(keyword_index._get_partition("alpha", create=False).migrated)
+        self.assertEqual([h["key"] for h in keyword_index.search("бюджет", "alpha", None)], ["old:0"])
+
+        keyword_index.add_chunks("alpha", "new", "note", ["бюджет этого года"])
+        part = keyword_index._get_partition("alpha", create=False)
+        self.assertTrue(part.migrated)
+        with part.searchers.searcher() as s:
+            self.assertEqual(sorted(d["uid"] for d in s.all_stored_fields()), ["new:0", "old:0"])
+        keys = {h["key"] for h in keyword_index.search("бюджет", "alpha", None)}
+        self.assertEqual(keys, {"old:0", "new:0"})
+
+    def test_delete_before_migration_does_not_resurrect_document(self):
+        with mock.patch.object(config, "KEYWORD_PARTITION_BY_SPACE", False):
+            keyword_index.add_chunks("alpha", "old", "note", ["бюджет прошлого года"])
+
+        with mock.patch.object(config, "KEYWORD_GLOBAL_INDEX", False):
+            keyword_index.delete_doc("old", "alpha")
+            self.assertEqual(keyword_index.search("бюджет", "alpha", None), [])
+            keyword_index.add_chunks("alpha", "new", "note", ["бюджет этого года"])
+            self.assertEqual([h["key"] for h in keyword_index.search("бюджет", "alpha", None)], ["new:0"])
+
+    def test_fan_out_without_global_index(self):
+        with mock.patch.object(config, "KEYWORD_GLOBAL_INDEX", False):
+            keyword_index.add_chunks("alpha", "a1", "note", ["бюджет проекта"])
+            keyword_index.add_chunks("beta/team", "b1", "note", ["бюджет отдела"])
+            keys = {h["key"] for h in keyword_index.search("бюджет", None, None)}
+        self.assertEqual(keys, {"a1:0", "b1:0"})
+        self.assertEqual(keyword_index.search("бюджет", "unknown", None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
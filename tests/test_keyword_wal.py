@@ -0,0 +1,126 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import config, keyword_index
+from backend.services.keyword_wal import KeywordWAL, WALGapError
+
+
+class KeywordWALTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self._orig_dirs = (keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR)
+        keyword_index.close_all()
+        self._use_replica("a")
+        for name, value in (("KEYWORD_WAL_ENABLED", True), ("KEYWORD_BATCH_WRITES", False)):
+            patcher = mock.patch.object(config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR = self._orig_dirs
+        self._tmp.cleanup()
+
+    def _use_replica(self, name: str) -> KeywordWAL:
+        """Point the keyword index at this replica's local directories"""
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR = self.root / name / "index"
+        keyword_index.KEYWORD_SPACE_INDEX_DIR = self.root / name / "spaces"
+        return KeywordWAL(self.root / "wal", self.root / name / "position.json", segment_bytes=1024)
+
+    def _keys(self, q: str):
+        return {h["key"] for h in keyword_index.search(q, "space", None, top_k=50)}
+
+    def test_mutations_are_applied_in_log_order(self):
+        wal = self._use_replica("a")
+        wal.append("add", space_id="space", doc_id="d1", doc_type="note", chunks=["отчет о продажах"])
+        wal.append("add", space_id="space", doc_id="d2", doc_type="note", chunks=["отчет о закупках"])
+        wal.append("delete", space_id="space", doc_id="d1")
+        wal.append("update", space_id="space", doc_id="d2", doc_type="note", chunks=["новый отчет"])
+        self.assertEqual(wal.sync(), 4)
+        self.assertEqual(self._keys("отчет"), {"d2:0"})
+        self.assertEqual(self._keys("закупках"), set())
+        self.assertEqual(wal.sync(), 0)
+
+    def test_repeated_adds_in_one_batch_keep_the_last_version(self):
+        wal = self._use_replica("a")
+        wal.append("add", space_id="space", doc_id="d1", doc_type="note", chunks=["старый отчет"])
+        wal.append("add", space_id="space", doc_id="d1", doc_type="note", chunks=["новый отчет"])
+        self.assertEqual(wal.sync(), 2)
+        self.assertEqual(self._keys("отчет"), {"d1:0"})
+        self.assertEqual(len(keyword_index.search("отчет", "space", None, top_k=50)), 1)
+        self.assertEqual(self._keys("старый"), set())
+
+    def test_new_replica_bootstraps_from_snapshot_and_log(self):
+        wal_a = self._use_replica("a")
+        for i in range(30):
+            wal_a.append("add", space_id="space", doc_id=f"d{i}", doc_type="note", chunks=[f"документ номер {i}"])
+        wal_a.sync()
+        snapshot = wal_a.create_snapshot()
+        self.assertGreater(snapshot["segment"], 0)
+        wal_a.append("add", space_id="space", doc_id="late", doc_type="note", chunks=["документ после снимка"])
+
+        wal_b = self._use_replica("b")
+        applied = wal_b.sync()
+        self.assertEqual(applied, 1)
+        self.assertEqual(len(self._keys("документ")), 31)
+        self.assertFalse((self.root / "wal" / "log" / "000000000000.log").exists())
+
+    def test_lagging_replica_restores_snapshot_when_its_segment_was_pruned(self):
+        wal_b = self._use_replica("b")
+        wal_b.append("add", space_id="space", doc_id="first", doc_type="note", chunks=["первый документ"])
+        self.assertEqual(wal_b.sync(), 1)
+
+        wal_a = self._use_replica("a")
+        for i in range(30):
+            wal_a.append("add", space_id="space", doc_id=f"d{i}", doc_type="note", chunks=[f"документ номер {i}"])
+        wal_a.create_snapshot()
+        wal_a.append("add", space_id="space", doc_id="late", doc_type="note", chunks=["документ после снимка"])
+        self.assertFalse((self.root / "wal" / "log" / "000000000000.log").exists())
+
+        wal_b = self._use_replica("b")
+        self.assertEqual(wal_b.sync(), 1)
+        self.assertEqual(len(self._keys("документ")), 32)
+
+    def test_restore_swaps_directories_under_open_searchers(self):
+        wal_a = self._use_replica("a")
+        wal_a.append("add", space_id="space", doc_id="d1", doc_type="note", chunks=["документ из снимка"])
+        snapshot = self.root / "wal" / "snapshots" / wal_a.create_snapshot()["snapshot"]
+
+        wal_b = self._use_replica("b")
+        keyword_index.write_documents([("space", "local", "note", ["локальный документ"])])
+        with keyword_index._get_partition(keyword_index.GLOBAL).searchers.searcher() as held:
+            wal_b._restore_snapshot(snapshot)
+            # A searcher handed out before the swap keeps reading the old files
+            self.assertEqual(held.doc_count(), 1)
+        self.assertEqual(self._keys("документ"), {"d1:0"})
+        leftovers = [p.name for p in (self.root / "b").iterdir() if p.name.startswith(".")]
+        self.assertEqual(leftovers, [])
+
+    def test_pruned_segment_without_snapshot_fails_loudly(self):
+        wal = self._use_replica("a")
+        wal.append("add", space_id="space", doc_id="d1", doc_type="note", chunks=["отчет"])
+        self.assertEqual(wal.position(), (0, 0))
+        (self.root / "wal" / "log" / "000000000001.log").write_text("")
+        (self.root / "wal" / "log" / "000000000000.log").unlink()
+        with self.assertRaises(WALGapError):
+            wal.sync()
+        self.assertEqual(wal.position(), (0, 0))
+
+    def test_keyword_index_routes_writes_through_the_log(self):
+        wal = self._use_replica("a")
+        with mock.patch("backend.services.keyword_wal.get_wal", return_value=wal):
+            keyword_index.add_chunks("space", "d1", "note", ["квартальный отчет"])
+            self.assertEqual(self._keys("отчет"), set())
+            keyword_index.flush()
+            self.assertEqual(self._keys("отчет"), {"d1:0"})
+            keyword_index.delete_doc("d1", "space")
+            keyword_index.flush()
+        self.assertEqual(self._keys("отчет"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import keyword_index
+from backend.services.keyword_writer import KeywordWriter
+
+
+class KeywordWriterTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._orig_dirs = (keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR)
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR = Path(self._tmp.name) / "global"
+        keyword_index.KEYWORD_SPACE_INDEX_DIR = Path(self._tmp.name) / "spaces"
+
+    def tearDown(self):
+        keyword_index.close_all()
+        keyword_index.KEYWORD_INDEX_DIR, keyword_index.KEYWORD_SPACE_INDEX_DIR = self._orig_dirs
+        self._tmp.cleanup()
+
+    def test_groups_concurrent_submissions_into_few_commits(self):
+        writer = KeywordWriter(commit_interval_ms=200, commit_max_docs=100, merge_policy="none")
+
+        def submit(i):
+            writer.submit("space", f"doc{i}", "note", [f"общий термин документ номер {i}"])
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(writer.flush(timeout=10))
+        writer.stop()
+
+        stats = writer.stats()
+        self.assertEqual(stats["docs_committed"], 20)
+        self.assertEqual(stats["pending_docs"], 0)
+        self.assertLess(stats["commits"], 20)
+        hits = keyword_index.search("термин", "space", None, top_k=50)
+        self.assertEqual(len(hits), 20)
+
+    def test_resubmitted_document_is_indexed_once(self):
+        writer = KeywordWriter(commit_interval_ms=200, commit_max_docs=100, merge_policy="none")
+        writer.submit("space", "doc", "note", ["черновик отчета"])
+        writer.submit("space", "doc", "note", ["итоговая версия отчета"])
+        self.assertTrue(writer.flush(timeout=10))
+        writer.stop()
+
+        hits = keyword_index.search("отчета", "space", None, top_k=50)
+        self.assertEqual([h["key"] for h in hits], ["doc:0"])
+        self.assertEqual(keyword_index.search("черновик", "space", None, top_k=50), [])
+
+    def test_poison_document_is_dead_lettered(self):
+        dead_letter = Path(self._tmp.name) / "dead.jsonl"
+        writer = KeywordWriter(commit_interval_ms=10, merge_policy="none", max_attempts=3,
+                               retry_backoff_ms=1, dead_letter_path=dead_letter)
+        real_write = keyword_index.write_documents
+        calls = []
+
+        def write(docs, merge=True):
+            calls.append(len(docs))
+            if any(doc[1] == "bad" for doc in docs):
+                raise ValueError("unindexable")
+            return real_write(docs, merge=merge)
+
+        with mock.patch.object(keyword_index, "write_documents", side_effect=write):
+            writer.submit("space", "good", "note", ["годовой отчет"])
+            writer.submit("space", "bad", "note", ["годовой отчет"])
+            self.assertTrue(writer.flush(timeout=10))
+        writer.stop()
+
+        self.assertEqual(calls, [2, 2, 2, 1, 1])
+        self.assertEqual(writer.stats()["dead_letters"], 1)
+        self.assertEqual([h["key"] for h in keyword_index.search("отчет", "space", None)], ["good:0"])
+        record = json.loads(dead_letter.read_text(encoding="utf-8"))
+        self.assertEqual((record["doc_id"], record["chunks"]), ("bad", ["годовой отчет"]))
+
+    def test_merge_policy_reduces_segment_count(self):
+        writer = KeywordWriter(commit_interval_ms=10, commit_max_docs=1, merge_policy="optimize", max_segments=2)
+        for i in range(5):
+            writer.submit("space", f"doc{i}", "note", [f"текст {i}"])
+            writer.flush(timeout=10)
+        writer.stop()
+        self.assertGreater(writer.stats()["merges"], 0)
+        self.assertLessEqual(keyword_index.segment_count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
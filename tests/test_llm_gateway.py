@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from backend.services import config, rag
+from backend.services.llm_gateway import (
+    BACKGROUND,
+    INTERACTIVE,
+    STREAMING,
+    LLMGateway,
+    LLMOverloaded,
+    current_priority,
+    llm_priority,
+)
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+class LLMGatewayTests(unittest.TestCase):
+    def test_free_slot_goes_to_highest_priority(self):
+        gateway = LLMGateway(1, max_wait={})
+        token = gateway.acquire(BACKGROUND)
+        order = []
+
+        def request(priority):
+            with gateway.slot(priority):
+                order.append(priority)
+
+        threads = [threading.Thread(target=request, args=(p,)) for p in (BACKGROUND, STREAMING, INTERACTIVE)]
+        for i, thread in enumerate(threads):
+            thread.start()
+            _wait_for(lambda: len(gateway._waiting) == i + 1)
+        self.assertEqual(gateway.stats()["queued"], {"interactive": 1, "streaming": 1, "background": 1})
+
+        gateway.release(token)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(order, [INTERACTIVE, STREAMING, BACKGROUND])
+        self.assertEqual(gateway.in_flight, 0)
+
+    def test_wait_limit_rejects(self):
+        gateway = LLMGateway(1, max_wait={INTERACTIVE: 0.05})
+        gateway.acquire(BACKGROUND)
+        with self.assertRaises(LLMOverloaded):
+            gateway.acquire(INTERACTIVE)
+        self.assertEqual(gateway.stats()["rejected"]["interactive"], 1)
+        self.assertEqual(gateway._waiting, [])
+
+    def test_estimated_wait_rejects_up_front(self):
+        gateway = LLMGateway(1, max_wait={INTERACTIVE: 1})
+        gateway.ewma_service[INTERACTIVE] = 30.0
+        gateway.acquire(BACKGROUND)
+        waiter = threading.Thread(target=lambda: self.assertRaises(LLMOverloaded, gateway.acquire, INTERACTIVE))
+        waiter.start()
+        _wait_for(lambda: len(gateway._waiting) == 1)
+        start = time.monotonic()
+        with self.assertRaises(LLMOverloaded) as rejected:
+            gateway.acquire(INTERACTIVE)
+        self.assertIn("estimated wait", str(rejected.exception))
+        self.assertLess(time.monotonic() - start, 0.5)
+        waiter.join(2)
+
+    def test_slow_background_calls_do_not_reject_interactive_up_front(self):
+        gateway = LLMGateway(1, max_wait={INTERACTIVE: 0.5})
+        gateway.ewma_service[BACKGROUND] = 90.0
+        token = gateway.acquire(BACKGROUND)
+        threading.Timer(0.1, gateway.release, args=(token,)).start()
+        with gateway.slot(INTERACTIVE):
+            pass
+        self.assertEqual(gateway.stats()["rejected"]["interactive"], 0)
+
+    def test_priority_follows_to_thread(self):
+        async def run():
+            with llm_priority(BACKGROUND):
+                return await asyncio.to_thread(current_priority)
+
+        self.assertEqual(asyncio.run(run()), BACKGROUND)
+        self.assertEqual(current_priority(), INTERACTIVE)
+
+    def test_call_llm_reports_overload(self):
+        gateway = LLMGateway(1, max_wait={INTERACTIVE: 0.01})
+        gateway.acquire(BACKGROUND)
+        with mock.patch.object(rag, "get_llm_gateway", return_value=gateway), \
+                mock.patch.object(rag, "LLM_MODE", "vllm"), \
+                mock.patch.object(rag, "_call_backend") as backend:
+            answer = rag.call_llm("prompt")
+        self.assertTrue(answer.startswith("[LLM ошибка: перегрузка"))
+        backend.assert_not_called()
+
+    def test_disabled_gateway_calls_backend_directly(self):
+        with mock.patch.object(config, "LLM_GATEWAY_ENABLED", False), \
+                mock.patch.object(rag, "_call_backend", return_value="ok") as backend:
+            self.assertEqual(rag.call_llm("prompt", max_tokens=5), "ok")
+        backend.assert_called_once_with("prompt", 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from backend.services import config
+from backend.services.llm_router import LLMEndpoint, LLMRouter, LLMUnavailable, load_endpoints
+
+
+def _endpoints(*names):
+    return [LLMEndpoint(name=name, provider="vllm", url=f"http://{name}:8001/v1") for name in names]
+
+
+class LLMRouterTests(unittest.TestCase):
+    def test_least_outstanding_spreads_load(self):
+        router = LLMRouter(_endpoints("a", "b"))
+        first = router._pick([])
+        second = router._pick([])
+        self.assertNotEqual(first.name, second.name)
+
+    def test_ewma_prefers_faster_replica(self):
+        a, b = _endpoints("a", "b")
+        a.ewma_latency, b.ewma_latency = 4.0, 1.0
+        router = LLMRouter([a, b], strategy="ewma")
+        self.assertIs(router._pick([]), b)
+        b.in_flight = 5  # 1.0 * 6 > 4.0 * 1
+        self.assertIs(router._pick([]), a)
+
+    def test_failover_to_another_replica(self):
+        router = LLMRouter(_endpoints("a", "b"))
+        calls = []
+
+        def fn(endpoint):
+            calls.append(endpoint.name)
+            if endpoint.name == "a":
+                raise requests.exceptions.ConnectionError("refused")
+            return "answer"
+
+        with mock.patch.object(router, "_score", side_effect=lambda e: e.name):
+            self.assertEqual(router.call(fn), "answer")
+        self.assertEqual(calls, ["a", "b"])
+        self.assertEqual([e.in_flight for e in router.endpoints], [0, 0])
+
+    def test_client_errors_are_not_retried(self):
+        router = LLMRouter(_endpoints("a", "b"))
+        response = mock.Mock(status_code=400)
+        fn = mock.Mock(side_effect=requests.exceptions.HTTPError("bad request", response=response))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            router.call(fn)
+        self.assertEqual(fn.call_count, 1)
+
+    def test_circuit_opens_then_trial_request_closes_it(self):
+        a, b = _endpoints("a", "b")
+        router = LLMRouter([a, b], failure_threshold=2, cooldown_seconds=30)
+        failing = mock.Mock(side_effect=requests.exceptions.Timeout("slow"))
+        with mock.patch("backend.services.llm_router.time.time", return_value=1000.0):
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.Timeout):
+                    router.call(failing)
+            with self.assertRaises(LLMUnavailable):
+                router.call(failing)
+        self.assertEqual(failing.call_count, 4)
+
+        with mock.patch("backend.services.llm_router.time.time", return_value=1031.0):
+            self.assertEqual(router.call(lambda endpoint: "ok"), "ok")
+        self.assertIn((0.0, 0), [(e.open_until, e.consecutive_failures) for e in (a, b)])
+
+    def test_single_endpoint_never_opens(self):
+        a, = _endpoints("a")
+        router = LLMRouter([a], failure_threshold=2, health_opens_breaker=True)
+        failing = mock.Mock(side_effect=requests.exceptions.Timeout("slow"))
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.Timeout):
+                router.call(failing)
+        with mock.patch("backend.services.llm_router.requests.get",
+                        side_effect=requests.exceptions.ConnectionError("down")):
+            router.check_health()
+        self.assertEqual(failing.call_count, 3)
+        self.assertEqual(router.stats()["endpoints"]["a"]["state"], "closed")
+        self.assertEqual(router.call(lambda endpoint: "ok"), "ok")
+
+    def test_health_check_opens_and_closes_breaker(self):
+        a, b = _endpoints("a", "b")
+        router = LLMRouter([a, b], health_opens_breaker=True)
+
+        def fake_get(url, timeout):
+            if "//a:" in url:
+                raise requests.exceptions.ConnectionError("down")
+            return mock.Mock()
+
+        with mock.patch("backend.services.llm_router.requests.get", side_effect=fake_get) as get:
+            router.check_health()
+        self.assertEqual(get.call_args_list[1].args[0], "http://b:8001/health")
+        self.assertEqual(router.stats()["endpoints"]["a"]["state"], "open")
+        self.assertIs(router._pick([]), b)
+
+        with mock.patch("backend.services.llm_router.requests.get"):
+            router.check_health()
+        self.assertEqual(router.stats()["endpoints"]["a"]["state"], "closed")
+
+    def test_failed_health_check_does_not_open_breaker_by_default(self):
+        router = LLMRouter(_endpoints("a", "b"))
+        with mock.patch("backend.services.llm_router.requests.get",
+                        side_effect=requests.exceptions.ConnectionError("down")):
+            router.check_health()
+        self.assertEqual({e["state"] for e in router.stats()["endpoints"].values()}, {"closed"})
+
+
+class LoadEndpointsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = Path(self.tmp_dir) / "llm_models.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_filters_by_provider_and_model(self):
+        self.path.write_text(json.dumps({"models": [], "endpoints": [
+            {"name": "mig-1", "provider": "vllm", "url": "http://mig-1:8001/v1", "model": "m"},
+            {"name": "mig-2", "provider": "vllm", "url": "http://mig-2:8001/v1", "max_concurrency": 8},
+            {"name": "small", "provider": "vllm", "url": "http://small:8001/v1", "model": "other"},
+            {"name": "ollama", "provider": "ollama", "url": "http://ollama:11434"},
+        ]}))
+        endpoints = load_endpoints(self.path, "vllm", "m")
+        self.assertEqual([e.name for e in endpoints], ["mig-1", "mig-2"])
+        self.assertEqual(endpoints[1].max_concurrency, 8)
+
+    def test_falls_back_to_single_configured_url(self):
+        self.path.write_text(json.dumps({"models": [], "endpoints": []}))
+        with mock.patch.object(config, "LLM_OLLAMA_URL", "http://gpu-host:11434"):
+            endpoints = load_endpoints(self.path, "ollama", "llama3.1:8b")
+        self.assertEqual([e.url for e in endpoints], ["http://gpu-host:11434"])
+
+
+if __name__ == "__main__":
+    unittest.main()
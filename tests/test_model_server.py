@@ -0,0 +1,126 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from backend.services import config
+from backend.services.model_server import (
+    ModelClient,
+    ModelHost,
+    ModelServer,
+    RemoteClassifier,
+    RemoteCrossEncoder,
+    RemoteEmbedder,
+    _recv_msg,
+    _send_msg,
+    pack_array,
+    unpack_array,
+)
+
+
+class _FakeEmbedder:
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(t), 1.0, 2.0, 3.0] for t in texts], dtype=np.float32)
+
+
+class _FakeCrossEncoder:
+    def predict(self, pairs, batch_size=32):
+        return np.array([len(q) + len(t) for q, t in pairs], dtype=np.float32)
+
+
+class _FakeClassifier:
+    def predict(self, vectors):
+        return ["protocols" if v[0] > 0 else "unstructured" for v in vectors]
+
+
+class ArrayTransportTests(unittest.TestCase):
+    def test_small_arrays_inline(self):
+        arr = np.arange(6, dtype=np.float32).reshape(2, 3)
+        packed = pack_array(arr)
+        self.assertIn("b64", packed["__ndarray__"])
+        np.testing.assert_array_equal(unpack_array(packed), arr)
+
+    def test_large_arrays_use_shared_memory_once(self):
+        arr = np.random.rand(64, 384).astype(np.float32)
+        packed = pack_array(arr)
+        self.assertIn("shm", packed["__ndarray__"])
+        np.testing.assert_array_equal(unpack_array(packed), arr)
+        # The receiver unlinks the block after copying
+        self.assertFalse(os.path.exists(f"/dev/shm/{packed['__ndarray__']['shm']}"))
+
+
+class ModelServerTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "models.sock")
+        self.host = ModelHost(_FakeEmbedder(), _FakeCrossEncoder(), _FakeClassifier())
+        self.server = ModelServer(self.path, self.host)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = ModelClient(self.path, timeout=5)
+
+    def test_embed_single_and_batch(self):
+        embedder = RemoteEmbedder(self.client)
+        self.assertEqual(embedder.get_sentence_embedding_dimension(), 4)
+        self.assertEqual(embedder.encode("abc").tolist(), [3.0, 1.0, 2.0, 3.0])
+        # Force the shared-memory path for the batch result
+        with mock.patch.object(config, "MODEL_SERVER_SHM_MIN_BYTES", 1):
+            batch = embedder.encode(["a", "bb", "ccc"])
+        self.assertEqual(batch.shape, (3, 4))
+        self.assertEqual(batch[:, 0].tolist(), [1.0, 2.0, 3.0])
+
+    def test_rerank_and_classify(self):
+        scores = RemoteCrossEncoder(self.client).predict([("q", "ab"), ("qq", "abc")])
+        self.assertEqual(scores.tolist(), [3.0, 5.0])
+        labels = RemoteClassifier(self.client).predict([[1.0, 0.0], [-1.0, 0.0]])
+        self.assertEqual(labels, ["protocols", "unstructured"])
+
+    def test_server_errors_raise_in_client(self):
+        self.host.classifier = None
+        with self.assertRaises(RuntimeError):
+            RemoteClassifier(self.client).predict([[1.0]])
+        # The connection stays usable after an error reply
+        self.assertEqual(RemoteEmbedder(self.client).encode("x")[0], 1.0)
+
+    def test_reply_block_is_reaped_when_client_disconnects_without_unlinking(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        with mock.patch.object(config, "MODEL_SERVER_SHM_MIN_BYTES", 1):
+            _send_msg(sock, {"op": "embed", "texts": ["a", "bb"]})
+            reply = _recv_msg(sock)
+        block = f"/dev/shm/{reply['result']['__ndarray__']['shm']}"
+        self.assertTrue(os.path.exists(block))
+        sock.close()
+        deadline = time.monotonic() + 2
+        while os.path.exists(block) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(os.path.exists(block))
+
+    def test_concurrent_clients(self):
+        embedder = RemoteEmbedder(self.client)
+        results = {}
+
+        def worker(i):
+            results[i] = embedder.encode("x" * i)[0]
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(results, {i: float(i) for i in range(1, 9)})
+
+
+if __name__ == "__main__":
+    unittest.main()
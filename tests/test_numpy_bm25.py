@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend.services.numpy_bm25 import ArrayBM25Index
+
+
+class ArrayBM25IndexTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.index = ArrayBM25Index(self.root, max_segments=2)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_ranks_by_bm25_and_filters_by_space_and_type(self):
+        self.index.add_chunks("s1", "d1", "contract", ["договор поставки оборудования", "график платежей"])
+        self.index.add_chunks("s1", "d2", "report", ["отчет о выручке", "договор аренды договор"])
+        self.index.add_chunks("s2", "d3", "contract", ["договор подряда"])
+
+        keys = [r["key"] for r in self.index.search("договор", "s1", None, 5)]
+        self.assertEqual(keys, ["d2:1", "d1:0"])
+        keys = [r["key"] for r in self.index.search("договор", "s1", ["contract"], 5)]
+        self.assertEqual(keys, ["d1:0"])
+        self.assertEqual(self.index.search("договор", "missing", None, 5), [])
+
+    def test_reindex_replaces_document_and_survives_merge_and_reopen(self):
+        self.index.add_chunks("s", "d1", "note", ["старый текст"])
+        self.index.add_chunks("s", "d2", "note", ["другой документ"])
+        self.index.add_chunks("s", "d1", "note", ["новый текст"])
+        self.assertLessEqual(self.index.segment_count(), 2)
+
+        reopened = ArrayBM25Index(self.root, max_segments=2)
+        self.assertEqual(reopened.search("старый", "s", None, 5), [])
+        hits = reopened.search("текст", "s", None, 5)
+        self.assertEqual([h["key"] for h in hits], ["d1:0"])
+        self.assertEqual(hits[0]["payload"]["chunk_index"], 0)
+
+    def test_repeated_reindex_keeps_document_searchable(self):
+        self.index = ArrayBM25Index(self.root, max_segments=10)
+        self.index.add_chunks("s", "d1", "note", ["договор текст"])
+        self.index.add_chunks("s", "d2", "note", ["другое"])
+        for _ in range(3):
+            self.index.add_chunks("s", "d1", "note", ["договор текст"])
+        hits = self.index.search("договор", "s", None, 5)
+        self.assertEqual([h["key"] for h in hits], ["d1:0"])
+        self.assertGreater(hits[0]["score"], 0)
+
+    def test_doc_ids_restrict_search(self):
+        self.index.add_chunks("s", "d1", "note", ["договор поставки"])
+        self.index.add_chunks("s", "d2", "note", ["договор аренды"])
+        self.index.add_chunks("s", "d3", "note", ["договор подряда"])
+        keys = {r["key"] for r in self.index.search("договор", "s", None, 5, doc_ids=["d1", "d3"])}
+        self.assertEqual(keys, {"d1:0", "d3:0"})
+        self.assertEqual(self.index.search("договор", "s", None, 5, doc_ids=["missing"]), [])
+
+    def test_top_k_limits_results(self):
+        self.index.add_chunks("s", "d1", "note", [f"отчет номер {i}" for i in range(20)])
+        self.assertEqual(len(self.index.search("отчет", "s", None, 3)), 3)
+
+    def test_writers_sharing_a_directory_see_each_other(self):
+        other = ArrayBM25Index(self.root, max_segments=10)
+        self.index = ArrayBM25Index(self.root, max_segments=10)
+        self.index.add_chunks("s", "d1", "note", ["договор поставки"])
+        other.add_chunks("s", "d2", "note", ["договор аренды"])
+        self.index.add_chunks("s", "d3", "note", ["договор подряда"])
+
+        keys = {r["key"] for r in other.search("договор", "s", None, 5)}
+        self.assertEqual(keys, {"d1:0", "d2:0", "d3:0"})
+        other.delete_doc("d1")
+        keys = {r["key"] for r in self.index.search("договор", "s", None, 5)}
+        self.assertEqual(keys, {"d2:0", "d3:0"})
+        self.assertEqual(ArrayBM25Index(self.root).segment_count(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
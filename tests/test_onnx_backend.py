@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+
+def _real_module(name: str) -> bool:
+    # Other tests stub sentence_transformers in sys.modules; check for the real package
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ValueError:
+        return False
+
+
+_HAS_DEPS = all(_real_module(name) for name in ("torch", "onnxruntime", "transformers"))
+
+
+@unittest.skipUnless(
+    _HAS_DEPS and os.getenv("RUN_MODEL_TESTS", "false").lower() == "true",
+    "needs torch, onnxruntime and model downloads (RUN_MODEL_TESTS=true)",
+)
+class OnnxParityTests(unittest.TestCase):
+    TEXTS = [
+        "Договор поставки оборудования подписан 12 марта.",
+        "Quarterly revenue grew by 12 percent compared to last year.",
+        "Погода сегодня хорошая, солнечно и тепло.",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        from sentence_transformers import CrossEncoder, SentenceTransformer
+
+        from backend.services import config
+
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._patch = mock.patch.object(config, "ONNX_CACHE_DIR", Path(cls._tmp.name))
+        cls._patch.start()
+        cls.st = SentenceTransformer(config.EMBED_MODEL, device="cpu")
+        cls.ce = CrossEncoder(config.RERANK_MODEL, device="cpu")
+        cls.config = config
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._patch.stop()
+        cls._tmp.cleanup()
+
+    def _embedder(self, quantize: str):
+        from backend.services.onnx_backend import OnnxEmbedder
+
+        with mock.patch.object(self.config, "ONNX_QUANTIZE", quantize):
+            return OnnxEmbedder(self.config.EMBED_MODEL)
+
+    def _check_embeddings(self, quantize: str, min_cosine: float):
+        expected = self.st.encode(self.TEXTS)
+        actual = self._embedder(quantize).encode(self.TEXTS)
+        for a, b in zip(expected, actual):
+            cosine = float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+            self.assertGreaterEqual(cosine, min_cosine)
+
+    def test_fp32_embeddings_match_torch(self):
+        self._check_embeddings("none", 0.999)
+
+    def test_int8_embeddings_stay_close(self):
+        self._check_embeddings("int8", 0.98)
+
+    def test_rerank_order_matches_torch(self):
+        from backend.services.onnx_backend import OnnxCrossEncoder
+
+        query = "договор поставки"
+        pairs = [(query, text) for text in self.TEXTS]
+        expected = np.argsort(-self.ce.predict(pairs))
+        for quantize in ("none", "int8"):
+            with mock.patch.object(self.config, "ONNX_QUANTIZE", quantize):
+                actual = np.argsort(-OnnxCrossEncoder(self.config.RERANK_MODEL).predict(pairs))
+            self.assertEqual(list(expected), list(actual))
+
+
+if __name__ == "__main__":
+    unittest.main()
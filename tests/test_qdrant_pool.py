@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from backend.services import qdrant_pool
+
+
+class _FakeAsyncClient:
+    def __init__(self, **_kwargs):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncClientPoolTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(qdrant_pool, "AsyncQdrantClient", _FakeAsyncClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(qdrant_pool._async_clients.clear)
+
+    def test_client_of_closed_loop_is_dropped_and_closed(self):
+        async def get():
+            return qdrant_pool.get_async_client()
+
+        async def get_twice_and_settle():
+            first = qdrant_pool.get_async_client()
+            self.assertIs(qdrant_pool.get_async_client(), first)
+            await asyncio.sleep(0)
+            return first
+
+        old = asyncio.run(get())
+        current = asyncio.run(get_twice_and_settle())
+        self.assertIsNot(old, current)
+        self.assertTrue(old.closed)
+        self.assertFalse(current.closed)
+        self.assertEqual(len(qdrant_pool._async_clients), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
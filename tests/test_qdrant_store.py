@@ -0,0 +1,129 @@
+import asyncio
+import sys
+import types
+import unittest
+from unittest import mock
+
+
+class _DummySentenceTransformer:
+    def __init__(self, *_args, **_kwargs):
+        pass
+
+    def encode(self, text):
+        return [0.0]
+
+    def get_sentence_embedding_dimension(self):
+        return 384
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=_DummySentenceTransformer),
+)
+
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from backend.services import qdrant_store
+from backend.services.qdrant_store import chunk_point_id
+
+
+class ChunkPointIdTests(unittest.TestCase):
+    def test_stable_for_same_chunk(self):
+        self.assertEqual(chunk_point_id("space", "doc_1", 3), chunk_point_id("space", "doc_1", 3))
+
+    def test_differs_by_space_doc_and_index(self):
+        base = chunk_point_id("space", "doc_1", 0)
+        self.assertNotEqual(base, chunk_point_id("other", "doc_1", 0))
+        self.assertNotEqual(base, chunk_point_id("space", "doc_2", 0))
+        self.assertNotEqual(base, chunk_point_id("space", "doc_1", 1))
+
+
+class DocumentChunkIteratorTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        self.client.create_collection(
+            qdrant_store.QDRANT_COLLECTION, vectors_config=VectorParams(size=2, distance=Distance.COSINE)
+        )
+        # Inserted out of order, with another document in the same space
+        indexes = list(range(25))[::-1]
+        points = [
+            PointStruct(id=chunk_point_id("space", "doc_1", i), vector=[1.0, 0.0],
+                        payload={"doc_id": "doc_1", "space_id": "space", "chunk_index": i, "text": f"chunk {i}"})
+            for i in indexes
+        ]
+        points.append(PointStruct(id=chunk_point_id("space", "doc_2", 0), vector=[0.0, 1.0],
+                                  payload={"doc_id": "doc_2", "space_id": "space", "chunk_index": 0, "text": "other"}))
+        self.client.upsert(qdrant_store.QDRANT_COLLECTION, points=points)
+        patcher = mock.patch.object(qdrant_store, "client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pages_through_whole_document_in_order(self):
+        chunks = list(qdrant_store.iter_document_chunks("doc_1", "space", page_size=4))
+        self.assertEqual([i for i, _ in chunks], list(range(25)))
+        self.assertEqual(chunks[7], (7, "chunk 7"))
+
+    def test_index_range(self):
+        chunks = list(qdrant_store.iter_document_chunks("doc_1", "space", start=5, end=12, page_size=3))
+        self.assertEqual([i for i, _ in chunks], list(range(5, 12)))
+
+    def test_count_and_missing_document(self):
+        self.assertEqual(qdrant_store.count_document_chunks("doc_1", "space"), 25)
+        self.assertEqual(list(qdrant_store.iter_document_chunks("missing", "space")), [])
+
+    def test_search_filter_restricts_doc_ids(self):
+        points, _ = self.client.scroll(
+            qdrant_store.QDRANT_COLLECTION, scroll_filter=qdrant_store._search_filter("space", None, ["doc_2"]), limit=100
+        )
+        self.assertEqual({p.payload["doc_id"] for p in points}, {"doc_2"})
+
+    def test_reingest_with_fewer_chunks_drops_old_tail_and_legacy_points(self):
+        self.client.upsert(qdrant_store.QDRANT_COLLECTION, points=[
+            PointStruct(id=123, vector=[1.0, 0.0],
+                        payload={"doc_id": "doc_1", "space_id": "space", "chunk_index": 1, "text": "legacy"}),
+        ])
+        with mock.patch.object(qdrant_store.config, "LEAN_PAYLOADS", False), \
+                mock.patch.object(qdrant_store, "_point_vector", return_value=[1.0, 0.0]):
+            qdrant_store.upsert_chunks("space", "doc_1", "note", ["new 0", "new 1", "new 2"])
+        chunks = list(qdrant_store.iter_document_chunks("doc_1", "space"))
+        self.assertEqual(chunks, [(0, "new 0"), (1, "new 1"), (2, "new 2")])
+        self.assertEqual(qdrant_store.count_document_chunks("doc_2", "space"), 1)
+
+    def test_get_chunks_retrieves_by_point_id(self):
+        with mock.patch.object(qdrant_store.config, "CHUNK_STORE_PATH", mock.Mock(exists=lambda: False)), \
+                mock.patch.object(qdrant_store.config, "LEAN_PAYLOADS", False):
+            chunks = qdrant_store.get_chunks("space", "doc_1", [7, 2, 2, 99])
+        self.assertEqual([c["key"] for c in chunks], ["doc_1:2", "doc_1:7"])
+        self.assertEqual(chunks[1]["payload"]["text"], "chunk 7")
+        self.assertEqual(qdrant_store.get_chunks("space", "doc_1", []), [])
+
+    def test_delete_by_doc_removes_legacy_points(self):
+        self.client.upsert(qdrant_store.QDRANT_COLLECTION, points=[
+            PointStruct(id=123, vector=[1.0, 0.0], payload={"doc_id": "doc_1", "space_id": "space", "chunk_index": 0}),
+        ])
+        with mock.patch.object(qdrant_store.config, "CHUNK_STORE_PATH", mock.Mock(exists=lambda: False)), \
+                mock.patch.object(qdrant_store.config, "LEAN_PAYLOADS", False):
+            qdrant_store.delete_by_doc("doc_1", "space")
+        self.assertEqual(qdrant_store.count_document_chunks("doc_1", "space"), 0)
+        self.assertEqual(qdrant_store.count_document_chunks("doc_2", "space"), 1)
+
+    def test_async_iterator(self):
+        async def collect():
+            aclient = AsyncQdrantClient(location=":memory:")
+            await aclient.create_collection(
+                qdrant_store.QDRANT_COLLECTION, vectors_config=VectorParams(size=2, distance=Distance.COSINE)
+            )
+            points, _ = self.client.scroll(qdrant_store.QDRANT_COLLECTION, limit=100, with_vectors=True)
+            await aclient.upsert(qdrant_store.QDRANT_COLLECTION, points=[
+                PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points
+            ])
+            with mock.patch.object(qdrant_store, "async_client", mock.AsyncMock(return_value=aclient)):
+                return [i async for i, _ in qdrant_store.iter_document_chunks_async("doc_1", "space", page_size=6)]
+
+        self.assertEqual(asyncio.run(collect()), list(range(25)))
+
+
+if __name__ == "__main__":
+    unittest.main()
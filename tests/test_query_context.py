@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from backend.services import query_context
+from backend.services.query_context import QueryContext
+
+
+class QueryContextTests(unittest.TestCase):
+    def test_query_vector_computed_once(self):
+        with mock.patch.object(query_context, "embed_query", return_value=[1.0, 0.0]) as embed_query:
+            ctx = QueryContext("Договор поставки")
+            self.assertEqual(ctx.vector, [1.0, 0.0])
+            self.assertEqual(ctx.vector, [1.0, 0.0])
+        embed_query.assert_called_once_with("Договор поставки")
+
+    def test_async_vector_shared_with_sync_access(self):
+        async def fake_async(text):
+            return [0.5]
+
+        with mock.patch.object(query_context, "embed_query_async", side_effect=fake_async) as embed_async, \
+                mock.patch.object(query_context, "embed_query") as embed_query:
+            ctx = QueryContext("q")
+            self.assertEqual(asyncio.run(ctx.vector_async()), [0.5])
+            self.assertEqual(ctx.vector, [0.5])
+        embed_async.assert_called_once()
+        embed_query.assert_not_called()
+
+    def test_keywords_and_hash(self):
+        ctx = QueryContext("  Договор  ПОСТАВКИ ")
+        self.assertEqual(ctx.keywords, {"договор", "поставки"})
+        self.assertEqual(ctx.query_hash, QueryContext("договор поставки").query_hash)
+
+    def test_compress_memoized_per_text(self):
+        ctx = QueryContext("поставщик")
+        text = "Первое предложение. Поставщик обязан доставить товар. Третье."
+        with mock.patch.object(query_context, "compress_text", wraps=query_context.compress_text) as compress:
+            first = ctx.compress(text)
+            second = ctx.compress(text)
+        self.assertEqual(first, second)
+        self.assertIn("Поставщик", first)
+        compress.assert_called_once()
+
+    def test_text_vectors_batch_only_missing(self):
+        calls = []
+
+        def fake_batch(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        with mock.patch.object(query_context, "embed_batch", side_effect=fake_batch):
+            ctx = QueryContext("q")
+            self.assertEqual(ctx.text_vectors(["a", "bb", "a", ""]), [[1.0], [2.0], [1.0], []])
+            self.assertEqual(ctx.text_vectors(["bb", "ccc"]), [[2.0], [3.0]])
+        self.assertEqual(calls, [["a", "bb"], ["ccc"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -32,6 +32,72 @@ class DummyRerankTests(unittest.TestCase):
         result = rerank.apply_rerank("поставщик", candidates)
         self.assertEqual(result[0]["key"], "a")
 
+
+class RerankCacheAndCascadeTests(unittest.TestCase):
+    def setUp(self):
+        self.prev = {
+            name: getattr(config, name)
+            for name in ("RERANK_ENABLED", "RERANK_MAX_CANDIDATES", "RERANK_CASCADE_ENABLED", "RERANK_CACHE_ENABLED")
+        }
+        config.RERANK_ENABLED = True
+        config.RERANK_MAX_CANDIDATES = 8
+        config.RERANK_CACHE_ENABLED = True
+        rerank._score_cache.clear()
+        self.calls = []
+
+        def fake_scores(query, texts):
+            self.calls.append(list(texts))
+            return [float(len(t)) for t in texts]
+
+        rerank._predict_scores = fake_scores
+
+    def tearDown(self):
+        for name, value in self.prev.items():
+            setattr(config, name, value)
+        rerank._predict_scores = rerank._predict_scores_original
+        rerank._score_cache.clear()
+
+    def test_repeated_query_uses_score_cache(self):
+        config.RERANK_CASCADE_ENABLED = False
+        candidates = [
+            {"key": "a", "payload": {"text": "короткий"}},
+            {"key": "b", "payload": {"text": "гораздо более длинный текст"}},
+        ]
+        first = rerank.apply_rerank("текст", candidates)
+        second = rerank.apply_rerank("Текст ", candidates)
+        self.assertEqual([c["key"] for c in first], ["b", "a"])
+        self.assertEqual([c["key"] for c in second], ["b", "a"])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_cascade_scores_only_ambiguous_candidates(self):
+        config.RERANK_CASCADE_ENABLED = True
+        candidates = [
+            {"key": "full", "payload": {"text": "договор поставки подписан"}},
+            {"key": "partial", "payload": {"text": "договор аренды"}},
+            {"key": "p2", "payload": {"text": "поставки техники"}},
+            {"key": "none", "payload": {"text": "погода"}},
+        ]
+        result = rerank.apply_rerank("договор поставки", candidates)
+        self.assertEqual(result[0]["key"], "full")
+        self.assertEqual(result[-1]["key"], "none")
+        scored = [t for call in self.calls for t in call]
+        self.assertNotIn("погода", scored)
+        self.assertNotIn("договор поставки подписан", scored)
+
+    def test_batches_respect_token_budget(self):
+        prev_budget, prev_size = config.RERANK_BATCH_TOKEN_BUDGET, config.RERANK_BATCH_SIZE
+        config.RERANK_BATCH_TOKEN_BUDGET, config.RERANK_BATCH_SIZE = 100, 16
+        try:
+            texts = ["x" * 40] * 6 + ["y" * 400] * 2
+            batches = rerank._length_batches(texts)
+        finally:
+            config.RERANK_BATCH_TOKEN_BUDGET, config.RERANK_BATCH_SIZE = prev_budget, prev_size
+        self.assertEqual(sorted(i for b in batches for i in b), list(range(8)))
+        for batch in batches:
+            longest = max(len(texts[i]) // 4 for i in batch)
+            self.assertTrue(len(batch) == 1 or len(batch) * longest <= 100)
+
+
 if not hasattr(rerank, "_predict_scores_original"):
     rerank._predict_scores_original = rerank._predict_scores
 
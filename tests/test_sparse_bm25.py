@@ -0,0 +1,37 @@
+import unittest
+
+from backend.services import sparse_bm25
+
+
+class TokenizeTests(unittest.TestCase):
+    def test_lowercases_folds_yo_and_drops_stopwords(self):
+        self.assertEqual(
+            sparse_bm25.tokenize("Отчёт о выручке и the Revenue"),
+            ["отчет", "выручке", "revenue"],
+        )
+
+    def test_keeps_single_digits(self):
+        self.assertEqual(sparse_bm25.tokenize("версия 2 x"), ["версия", "2"])
+
+
+class EncodeTests(unittest.TestCase):
+    def test_document_weights_saturate_with_term_frequency(self):
+        indices, values = sparse_bm25.encode_document("договор договор договор поставка")
+        weights = dict(zip(indices, values))
+        repeated = weights[sparse_bm25.term_index("договор")]
+        single = weights[sparse_bm25.term_index("поставка")]
+        self.assertGreater(repeated, single)
+        self.assertLess(repeated, 3 * single)
+
+    def test_indices_sorted_and_query_weights_are_one(self):
+        indices, values = sparse_bm25.encode_query("revenue report revenue")
+        self.assertEqual(indices, sorted(indices))
+        self.assertEqual(len(indices), 2)
+        self.assertEqual(values, [1.0, 1.0])
+
+    def test_empty_text(self):
+        self.assertEqual(sparse_bm25.encode_document(""), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
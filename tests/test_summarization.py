@@ -0,0 +1,227 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from backend.services import config, summarization
+
+
+class _SlowLLM:
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, prompt, max_tokens=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        marker = prompt.split("CHUNK-")[1].split()[0] if "CHUNK-" in prompt else "final"
+        return f"summary {marker}"
+
+
+class MapPhaseConcurrencyTests(unittest.TestCase):
+    def setUp(self):
+        summarization._map_semaphores.clear()
+        patches = [
+            mock.patch.object(config, "LLM_MODE", "vllm"),
+            mock.patch.object(config, "SUMMARY_CACHE_ENABLED", False),
+            mock.patch.object(config, "SUMMARY_MAP_CONCURRENCY_VLLM", 4),
+            mock.patch.object(summarization, "calculate_dynamic_max_tokens", return_value=1000),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_map_runs_in_parallel_up_to_limit(self):
+        llm = _SlowLLM()
+        texts = [f"CHUNK-{i} body" for i in range(8)]
+
+        async def run():
+            return [item async for item in summarization.map_summaries(texts, max_summary_tokens=100)]
+
+        with mock.patch.object(summarization, "call_llm", llm):
+            started = time.perf_counter()
+            results = asyncio.run(run())
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(llm.peak, 4)
+        # 8 calls of 0.2s with 4 in flight ≈ 0.4s instead of 1.6s sequentially
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(sorted(i for i, _, _ in results), list(range(8)))
+        for index, summary, _ in results:
+            self.assertEqual(summary, f"summary {index}")
+
+    def test_ollama_limit_is_sequential_by_default(self):
+        llm = _SlowLLM(delay=0.05)
+        texts = [f"CHUNK-{i} body" for i in range(3)]
+
+        async def run():
+            return [item async for item in summarization.map_summaries(texts, max_summary_tokens=100)]
+
+        with mock.patch.object(config, "LLM_MODE", "ollama"), \
+                mock.patch.object(config, "SUMMARY_MAP_CONCURRENCY_OLLAMA", 1), \
+                mock.patch.object(summarization, "call_llm", llm):
+            asyncio.run(run())
+        self.assertEqual(llm.peak, 1)
+
+    def test_long_text_keeps_document_order(self):
+        llm = _SlowLLM(delay=0.01)
+        chunks = [f"CHUNK-{i} body" for i in range(5)]
+        with mock.patch.object(summarization, "call_llm", llm), \
+                mock.patch.object(summarization, "split_text_by_tokens", return_value=chunks), \
+                mock.patch.object(summarization, "count_tokens_simple", side_effect=lambda t: 10 if t.startswith("Part") else 10_000):
+            result = asyncio.run(summarization.summarize_long_text("x", chunk_size=8000))
+        # Combined summaries are short: returned as-is in document order
+        self.assertEqual(result, "\n\n".join(f"Part {i + 1}: summary {i}" for i in range(5)))
+
+
+class TreeReduceTests(unittest.TestCase):
+    def setUp(self):
+        summarization._map_semaphores.clear()
+        summarization._node_cache.clear()
+        patches = [
+            mock.patch.object(config, "LLM_MODE", "vllm"),
+            mock.patch.object(config, "SUMMARY_CACHE_ENABLED", False),
+            mock.patch.object(config, "SUMMARY_MAP_CONCURRENCY_VLLM", 4),
+            mock.patch.object(summarization, "calculate_dynamic_max_tokens", return_value=1000),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.prompts = []
+
+        def fake_llm(prompt, max_tokens=None):
+            self.prompts.append(prompt)
+            return f"merged {prompt.count('Part ') + prompt.count('Section ')} parts"
+
+        llm_patch = mock.patch.object(summarization, "call_llm", side_effect=fake_llm)
+        llm_patch.start()
+        self.addCleanup(llm_patch.stop)
+
+    def _parts(self, n):
+        return [f"Part {i + 1}: " + " ".join(["word"] * 100) for i in range(n)]
+
+    def test_groups_fit_budget_and_depth_is_logarithmic(self):
+        result = asyncio.run(summarization.tree_reduce(self._parts(40), batch_tokens=450))
+
+        self.assertTrue(result.startswith("merged"))
+        # 40 parts, 4 per node: 10 level-1 nodes whose short outputs fit one final node
+        self.assertEqual(len(self.prompts), 10 + 1)
+        self.assertEqual(self.prompts[-1].count("Section "), 10)
+        for prompt in self.prompts[:10]:
+            self.assertLessEqual(prompt.count("Part "), 4)
+
+    def test_small_input_is_a_single_reduce(self):
+        asyncio.run(summarization.tree_reduce(self._parts(3), batch_tokens=10_000))
+        self.assertEqual(len(self.prompts), 1)
+
+    def test_nodes_are_cached_by_content(self):
+        parts = self._parts(12)
+        first = asyncio.run(summarization.tree_reduce(parts, batch_tokens=450))
+        calls = len(self.prompts)
+        second = asyncio.run(summarization.tree_reduce(parts, batch_tokens=450))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), calls)
+        # Changing the focus changes every node
+        asyncio.run(summarization.tree_reduce(parts, batch_tokens=450, focus="сроки"))
+        self.assertGreater(len(self.prompts), calls)
+
+
+def _fake_chunks(n):
+    """Stand-in for qdrant_store.iter_document_chunks_async over a document of n chunks"""
+    async def iterate(doc_id, space_id, start=0, end=None, page_size=None):
+        for i in range(start, n if end is None else min(end, n)):
+            yield i, f"CHUNK-{i} " + " ".join(["word"] * 99)
+    return iterate
+
+
+class StreamedDocumentTests(unittest.TestCase):
+    def setUp(self):
+        summarization._map_semaphores.clear()
+        summarization._node_cache.clear()
+        patches = [
+            mock.patch.object(config, "LLM_MODE", "vllm"),
+            mock.patch.object(config, "SUMMARY_CACHE_ENABLED", False),
+            mock.patch.object(config, "SUMMARY_MAP_CONCURRENCY_VLLM", 4),
+            mock.patch.object(config, "SUMMARY_REDUCE_MODE", "flat"),
+            mock.patch.object(summarization, "calculate_dynamic_max_tokens", return_value=1000),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.prompts = []
+
+        def fake_llm(prompt, max_tokens=None):
+            self.prompts.append(prompt)
+            return "summary " + (prompt.split("CHUNK-")[1].split()[0] if "CHUNK-" in prompt else "final")
+
+        llm_patch = mock.patch.object(summarization, "call_llm", side_effect=fake_llm)
+        llm_patch.start()
+        self.addCleanup(llm_patch.stop)
+
+    def test_pack_windows_follows_chunk_boundaries(self):
+        async def run():
+            return [w async for w in summarization.pack_windows(_fake_chunks(10)("d", "s"), window_tokens=300)]
+
+        windows = asyncio.run(run())
+        self.assertEqual(len(windows), 4)
+        self.assertTrue(windows[0].startswith("CHUNK-0 ") and "CHUNK-2 " in windows[0])
+        self.assertTrue(windows[-1].startswith("CHUNK-9 "))
+
+    def test_map_consumes_stream_lazily(self):
+        pulled = []
+        finished = []
+
+        async def source():
+            for i in range(12):
+                pulled.append(i)
+                # Never more than map_concurrency() windows ahead of completed calls
+                self.assertLessEqual(len(pulled) - len(finished), 5)
+                yield f"CHUNK-{i} body"
+
+        async def run():
+            async for index, _, _ in summarization.map_summaries(source(), max_summary_tokens=100):
+                finished.append(index)
+
+        asyncio.run(run())
+        self.assertEqual(sorted(finished), list(range(12)))
+
+    def test_document_beyond_first_scroll_page_is_fully_summarized(self):
+        # 1500 chunks: the old single scroll(limit=1000) dropped the tail
+        with mock.patch("backend.services.qdrant_store.iter_document_chunks_async", _fake_chunks(1500)):
+            asyncio.run(summarization.summarize_document_by_id("doc", "space"))
+
+        # 80 chunks of 100 words per 8000-word window -> 19 MAP calls
+        self.assertEqual(sum("CHUNK-" in p for p in self.prompts), 19)
+        self.assertTrue(any("CHUNK-1499 " in p for p in self.prompts))
+
+    def test_missing_document(self):
+        with mock.patch("backend.services.qdrant_store.iter_document_chunks_async", _fake_chunks(0)):
+            result = asyncio.run(summarization.summarize_document_by_id("doc", "space"))
+        self.assertIn("not found", result)
+
+    def test_streaming_reads_windows_by_chunk_range(self):
+        async def run():
+            return [e async for e in summarization.summarize_document_streaming("doc", "space")]
+
+        with mock.patch("backend.services.qdrant_store.iter_document_chunks_async", _fake_chunks(300)):
+            events = asyncio.run(run())
+
+        start = events[0]
+        self.assertEqual(start["total_chunks"], 300)
+        self.assertEqual(start["strategy"], "map_reduce")
+        partials = [e for e in events if e["type"] == "partial_summary"]
+        self.assertEqual(len(partials), start["map_chunks"])
+        self.assertEqual(events[-1]["type"], "complete")
+        self.assertTrue(any("CHUNK-299 " in p for p in self.prompts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import config, summarization, summary_cache
+from backend.services.summary_cache import SummaryCache, document_key, normalize_focus
+
+
+def _fake_chunks(n):
+    async def iterate(doc_id, space_id, start=0, end=None, page_size=None):
+        for i in range(start, n if end is None else min(end, n)):
+            yield i, f"CHUNK-{i} " + " ".join(["word"] * 99)
+    return iterate
+
+
+class SummaryCacheStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_put_get_and_ttl(self):
+        cache = SummaryCache(Path(self.tmp_dir) / "cache.sqlite3", ttl_seconds=60)
+        cache.put("k", "document", "summary")
+        self.assertEqual(cache.get("k"), "summary")
+        with mock.patch("backend.services.summary_cache.time.time", return_value=10 ** 12):
+            self.assertIsNone(cache.get("k"))
+        cache.close()
+
+    def test_put_purges_expired_rows(self):
+        cache = SummaryCache(Path(self.tmp_dir) / "cache.sqlite3", ttl_seconds=60)
+        with mock.patch("backend.services.summary_cache.time.time", return_value=1000.0):
+            cache.put("old", "partial", "stale")
+        with mock.patch("backend.services.summary_cache.time.time", return_value=1100.0):
+            cache.put("new", "partial", "fresh")
+        self.assertEqual(cache.stats()["entries"], {"partial": 1})
+        self.assertEqual(cache.stats()["purged"], 1)
+        cache.close()
+
+    def test_key_normalizes_focus_and_tracks_model(self):
+        self.assertEqual(normalize_focus("  Сроки   Проекта "), "сроки проекта")
+        self.assertEqual(document_key("h", "Сроки  проекта"), document_key("h", "сроки проекта"))
+        key = document_key("h", None)
+        with mock.patch.object(config, "LLM_MODEL", "other-model"):
+            self.assertNotEqual(document_key("h", None), key)
+        with mock.patch.object(summary_cache, "PROMPT_VERSION", "2"):
+            self.assertNotEqual(document_key("h", None), key)
+
+
+class CachedSummarizationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = SummaryCache(Path(self.tmp_dir) / "cache.sqlite3")
+        summarization._map_semaphores.clear()
+        summarization._node_cache.clear()
+        patches = [
+            mock.patch.object(config, "LLM_MODE", "vllm"),
+            mock.patch.object(config, "SUMMARY_REDUCE_MODE", "flat"),
+            mock.patch.object(summarization, "get_summary_cache", return_value=self.cache),
+            mock.patch.object(summarization, "calculate_dynamic_max_tokens", return_value=1000),
+            mock.patch("backend.services.qdrant_store.iter_document_chunks_async", _fake_chunks(300)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.prompts = []
+
+        def fake_llm(prompt, max_tokens=None):
+            self.prompts.append(prompt)
+            return "summary " + (prompt.split("CHUNK-")[1].split()[0] if "CHUNK-" in prompt else "final")
+
+        llm_patch = mock.patch.object(summarization, "call_llm", side_effect=fake_llm)
+        llm_patch.start()
+        self.addCleanup(llm_patch.stop)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_identical_content_under_new_doc_id_is_served_from_cache(self):
+        first = asyncio.run(summarization.summarize_document_by_id("doc_a", "space"))
+        calls = len(self.prompts)
+        second = asyncio.run(summarization.summarize_document_by_id("doc_b", "space"))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), calls)
+
+    def test_new_focus_reuses_unfocused_map_partials(self):
+        asyncio.run(summarization.summarize_document_by_id("doc_a", "space"))
+        map_calls = len(self.prompts)
+        self.assertTrue(all("Focus specifically" not in p for p in self.prompts))
+
+        asyncio.run(summarization.summarize_document_by_id("doc_a", "space", focus="сроки"))
+        # Only the focused REDUCE runs; every MAP window comes from the cache
+        self.assertEqual(len(self.prompts), map_calls + 1)
+        self.assertIn("Focus specifically on: сроки", self.prompts[-1])
+
+        asyncio.run(summarization.summarize_document_by_id("doc_a", "space", focus="  Сроки "))
+        self.assertEqual(len(self.prompts), map_calls + 1)
+
+    def test_query_time_map_keeps_focus(self):
+        chunks = [{"payload": {"doc_id": "doc_a", "chunk_index": i, "text": f"CHUNK-{i} " + " ".join(["word"] * 99)}}
+                  for i in range(6)]
+        with mock.patch.object(summarization, "get_current_model_config",
+                               return_value=mock.Mock(context_window=400)):
+            asyncio.run(summarization.summarize_chunks(chunks, query="сроки"))
+        map_prompts = [p for p in self.prompts if "CHUNK-" in p]
+        self.assertTrue(map_prompts)
+        self.assertTrue(all("Focus specifically on: сроки" in p for p in map_prompts))
+
+    def test_vllm_errors_are_not_cached(self):
+        with mock.patch.object(summarization, "call_llm", return_value="[vLLM ошибка: timeout]"):
+            summary = asyncio.run(summarization.summarize_document_by_id("doc_a", "space"))
+        self.assertTrue(summarization._is_failed(summary))
+        self.assertEqual(self.cache.stats()["entries"], {})
+
+    def test_streaming_hits_cache(self):
+        async def run():
+            return [e async for e in summarization.summarize_document_streaming("doc_a", "space")]
+
+        events = asyncio.run(run())
+        self.assertEqual(events[-1]["type"], "complete")
+        calls = len(self.prompts)
+        events = asyncio.run(run())
+        self.assertEqual([e["type"] for e in events], ["cached"])
+        self.assertEqual(len(self.prompts), calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
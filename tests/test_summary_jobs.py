@@ -0,0 +1,150 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from backend.services import summary_jobs
+from backend.services.llm_gateway import BACKGROUND, STREAMING, current_priority
+from backend.services.summary_jobs import PRIORITY_BULK, PRIORITY_INTERACTIVE, SummaryJobQueue
+
+
+class SummaryJobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = Path(self.tmp_dir) / "jobs.sqlite3"
+        self.runs = []
+        self.queue = self._queue(self._run)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _queue(self, run_fn, **kwargs):
+        return SummaryJobQueue(self.path, run_fn, max_attempts=2, backoff_seconds=10, **kwargs)
+
+    def _run(self, job, report):
+        self.runs.append(job["doc_id"])
+        report(50, "map")
+        return f"summary of {job['doc_id']}"
+
+    def test_duplicate_enqueue_returns_active_job(self):
+        job, created = self.queue.enqueue("d1", "space", priority=PRIORITY_BULK)
+        again, created_again = self.queue.enqueue("d1", "space", priority=PRIORITY_INTERACTIVE)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again["id"], job["id"])
+        self.assertEqual(self.queue.get(job["id"])["priority"], PRIORITY_INTERACTIVE)
+
+        # A different focus is a different job
+        _, created_focus = self.queue.enqueue("d1", "space", focus="сроки")
+        self.assertTrue(created_focus)
+
+    def test_runs_by_priority_and_records_result(self):
+        bulk, _ = self.queue.enqueue("bulk", "space", priority=PRIORITY_BULK)
+        urgent, _ = self.queue.enqueue("urgent", "space", priority=PRIORITY_INTERACTIVE)
+        while self.queue.run_once():
+            pass
+        self.assertEqual(self.runs, ["urgent", "bulk"])
+        done = self.queue.get(bulk["id"])
+        self.assertEqual((done["status"], done["progress"], done["result"]), ("done", 100, "summary of bulk"))
+
+        # A finished job no longer blocks a new one for the same document
+        _, created = self.queue.enqueue("bulk", "space")
+        self.assertTrue(created)
+
+    def test_retry_with_backoff_then_fail(self):
+        queue = self._queue(mock.Mock(side_effect=RuntimeError("LLM down")))
+        with mock.patch("backend.services.summary_jobs.time.time", return_value=1000.0):
+            job, _ = queue.enqueue("d1", "space")
+            self.assertTrue(queue.run_once())
+            retry = queue.get(job["id"])
+            self.assertEqual((retry["status"], retry["attempts"], retry["run_after"]), ("queued", 1, 1010.0))
+            self.assertFalse(queue.run_once())  # backoff not elapsed
+        with mock.patch("backend.services.summary_jobs.time.time", return_value=1011.0):
+            self.assertTrue(queue.run_once())
+        failed = queue.get(job["id"])
+        self.assertEqual((failed["status"], failed["attempts"], failed["error"]), ("failed", 2, "LLM down"))
+
+    def test_interrupted_jobs_resume_after_restart(self):
+        with mock.patch("backend.services.summary_jobs.time.time", return_value=1000.0):
+            job, _ = self.queue.enqueue("d1", "space")
+            self.queue._claim()  # lease ran out long ago: the owner died
+        self.queue.close()
+
+        restarted = self._queue(self._run, workers=1)
+        restarted.start()
+        try:
+            for _ in range(200):
+                if restarted.get(job["id"])["status"] == "done":
+                    break
+                restarted._wake.wait(0.01)
+        finally:
+            restarted.stop()
+        self.assertEqual(restarted.get(job["id"])["status"], "done")
+        self.assertEqual(restarted.stats()["jobs"], {"done": 1})
+        restarted.close()
+
+    def test_processes_sharing_the_file_claim_each_job_once(self):
+        self.queue.enqueue("d1", "space")
+        self.queue.enqueue("d2", "space")
+        other = self._queue(self._run)
+        try:
+            first, _ = self.queue._claim()
+            second, _ = other._claim()
+            self.assertNotEqual(first["id"], second["id"])
+            # The live lease keeps the running job from being taken over
+            self.assertEqual(other._claim(), (None, mock.ANY))
+            self.assertEqual(self.queue._claim(), (None, mock.ANY))
+        finally:
+            other.close()
+
+    def test_expired_lease_is_taken_over_and_stale_owner_cannot_finish(self):
+        other = self._queue(self._run, lease_seconds=60)
+        try:
+            with mock.patch("backend.services.summary_jobs.time.time", return_value=1000.0):
+                job, _ = self.queue.enqueue("d1", "space")
+                self.queue._claim()
+            taken, _ = other._claim()
+            self.assertEqual((taken["id"], taken["attempts"]), (job["id"], 2))
+            self.queue._update(job["id"], status="failed")
+            self.assertEqual(other.get(job["id"])["status"], "running")
+            other._execute(taken)
+            self.assertEqual(other.get(job["id"])["status"], "done")
+        finally:
+            other.close()
+
+    def test_focused_job_does_not_overwrite_stored_summary(self):
+        async def fake_stream(doc_id, space_id, focus=None):
+            yield {"type": "start", "total_chunks": 3, "progress": 0}
+            yield {"type": "progress", "stage": "map", "progress": 40}
+            yield {"type": "summary", "text": f"focused on {focus}", "progress": 100}
+
+        reports = []
+        job = {"doc_id": "d1", "space_id": "space", "doc_type": None, "focus": "сроки"}
+        with mock.patch("backend.services.summarization.summarize_document_streaming", fake_stream), \
+                mock.patch("backend.services.summary_store.save_document_summary") as save:
+            summary = summary_jobs.run_summary_job(job, lambda p, s: reports.append((p, s)))
+        self.assertEqual(summary, "focused on сроки")
+        self.assertIn((40, "map"), reports)
+        save.assert_not_called()
+
+    def test_job_priority_selects_gateway_class_and_llm_errors_fail_the_job(self):
+        seen = []
+
+        async def fake_stream(doc_id, space_id, focus=None):
+            seen.append(current_priority())
+            yield {"type": "summary", "text": "[vLLM ошибка: connection refused]", "progress": 100}
+
+        with mock.patch("backend.services.summarization.summarize_document_streaming", fake_stream), \
+                mock.patch("backend.services.summary_store.save_document_summary") as save:
+            for priority in (PRIORITY_INTERACTIVE, PRIORITY_BULK):
+                job = {"doc_id": "d1", "space_id": "space", "doc_type": None, "focus": "", "priority": priority}
+                with self.assertRaises(RuntimeError):
+                    summary_jobs.run_summary_job(job, lambda p, s: None)
+        self.assertEqual(seen, [STREAMING, BACKGROUND])
+        save.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from unittest import mock
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from backend.services import config, summary_store
+
+_TOPICS = ("бюджет", "договор", "отпуск")
+
+
+def _fake_embed(text):
+    return [text.count(topic) + 0.01 for topic in _TOPICS]
+
+
+class SummaryVectorTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        patches = [
+            mock.patch.object(summary_store, "get_client", return_value=self.client),
+            mock.patch.object(summary_store, "ensure_summary_collection",
+                              side_effect=summary_store._bootstrap_summary_collection),
+            mock.patch.object(summary_store, "dim", return_value=len(_TOPICS)),
+            mock.patch.object(summary_store, "embed", side_effect=_fake_embed),
+            mock.patch.object(summary_store, "embed_batch", side_effect=lambda texts: [_fake_embed(t) for t in texts]),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_search_finds_documents_by_summary(self):
+        summary_store.save_document_summary("d1", "space", "бюджет отдела на год, бюджет")
+        summary_store.save_document_summary("d2", "space", "договор поставки")
+        summary_store.save_document_summary("d3", "other", "бюджет другого пространства")
+
+        hits = summary_store.search_summaries(_fake_embed("бюджет"), "space", top_n=1)
+        self.assertEqual([h["doc_id"] for h in hits], ["d1"])
+        hits = summary_store.search_summaries(_fake_embed("договор"), "space", top_n=5)
+        self.assertEqual(hits[0]["doc_id"], "d2")
+        self.assertEqual({h["doc_id"] for h in hits}, {"d1", "d2"})
+
+    def test_update_replaces_vector(self):
+        summary_store.save_document_summary("d1", "space", "бюджет")
+        summary_store.save_document_summary("d1", "space", "отпуск сотрудников")
+        hits = summary_store.search_summaries(_fake_embed("отпуск"), "space", top_n=5)
+        self.assertEqual(len(hits), 1)
+        self.assertGreater(hits[0]["score"], 0.9)
+
+    def test_legacy_dummy_vectors_are_reembedded(self):
+        self.client.create_collection(
+            summary_store.SUMMARY_COLLECTION, vectors_config=VectorParams(size=1, distance=Distance.COSINE)
+        )
+        self.client.upsert(summary_store.SUMMARY_COLLECTION, points=[
+            PointStruct(id=1, vector=[0.0], payload={"doc_id": "old", "space_id": "space", "summary": "договор аренды"}),
+        ])
+        summary_store._bootstrap_summary_collection()
+
+        info = self.client.get_collection(summary_store.SUMMARY_COLLECTION)
+        self.assertEqual(info.config.params.vectors.size, len(_TOPICS))
+        hits = summary_store.search_summaries(_fake_embed("договор"), "space")
+        self.assertEqual([h["doc_id"] for h in hits], ["old"])
+        self.assertEqual(summary_store.get_document_summary("old", "space")["summary"], "договор аренды")
+
+    def test_failed_reembedding_keeps_existing_summaries(self):
+        self.client.create_collection(
+            summary_store.SUMMARY_COLLECTION, vectors_config=VectorParams(size=1, distance=Distance.COSINE)
+        )
+        self.client.upsert(summary_store.SUMMARY_COLLECTION, points=[
+            PointStruct(id=1, vector=[0.0], payload={"doc_id": "old", "space_id": "space", "summary": "договор аренды"}),
+        ])
+        with mock.patch.object(summary_store, "embed_batch", side_effect=RuntimeError("embedding server down")):
+            with self.assertRaises(RuntimeError):
+                summary_store._bootstrap_summary_collection()
+        self.assertEqual(self.client.count(summary_store.SUMMARY_COLLECTION).count, 1)
+
+        # The retry rebuilds the new collection and switches the name over
+        summary_store._bootstrap_summary_collection()
+        self.assertEqual(self.client.get_aliases().aliases[0].collection_name, f"{summary_store.SUMMARY_COLLECTION}_3")
+        self.assertEqual(summary_store.get_document_summary("old", "space")["summary"], "договор аренды")
+
+
+class TwoStageDocIdsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(location=":memory:")
+        self.client.create_collection(
+            config.QDRANT_COLLECTION, vectors_config=VectorParams(size=1, distance=Distance.COSINE)
+        )
+        self.client.upsert(config.QDRANT_COLLECTION, points=[
+            PointStruct(id=i, vector=[1.0], payload={"doc_id": doc_id, "space_id": space, "chunk_index": idx, **flag})
+            for i, (doc_id, space, idx, flag) in enumerate([
+                ("summarized", "space", 0, {"has_summary": True}),
+                ("summarized", "space", 1, {}),
+                ("fresh", "space", 0, {}),
+                ("fresh", "space", 1, {}),
+                ("elsewhere", "other", 0, {}),
+            ])
+        ])
+        summary_store.invalidate_unsummarized()
+        p = mock.patch("backend.services.qdrant_store.client", return_value=self.client)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_unsummarized_documents_join_summary_hits(self):
+        doc_ids = summary_store.two_stage_doc_ids([{"doc_id": "summarized"}], "space")
+        self.assertEqual(doc_ids, ["summarized", "fresh"])
+
+    def test_too_many_unsummarized_documents_search_all_chunks(self):
+        with mock.patch.object(config, "TWO_STAGE_MAX_UNSUMMARIZED", 0):
+            self.assertIsNone(summary_store.two_stage_doc_ids([{"doc_id": "summarized"}], "space"))
+
+    def test_no_summary_hits_search_all_chunks(self):
+        self.assertIsNone(summary_store.two_stage_doc_ids([], "space"))
+
+
+if __name__ == "__main__":
+    unittest.main()